@@ -0,0 +1,59 @@
+"""Benchmark of the columnar and legacy (one group per instance) HDF5 layouts for the sequential and random reads.
+
+Usage: python benchmarks/hdf5.py [--sentences 10000 100000] [--repeat 3]
+"""
+import os
+import time
+import tempfile
+import argparse
+import numpy as np
+
+from conllutils import Instance, FORM, UPOS, HEAD, DEPREL
+from conllutils import pipe
+from conllutils.io import read_file
+
+def random_instances(n, seed=1):
+    # Synthetic instances with the sentence lengths and vocabulary sizes typical for the treebanks.
+    random = np.random.RandomState(seed)
+    instances = []
+    for length in random.randint(3, 40, n).tolist():
+        instance = Instance(metadata={'sent_id': str(len(instances))})
+        instance[FORM] = random.randint(1, 50000, length)
+        instance[UPOS] = random.randint(1, 18, length)
+        instance[DEPREL] = random.randint(1, 40, length)
+        instance[HEAD] = random.randint(0, length + 1, length)
+        instances.append(instance)
+    return instances
+
+def _measure(f, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the HDF5 layouts.')
+    parser.add_argument('--sentences', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f'{"layout":<10}{"sentences":>10}{"write [s]":>12}{"read [s]":>12}{"random [s]":>12}{"size [MB]":>12}')
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for n in args.sentences:
+            instances = random_instances(n)
+            for layout in ('columnar', 'groups'):
+                filename = os.path.join(temp_dir, f'{layout}.hdf5')
+                write = _measure(lambda: pipe(instances).write_file(filename, 'hdf5', layout=layout), args.repeat)
+                read = _measure(lambda: pipe().read_file(filename, 'hdf5').count(), args.repeat)
+                # Random access to 1000 instances.
+                indices = np.random.RandomState(2).randint(0, n, 1000)
+                with read_file(filename, 'hdf5') as dataset:
+                    random = _measure(lambda: dataset[indices], args.repeat)
+                size = os.path.getsize(filename) / 2**20
+                print(f'{layout:<10}{n:>10}{write:>12.3f}{read:>12.3f}{random:>12.3f}{size:>12.2f}')
+
+if __name__ == '__main__':
+    main()
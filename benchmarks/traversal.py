@@ -0,0 +1,63 @@
+"""Benchmark of the dependency tree traversals on the synthetic deep trees.
+
+Usage: python benchmarks/traversal.py [--sizes 100 1000 10000] [--repeat 5]
+"""
+import sys
+import time
+import random
+import argparse
+
+from conllutils import Sentence, Token
+
+def chain_tree(n):
+    # Every word depends on the previous one.
+    return Sentence([Token(id=i + 1, form=str(i), head=i) for i in range(n)])
+
+def reversed_chain_tree(n):
+    # Every word depends on the next one.
+    return Sentence([Token(id=i + 1, form=str(i), head=i + 2 if i + 1 < n else 0) for i in range(n)])
+
+def random_deep_tree(n, seed=1, window=3):
+    # Random tree, where every word depends on one of the few previously attached words.
+    rnd = random.Random(seed)
+    order = list(range(n))
+    rnd.shuffle(order)
+    heads = [0] * n
+    for k in range(1, n):
+        heads[order[k]] = order[rnd.randrange(max(0, k - window), k)] + 1
+    return Sentence([Token(id=i + 1, form=str(i), head=heads[i]) for i in range(n)])
+
+TREES = {
+    'chain': chain_tree,
+    'reversed chain': reversed_chain_tree,
+    'random deep': random_deep_tree
+}
+
+def _measure(f, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the dependency tree traversals.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f'recursion limit: {sys.getrecursionlimit()}')
+    print(f'{"tree":<16}{"size":>8}{"build [s]":>12}{"preorder [s]":>14}{"inorder [s]":>14}{"postorder [s]":>15}')
+    for name, create in TREES.items():
+        for n in args.sizes:
+            sentence = create(n)
+            build = _measure(sentence.to_tree, args.repeat)
+            # Traversal orders are computed on the first use, so each measurement uses a new tree.
+            times = [_measure(lambda: sum(1 for _ in getattr(sentence.to_tree(), order)()), args.repeat)
+                     for order in ('preorder', 'inorder', 'postorder')]
+            print(f'{name:<16}{n:>8}{build:>12.6f}{times[0]:>14.6f}{times[1]:>14.6f}{times[2]:>15.6f}')
+
+if __name__ == '__main__':
+    main()
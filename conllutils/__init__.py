@@ -4,6 +4,7 @@ import copy
 from collections import Counter
 from collections.abc import MutableMapping
 from operator import itemgetter
+from bisect import bisect_left, bisect_right
 from io import StringIO
 import numpy as np
 
@@ -265,6 +266,16 @@ class Sentence(list):
         """
         return DependencyTree(self)
 
+    def to_graph(self, label_index=None):
+        """Return an enhanced dependency graph of the sentence built from the DEPS values of the tokens.
+
+        See `graph.EnhancedGraph` class and `graph.build_graphs` function for more information.
+
+        Raises:
+            ValueError: If the DEPS value refers to the head which is not in the sentence.
+        """
+        return build_graph(self, label_index)
+
     def to_instance(self, index, fields=None, dtype=np.int64):
         """Return an instance representation of the sentence with the values indexed by the `index`.
 
@@ -277,7 +288,7 @@ class Sentence(list):
         Raises:
             KeyError: If some of the `fields` are not indexed in the `index`.
         """
-        return _map_to_instance(self, index, fields)
+        return _map_to_instance(self, index, fields, dtype)
 
     def to_conllu(self, write_comments=True):
         """Return a string representation of the sentence in the CoNLL-U format.
@@ -437,22 +448,31 @@ class Node(object):
     A node object is iterable, and returns an iterator over the direct children. ``len(node)`` returns the number of
     children, and ``node[i]`` returns the `i`-th child (or sublist of children, if `i` is the slice of indices).
 
+    Nodes are lightweight views created on demand from the array representation of the `DependencyTree`.
+
     Attributes:
         index (int): The index of the word in the sentence (from 0).
         token (Token or indexed token view): The corresponding syntactic word.
         parent (Node): The parent (HEAD) of the node, or None for the root. 
 
     """
-    def __init__(self, index, token):
+    def __init__(self, tree, index):
+        self._tree = tree
         self.index = index
-        self.token = token
-        self.parent = None
-        self._children = []
+
+    @property
+    def token(self):
+        return self._tree._token(self.index)
+
+    @property
+    def parent(self):
+        parent = self._tree.parents[self.index]
+        return self._tree._node(parent) if parent >= 0 else None
 
     @property
     def is_root(self):
         """bool: True, if the node is the root of the tree (has no parent)."""
-        return self.parent == None
+        return self._tree.parents[self.index] < 0
 
     @property
     def is_leaf(self):
@@ -465,20 +485,41 @@ class Node(object):
         does not have DEPREL field."""
         return self.token.get(DEPREL)
 
+    @property
+    def _children(self):
+        tree = self._tree
+        start, end = tree.child_offsets[self.index], tree.child_offsets[self.index + 1]
+        return [tree._node(i) for i in tree.child_indices[start:end].tolist()]
+
     def __getitem__(self, i):
         # Return `i`-th child of the node or sublist of children, if `i` is the slice of indices.
         return self._children[i]
 
     def __len__(self):
         # Return the number of children.
-        return len(self._children)
+        return int(self._tree.child_offsets[self.index + 1] - self._tree.child_offsets[self.index])
 
     def __iter__(self):
         # Return an iterator over the children.
         return iter(self._children)
 
     def __repr__(self):
-        return f'<{self.token!r},{self.deprel},{self._children}>'
+        # Nested representation built with the explicit stack, so that deep trees do not exceed the recursion limit.
+        parts = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                parts.append(node)
+                continue
+            parts.append(f'<{node.token!r},{node.deprel},[')
+            stack.append(']>')
+            children = node._children
+            for i in reversed(range(len(children))):
+                stack.append(children[i])
+                if i > 0:
+                    stack.append(', ')
+        return ''.join(parts)
 
 class DependencyTree(object):
     """A dependency tree representation of the sentence.
@@ -494,23 +535,64 @@ class DependencyTree(object):
     The dependency tree object is iterable and returns an iterator over all nodes in the order of corresponding words in
     the sentence. ``len(tree)`` returns the number of nodes.
 
+    The tree structure is stored in the NumPy arrays. The children of the node `i` are stored in the sentence order in
+    ``child_indices[child_offsets[i]:child_offsets[i+1]]``. The node objects are created only when they are accessed.
+
     Note that the dependency tree is constructed only from the basic dependency relations. Enhanced dependency relations
     stored in the DEPS field are not included in the tree.
 
     Attributes:
         root (Node): The root of the tree. 
         nodes (list of Node): The list of all nodes in the sentence order.
+        parents (np.ndarray): The index of the parent for each node, or -1 for the root.
+        child_offsets (np.ndarray): The offsets of the children for each node, with the length ``len(tree) + 1``.
+        child_indices (np.ndarray): The indices of the children for all nodes.
         metadata (any): Any optional data associated with the tree, by default copied from the sentence or indexed
             instance.
 
     """
     def __init__(self, sentence):
-        self.root, self.nodes = self._build(sentence)
+        if isinstance(sentence, Instance):
+            self._tokens = sentence
+            heads = sentence[HEAD] if HEAD in sentence else [None] * sentence.length
+        else:
+            self._tokens = list(sentence.words()) # Only the syntactic words.
+            heads = [token.get(HEAD) for token in self._tokens]
+        self.parents, self.child_offsets, self.child_indices, self._root = _build_tree(heads)
+        self._nodes = [None] * len(self.parents)
+        self._all_nodes = None
+        self._orders = None
+        self._euler = None
         self.metadata = sentence.metadata
 
+    @property
+    def root(self):
+        return self._node(self._root) if self._root >= 0 else None
+
+    @property
+    def nodes(self):
+        if self._all_nodes is None:
+            self._all_nodes = [self._node(i) for i in range(len(self))]
+        return self._all_nodes
+
+    @property
+    def preorder_indices(self):
+        """np.ndarray: The indices of the nodes in the pre-order traversal."""
+        return self._traversal_orders()[0]
+
+    @property
+    def postorder_indices(self):
+        """np.ndarray: The indices of the nodes in the post-order traversal."""
+        return self._traversal_orders()[1]
+
+    @property
+    def inorder_indices(self):
+        """np.ndarray: The indices of the nodes in the in-order traversal."""
+        return self._traversal_orders()[2]
+
     def __len__(self):
         # Return the number of nodes.
-        return len(self.nodes)
+        return len(self.parents)
 
     def __iter__(self):
         # Return an iterator over all nodes in the sentence order.
@@ -525,81 +607,258 @@ class DependencyTree(object):
         If the argument `return_arcs` is True, the function returns the list of conflicting non-projective arcs. For
         projective trees the list is empty.
         """
-        return _is_projective([node.token[HEAD] for node in self.nodes], return_arcs)
+        return _is_projective((self.parents + 1).tolist(), return_arcs)
 
     def leaves(self):
         """Return an iterator over all leaves of the tree in the sentence order."""
-        for node in self:
-            if node.is_leaf:
-                yield node
+        for i in np.flatnonzero(self.child_offsets[1:] == self.child_offsets[:-1]).tolist():
+            yield self._node(i)
 
     def inorder(self):
         """Return an iterator traversing in-order over all nodes."""
-        return self._traverse(self.root, inorder=True)
+        return map(self._node, self.inorder_indices.tolist())
 
     def preorder(self):
         """Return an iterator traversing pre-order over all nodes."""
-        return self._traverse(self.root, preorder=True)
+        return map(self._node, self.preorder_indices.tolist())
 
     def postorder(self):
         """Return an iterator traversing post-order over all nodes."""
-        return self._traverse(self.root, postorder=True)
+        return map(self._node, self.postorder_indices.tolist())
 
-    def __repr__(self):
-        return repr(self.root)
+    def is_ancestor(self, a, b):
+        """Return True if the node `a` is an ancestor of the node `b`, i.e. `a` lies on the path from `b` to the root.
+        Every node is the ancestor of itself.
 
-    @staticmethod
-    def _traverse(node, inorder=False, preorder=False, postorder=False):
-        if node is None:
-            return
+        The nodes can be specified as `Node` objects or the indices of the words in the sentence (from 0). The first
+        query precomputes the Euler tour of the tree, and all subsequent queries run in the constant time.
+
+        Raises:
+            ValueError: If some of the nodes is not connected to the root.
+        """
+        euler = self._euler_tour()
+        a, b = euler.position(a), euler.position(b)
+        return euler.first[a] <= euler.first[b] and euler.last[b] <= euler.last[a]
 
-        consumed = False
-        if preorder:
-            consumed = True # Consume preorder.
-            yield node
+    def lca(self, a, b):
+        """Return the lowest common ancestor of the nodes `a` and `b`.
 
-        for child in node:
-            if inorder and not consumed and node.index < child.index:
-                consumed = True # Consume inorder.
-                yield node
-            yield from DependencyTree._traverse(child, inorder, preorder, postorder)
+        See `DependencyTree.is_ancestor` method for the description of the arguments and the complexity of queries.
+        """
+        return self._node(self._euler_tour().lca(a, b))
 
-        if postorder or not consumed: # For postorder or right-most inorder.
-            yield node
+    def distance(self, a, b):
+        """Return the number of arcs on the path between the nodes `a` and `b`.
 
-    @staticmethod
-    def _build(sentence):
-        if isinstance(sentence, Instance):
-            tokens = sentence.tokens()
-        else:
-            tokens = sentence.words() # Only the syntactic words.
-
-        nodes = [Node(i, token) for i, token in enumerate(tokens)]
-        if not nodes:
-            return None, []
-
-        root = None
-        for index, node in enumerate(nodes):
-            # The token can be a syntactic word or indexed token view.
-            token = node.token
-            head = token.get(HEAD)
-            if head is None or head == -1:
-                raise ValueError(f'token at {index} has no HEAD')
-
-            if head == 0:
-                if root == None:
-                    root = node
-                else:
-                    raise ValueError(f'multiple roots found at {index}')
-            else:
-                parent = nodes[head-1]
-                node.parent = parent
-                parent._children.append(node)
+        See `DependencyTree.is_ancestor` method for the description of the arguments and the complexity of queries.
+        """
+        euler = self._euler_tour()
+        return euler.depths[euler.first[euler.position(a)]] + euler.depths[euler.first[euler.position(b)]] \
+            - 2 * euler.depths[euler.first[euler.lca(a, b)]]
 
-        if root is None:
-            raise ValueError('no root found')
+    def path(self, a, b):
+        """Return the list of nodes on the path from the node `a` to the node `b` (including both nodes).
 
-        return root, nodes
+        See `DependencyTree.is_ancestor` method for the description of the arguments.
+        """
+        euler = self._euler_tour()
+        a, b, top = euler.position(a), euler.position(b), euler.lca(a, b)
+        up, down = [a], [b]
+        while up[-1] != top:
+            up.append(int(self.parents[up[-1]]))
+        while down[-1] != top:
+            down.append(int(self.parents[down[-1]]))
+        return [self._node(i) for i in up + down[-2::-1]]
+
+    def distances(self):
+        """Return the matrix of the distances between all pairs of nodes.
+
+        The value at the position ``[i, j]`` is the number of arcs on the path between the `i`-th and `j`-th node, or -1
+        if some of the nodes is not connected to the root.
+        """
+        n = len(self)
+        result = np.full((n, n), -1, dtype=np.int64)
+        if n == 0:
+            return result
+        euler = self._euler_tour()
+        first = np.array(euler.first, dtype=np.int64)
+        nodes = np.flatnonzero(first >= 0)
+        depths = np.array(euler.depths, dtype=np.int64)
+
+        start = first[nodes]
+        lca = euler.lca_positions(np.minimum.outer(start, start), np.maximum.outer(start, start))
+        node_depths = depths[start]
+        result[np.ix_(nodes, nodes)] = node_depths[:, None] + node_depths[None, :] - 2 * depths[lca]
+        return result
+
+    def __repr__(self):
+        return repr(self.root)
+
+    def _node(self, i):
+        node = self._nodes[i]
+        if node is None:
+            node = Node(self, i)
+            self._nodes[i] = node
+        return node
+
+    def _token(self, i):
+        if isinstance(self._tokens, Instance):
+            return self._tokens.token(i)
+        return self._tokens[i]
+
+    def _euler_tour(self):
+        if self._euler is None:
+            self._euler = _EulerTour(self._root, self.child_offsets, self.child_indices)
+        return self._euler
+
+    def _traversal_orders(self):
+        if self._orders is None:
+            self._orders = _traversal_orders(self._root, self.child_offsets, self.child_indices)
+        return self._orders
+
+# Shorter trees are built faster by the sequential scan than by the NumPy operations.
+_VECTORIZED_TREE_SIZE = 128
+
+def _build_tree(heads):
+    # Return the parents, child offsets, child indices and the root index built from the HEAD values.
+    # The sequential scan also raises the error for the tokens without HEAD.
+    if len(heads) < _VECTORIZED_TREE_SIZE or (not isinstance(heads, np.ndarray) and None in heads):
+        return _scan_tree(heads.tolist() if isinstance(heads, np.ndarray) else heads)
+
+    heads = np.asarray(heads, dtype=np.int64)
+    n = len(heads)
+    if heads.min() < 0 or heads.max() > n:
+        return _scan_tree(heads.tolist()) # Raise the error for the first invalid token.
+    # The number of children for each node, counts[0] is the number of roots.
+    counts = np.bincount(heads, minlength=n + 1)
+    if counts[0] != 1:
+        return _scan_tree(heads.tolist())
+
+    parents = heads - 1
+    # Stable sort groups the children by the parent in the sentence order, the root (parent -1) is first.
+    order = np.argsort(parents, kind='stable')
+    child_offsets = np.cumsum(counts)
+    child_offsets -= 1
+    return parents, child_offsets, order[1:], int(order[0])
+
+def _scan_tree(heads):
+    n = len(heads)
+    root = -1
+    counts = [0] * (n + 1)
+    for index, head in enumerate(heads):
+        if head is None or head < 0:
+            raise ValueError(f'token at {index} has no HEAD')
+        if head > n:
+            raise ValueError(f'token at {index} has HEAD out of range')
+        if head == 0:
+            if root >= 0:
+                raise ValueError(f'multiple roots found at {index}')
+            root = index
+        counts[head] += 1
+    if n > 0 and root < 0:
+        raise ValueError('no root found')
+
+    # Stable sort groups the children by the parent in the sentence order, the root is first.
+    order = sorted(range(n), key=heads.__getitem__)
+    counts[0] = 0
+    return (np.array(heads, dtype=np.int64) - 1, np.cumsum(counts, dtype=np.int64),
+            np.array(order[1:], dtype=np.int64), root)
+
+class _EulerTour(object):
+    # Euler tour of the tree with the sparse table of the minimal depths for the lowest common ancestor queries.
+
+    def __init__(self, root, child_offsets, child_indices):
+        n = len(child_offsets) - 1
+        offsets = child_offsets.tolist()
+        children = child_indices.tolist()
+        next_child = offsets[:-1]
+        self.first = [-1] * n
+        self.last = [-1] * n
+        self.tour = []
+        self.depths = []
+
+        stack = [root] if root >= 0 else []
+        while stack:
+            node = stack[-1]
+            if self.first[node] < 0:
+                self.first[node] = len(self.tour)
+            self.tour.append(node)
+            self.depths.append(len(stack) - 1)
+            k = next_child[node]
+            if k < offsets[node + 1]:
+                next_child[node] = k + 1
+                stack.append(children[k])
+            else:
+                self.last[node] = len(self.tour) - 1
+                stack.pop()
+
+        # The table[j][i] is the position in the tour with the minimal depth in the range [i, i + 2^j).
+        depths = np.array(self.depths, dtype=np.int64)
+        self.table = [np.arange(len(self.tour))]
+        width = 1
+        while 2 * width <= len(self.tour):
+            prev = self.table[-1]
+            left, right = prev[:len(prev) - width], prev[width:]
+            self.table.append(np.where(depths[left] <= depths[right], left, right))
+            width *= 2
+        self.depth_array = depths
+
+    def position(self, node):
+        index = node.index if isinstance(node, Node) else int(node)
+        if self.first[index] < 0:
+            raise ValueError(f'node {index} is not connected to the root')
+        return index
+
+    def lca(self, a, b):
+        i, j = self.first[self.position(a)], self.first[self.position(b)]
+        if i > j:
+            i, j = j, i
+        k = (j - i + 1).bit_length() - 1
+        left, right = self.table[k][i], self.table[k][j - (1 << k) + 1]
+        return self.tour[left if self.depths[left] <= self.depths[right] else right]
+
+    def lca_positions(self, i, j):
+        # Vectorized query returning the positions in the tour for the arrays of the ranges [i, j].
+        k = np.floor(np.log2(j - i + 1)).astype(np.int64)
+        left = np.empty_like(i)
+        right = np.empty_like(i)
+        for level in np.unique(k).tolist():
+            mask = k == level
+            left[mask] = self.table[level][i[mask]]
+            right[mask] = self.table[level][j[mask] - (1 << level) + 1]
+        return np.where(self.depth_array[left] <= self.depth_array[right], left, right)
+
+def _traversal_orders(root, child_offsets, child_indices):
+    # Pre-order, post-order and in-order permutations computed by the depth-first search with the explicit stack.
+    if root < 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+
+    offsets = child_offsets.tolist()
+    children = child_indices.tolist()
+    next_child = offsets[:-1]
+    consumed = [False] * len(next_child)
+    preorder, postorder, inorder = [root], [], []
+    stack = [root]
+
+    while stack:
+        node = stack[-1]
+        k = next_child[node]
+        if k < offsets[node + 1]:
+            child = children[k]
+            next_child[node] = k + 1
+            if not consumed[node] and node < child:
+                consumed[node] = True # Consume inorder.
+                inorder.append(node)
+            preorder.append(child)
+            stack.append(child)
+        else:
+            if not consumed[node]: # For right-most inorder.
+                inorder.append(node)
+            postorder.append(node)
+            stack.pop()
+
+    return np.array(preorder, dtype=np.int64), np.array(postorder, dtype=np.int64), np.array(inorder, dtype=np.int64)
 
 class _IndexedToken(MutableMapping):
     """A mutable mapping view representing `i`-th token of the indexed instance."""
@@ -740,37 +999,48 @@ class Instance(dict):
         return Instance(copy.deepcopy(dict(self), memo), self.metadata)
 
 def _is_projective(heads, return_arcs=False):
-
-    if return_arcs:
-        arcs = []
-
-    for i in range(len(heads)):
-        if heads[i] is None or heads[i] < 0:
-            continue
-
-        for j in range(i + 1, len(heads)):
-            if heads[j] is None or heads[j] < 0:
-                continue
-
-            arc1_0 = min(i + 1, heads[i])
-            arc1_1 = max(i + 1, heads[i])
-            arc2_0 = min(j + 1, heads[j])
-            arc2_1 = max(j + 1, heads[j])
-
-            if ((arc1_0 == arc2_0 and arc1_1 == arc2_1) or # Cycle
-                (arc1_0 < arc2_0 and arc2_0 < arc1_1 and arc1_1 < arc2_1) or # Crossing
-                (arc2_0 < arc1_0 and arc1_0 < arc2_1 and arc2_1 < arc1_1)):  # Crossing
-                if return_arcs:
-                    arcs.append((i, j))
-                else:
-                    return False
-
-    if return_arcs:
-        return arcs
-    else:
-        return True
-
-def read_conllu(file, underscore_form=True, parse_comments=True, parse_feats=False, parse_deps=False):
+    if isinstance(heads, np.ndarray):
+        heads = heads.tolist()
+    # Arcs (start, end, index) of the tokens with HEAD, the root arcs start at the position 0.
+    arcs = [(min(i + 1, head), max(i + 1, head), i) for i, head in enumerate(heads) if head is not None and head >= 0]
+    # Sorted by the start and the decreasing end, so that the enclosing arcs precede the nested ones.
+    arcs.sort(key=lambda arc: (arc[0], -arc[1]))
+
+    # Non-crossing arcs are properly nested. The stack holds the chain of arcs enclosing the current start position.
+    stack = []
+    projective = True
+    for arc in arcs:
+        start, end, _ = arc
+        while stack and stack[-1][1] <= start:
+            stack.pop()
+        if stack and (stack[-1][1] < end or (stack[-1][0] == start and stack[-1][1] == end)): # Crossing or cycle
+            projective = False
+            break
+        stack.append(arc)
+
+    if not return_arcs:
+        return projective
+    if projective:
+        return []
+    return _conflicting_arcs(arcs)
+
+def _conflicting_arcs(arcs):
+    # All pairs of the crossing arcs or cycles, for the arcs sorted by the start and the decreasing end.
+    starts = [arc[0] for arc in arcs]
+    conflicts = []
+    for k, (start, end, i) in enumerate(arcs):
+        # Arcs starting inside the arc and ending after it are crossing.
+        for start2, end2, j in arcs[bisect_right(starts, start, k):bisect_left(starts, end, k)]:
+            if end2 > end:
+                conflicts.append((min(i, j), max(i, j)))
+        # Arcs with the same start and end are adjacent in the sorted order.
+        if k > 0 and arcs[k-1][0] == start and arcs[k-1][1] == end:
+            conflicts.append((min(arcs[k-1][2], i), max(arcs[k-1][2], i)))
+    conflicts.sort()
+    return conflicts
+
+def read_conllu(file, underscore_form=True, parse_comments=True, parse_feats=False, parse_deps=False,
+                metadata_filter=None, length_filter=None):
     """Read the CoNLL-U file and return an iterator over the parsed sentences.
 
     The `file` argument can be a path-like or file-like object.
@@ -783,34 +1053,157 @@ def read_conllu(file, underscore_form=True, parse_comments=True, parse_feats=Fal
 
     By default, comments are parsed as the metadata dictionary. To skip comments parsing, set `parse_comments` argument
     to False.
+
+    The sentences can be filtered before the tokens are parsed. The `metadata_filter` predicate is called with the
+    metadata dictionary parsed from the comments, and the `length_filter` predicate with the number of token lines
+    (including the multiword and empty tokens). Sentences for which some of the predicates return False are skipped.
     """
     if isinstance(file, (str, os.PathLike)):
         file = open(file, 'rt', encoding='utf-8')
 
+    collect_comments = parse_comments or metadata_filter is not None
+
     with file:
         lines = []
-        comments = [] if parse_comments else None
+        comments = []
 
         for line in file:
             line = line.strip() 
             if line:
                 if line.startswith('#'):
-                    if parse_comments:
+                    if collect_comments:
                         comments.append(line)
                 else:
                     lines.append(line)
             elif lines:
-                yield _parse_sentence(lines, comments, underscore_form,
-                        parse_feats, parse_deps)
+                if _accept_sentence(lines, comments, metadata_filter, length_filter):
+                    yield _parse_sentence(lines, comments if parse_comments else None, underscore_form,
+                            parse_feats, parse_deps)
                 lines = []
                 comments = []
 
         # Parse the last sentence if the file does not end with the LF character.
         # Note that this is not compliant with the CoNLL-U V2 specification.
-        if lines:
-            yield _parse_sentence(lines, comments, underscore_form,
+        if lines and _accept_sentence(lines, comments, metadata_filter, length_filter):
+            yield _parse_sentence(lines, comments if parse_comments else None, underscore_form,
                     parse_feats, parse_deps)
 
+def _accept_sentence(lines, comments, metadata_filter, length_filter):
+    if length_filter is not None and not length_filter(len(lines)):
+        return False
+    if metadata_filter is not None and not metadata_filter(_parse_metadata(comments)):
+        return False
+    return True
+
+def _scan_conllu(fp, start=0, end=None):
+    # Scan the binary CoNLL-U file and yield (offset, lines) for all sentences starting at the byte offset in the range
+    # [start, end), where lines are the raw unparsed lines of the sentence including the comments. As in `read_conllu`,
+    # the comment-only blocks (e.g. the CoNLL-U Plus header) are merged with the following sentence.
+    if start > 0:
+        fp.seek(start - 1)
+        fp.readline() # Move to the first line starting at or after the `start` offset.
+        offset = fp.tell()
+        # Skip the rest of the sentence started before the `start` offset.
+        skip, tokens = _scan_state(fp, offset)
+        fp.seek(offset)
+    else:
+        fp.seek(0)
+        offset = 0
+        skip = tokens = False
+
+    lines = []
+    sentence_offset = offset
+    for line in fp:
+        stripped = line.strip()
+        if stripped:
+            if not skip:
+                if not lines:
+                    if end is not None and offset >= end:
+                        return
+                    sentence_offset = offset
+                lines.append(line)
+            tokens = tokens or not stripped.startswith(b'#')
+        elif tokens:
+            if not skip:
+                yield sentence_offset, lines
+            lines = []
+            skip = tokens = False
+        offset += len(line)
+
+    # The last sentence if the file does not end with the LF character.
+    if lines and tokens:
+        yield sentence_offset, lines
+
+def _scan_state(fp, offset):
+    # Return (in_sentence, tokens) for the line starting at `offset`, i.e. whether some lines of the current sentence
+    # precede the line, and whether they include the token lines.
+    in_sentence = False
+    adjacent = True # The lines of the block directly preceding the offset.
+    block = False
+    for line in _reversed_lines(fp, offset):
+        line = line.strip()
+        if not line:
+            in_sentence = in_sentence or block
+            block = adjacent = False
+        elif line.startswith(b'#'):
+            block = True
+        elif adjacent:
+            return True, True
+        else:
+            # The block with the tokens ends the previous sentence.
+            return in_sentence, False
+    return in_sentence or block, False
+
+def _reversed_lines(fp, offset):
+    # Yield the lines preceding the line starting at `offset` in the reversed order.
+    pos = offset - 1 # The LF character terminating the previous line.
+    rest = b''
+    while pos > 0:
+        start = max(0, pos - 4096)
+        fp.seek(start)
+        lines = (fp.read(pos - start) + rest).split(b'\n')
+        pos = start
+        rest = lines[0]
+        yield from reversed(lines[1:])
+    if offset > 0:
+        yield rest
+
+def _index_conllu(fp):
+    # Return the array of byte offsets of all sentences in the binary CoNLL-U file.
+    return np.fromiter((offset for offset, _ in _scan_conllu(fp)), dtype=np.int64)
+
+def _read_raw_sentence(fp, offset):
+    # Return the raw lines of the sentence starting at the byte offset.
+    fp.seek(offset)
+    lines = []
+    tokens = False
+    while True:
+        line = fp.readline()
+        if not line:
+            return lines
+        stripped = line.strip()
+        if stripped:
+            lines.append(line)
+            tokens = tokens or not stripped.startswith(b'#')
+        elif tokens:
+            return lines
+
+def _parse_raw_sentence(lines, underscore_form=True, parse_comments=True, parse_feats=False, parse_deps=False,
+                        metadata_filter=None, length_filter=None):
+    # Parse the raw lines returned by the `_scan_conllu` function, or return None if the sentence is filtered out.
+    tokens = []
+    comments = []
+    for line in lines:
+        # Decode each raw line, str.splitlines() would also split on the Unicode line separators inside the values.
+        line = line.decode('utf-8').strip()
+        if line.startswith('#'):
+            comments.append(line)
+        elif line:
+            tokens.append(line)
+    if not _accept_sentence(tokens, comments, metadata_filter, length_filter):
+        return None
+    return _parse_sentence(tokens, comments if parse_comments else None, underscore_form, parse_feats, parse_deps)
+
 def write_conllu(file, data, write_comments=True):
     """Write the sentences to the CoNLL-U file.
 
@@ -833,6 +1226,83 @@ def write_conllu(file, data, write_comments=True):
                 print(_token_to_str(token), file=fp)
             print(file=fp)
 
+async def read_conllu_async(reader, underscore_form=True, parse_comments=True, parse_feats=False, parse_deps=False,
+                            metadata_filter=None, length_filter=None):
+    """Read the CoNLL-U data from the asynchronous reader and return an asynchronous iterator over the parsed sentences.
+
+    The `reader` can be `asyncio.StreamReader`, an object with the coroutine `readline` method (e.g. a file opened by
+    the aiofiles library), or an asynchronous iterable of lines. Lines can be bytes in UTF-8 encoding or strings.
+
+    Sentences are parsed in the event loop. To parse them in the executor, use the asynchronous iteration of the
+    `Pipeline` reading from the `reader`. See `read_conllu` for the description of other arguments.
+    """
+    async for lines in _scan_conllu_async(reader):
+        sentence = _parse_raw_sentence(lines, underscore_form, parse_comments, parse_feats, parse_deps,
+                                       metadata_filter, length_filter)
+        if sentence is not None:
+            yield sentence
+
+async def _scan_conllu_async(reader):
+    # Asynchronously yield the raw lines of the sentences in the format returned by the `_scan_conllu` function.
+    lines = []
+    tokens = False
+    async for line in _readlines_async(reader):
+        if isinstance(line, str):
+            line = line.encode('utf-8')
+        line = line.strip()
+        if line:
+            lines.append(line + b'\n')
+            tokens = tokens or not line.startswith(b'#')
+        elif tokens:
+            yield lines
+            lines = []
+            tokens = False
+    if tokens:
+        yield lines
+
+async def _readlines_async(reader):
+    if hasattr(reader, '__aiter__'):
+        async for line in reader:
+            yield line
+    else:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            yield line
+
+async def write_conllu_async(writer, data, write_comments=True):
+    """Write the sentences in the CoNLL-U format to the asynchronous writer.
+
+    The `writer` can be `asyncio.StreamWriter`, which receives the data encoded in UTF-8 and is drained after each
+    sentence, or an object with the coroutine `write` method accepting strings (e.g. a file opened by the aiofiles
+    library). Written `data` is one sentence, an iterable or an asynchronous iterable (e.g. `Pipeline`) of sentences.
+    If the `write_comments` argument is True (default), sentence metadata are encoded as the comments.
+    """
+    if isinstance(data, Sentence):
+        data = (data,)
+
+    async for sentence in _iterate_async(data):
+        lines = []
+        if write_comments and sentence.metadata:
+            lines.extend(_metadata_to_str(sentence.metadata))
+        lines.extend(_token_to_str(token) for token in sentence)
+        s = ''.join(line + '\n' for line in lines) + '\n'
+
+        if hasattr(writer, 'drain'):
+            writer.write(s.encode('utf-8'))
+            await writer.drain()
+        else:
+            await writer.write(s)
+
+async def _iterate_async(data):
+    if hasattr(data, '__aiter__'):
+        async for item in data:
+            yield item
+    else:
+        for item in data:
+            yield item
+
 def _is_chars_field(field):
     return field.endswith(':chars')
 
@@ -900,26 +1370,120 @@ def create_index(sentences, fields=None, min_frequency=1, missing_index=None):
         ValueError: If the non-string value is indexed for some of the `fields`.
     """
     dic = _create_dictionary(sentences, fields)
-    index = {f: Counter() for f in dic.keys()}
-
-    for f, c in dic.items():
-        min_fq = min_frequency.get(f, 1) if isinstance(min_frequency, dict) else min_frequency
-        missing_idx = missing_index.get(f, None) if isinstance(missing_index, dict) else missing_index
-
-        i = 1
-        ordered = sorted(c.items(), key=itemgetter(1,0), reverse=True)
-        for (s, fq) in ordered:
-            if fq >= min_fq:
-                if missing_idx is not None and i == missing_idx:
-                    i += 1
-                index[f][s] = i
+    return {f: _create_field_index(f, c, min_frequency, missing_index) for f, c in dic.items()}
+
+def _create_field_index(f, counter, min_frequency, missing_index):
+    min_fq = min_frequency.get(f, 1) if isinstance(min_frequency, dict) else min_frequency
+    missing_idx = missing_index.get(f, None) if isinstance(missing_index, dict) else missing_index
+
+    index = Counter()
+    i = 1
+    ordered = sorted(counter.items(), key=itemgetter(1,0), reverse=True)
+    for (s, fq) in ordered:
+        if fq >= min_fq:
+            if missing_idx is not None and i == missing_idx:
                 i += 1
+            index[s] = i
+            i += 1
+        else:
+            break
+    if missing_idx is not None:
+        index[None] = missing_idx
+    return index
+
+def create_index_and_instances(sentences, fields=None, min_frequency=1, missing_index=None, dtype=np.int64):
+    """Return an index and the list of instances indexed by it, created in one pass over the `sentences`.
+
+    The result is equal to the index created by the `create_index` function and instances created by the
+    `Sentence.to_instance` method with this index, i.e. to the following code which iterates `sentences` twice:
+    ```python
+    index = create_index(sentences, fields, min_frequency, missing_index)
+    instances = [sentence.to_instance(index, dtype=dtype) for sentence in sentences]
+    ```
+    The values are indexed in the order of their first occurrence and re-indexed to the final indexes when all
+    sentences are processed. See `create_index` function for the description of the arguments.
+
+    Raises:
+        ValueError: If the non-string value is indexed for some of the `fields`.
+    """
+    codes = {}
+    instances = []
+    arrays = []
+
+    for sentence in sentences:
+        length = len(sentence)
+        values = {HEAD: [-1] * length}
+        for i, token in enumerate(sentence):
+            for field, value in token.items():
+                if field == ID:
+                    continue
+                if field == HEAD:
+                    values[HEAD][i] = value
+                    continue
+                if fields is not None and field not in fields:
+                    continue
+
+                if field not in codes:
+                    codes[field] = {}
+                field_codes = codes[field]
+                if field not in values:
+                    values[field] = [None] * length if _is_chars_field(field) else [-1] * length
+
+                if _is_chars_field(field):
+                    value = [field_codes.setdefault(_index_key(field, ch), len(field_codes)) for ch in value]
+                else:
+                    if field == FEATS:
+                        value = _feats_to_str(value)
+                    elif field == DEPS:
+                        value = _deps_to_str(value)
+                    value = field_codes.setdefault(_index_key(field, value), len(field_codes))
+                values[field][i] = value
+
+        instances.append(Instance(metadata=sentence.metadata))
+        arrays.append(values)
+
+    index = {}
+    for field, field_codes in codes.items():
+        chars = _is_chars_field(field)
+        provisional = [_provisional_codes(values.get(field), len(values[HEAD]), chars) for values in arrays]
+        data = np.concatenate(provisional) if provisional else np.empty(0, dtype=np.int64)
+
+        counter = Counter(dict(zip(field_codes.keys(), np.bincount(data[data >= 0], minlength=len(field_codes)).tolist())))
+        index[field] = _create_field_index(field, counter, min_frequency, missing_index)
+
+        # Re-index all values of the field at once. The last element maps the missing values (code -1).
+        remap = np.empty(len(field_codes) + 1, dtype=dtype)
+        remap[:-1] = [index[field][key] for key in field_codes.keys()]
+        remap[-1] = index[field].get(None, -1)
+        data = remap[data]
+
+        start = 0
+        for instance, values, codes_array in zip(instances, arrays, provisional):
+            end = start + len(codes_array)
+            if chars:
+                array = np.full(len(values[HEAD]), None, dtype=object)
+                token_values = values.get(field)
+                if token_values is not None:
+                    for i, value in enumerate(token_values):
+                        if value is not None:
+                            array[i] = data[start:start+len(value)]
+                            start += len(value)
+                instance[field] = array
             else:
-                break
-        if missing_idx is not None:
-            index[f][None] = missing_idx
+                instance[field] = data[start:end]
+            start = end
 
-    return index
+    for instance, values in zip(instances, arrays):
+        instance[HEAD] = np.array(values[HEAD], dtype=dtype)
+
+    return index, instances
+
+def _provisional_codes(values, length, chars):
+    if values is None:
+        return np.empty(0, dtype=np.int64) if chars else np.full(length, -1, dtype=np.int64)
+    if chars:
+        values = [code for value in values if value is not None for code in value]
+    return np.array(values, dtype=np.int64)
 
 def create_inverse_index(index):
     """Return an inverse index mapping the integer indexes to string values.
@@ -942,7 +1506,7 @@ def _map_to_instance(sentence, index, fields=None, dtype=np.int64):
         if field in index and None in index[field]:
             missing_index = index[field][None]
 
-        array = np.full(length, None, dtype=np.object) if _is_chars_field(field) else \
+        array = np.full(length, None, dtype=object) if _is_chars_field(field) else \
                 np.full(length, missing_index, dtype=dtype)
 
         for i, token in enumerate(sentence):
@@ -964,6 +1528,42 @@ def _map_to_instance(sentence, index, fields=None, dtype=np.int64):
     
     return instance
 
+def _map_to_instances(sentences, index, fields=None, dtype=np.int64):
+    # Vectorized version of the _map_to_instance for the list of sentences.
+    if fields is None:
+        fields = {HEAD} | set(index.keys())
+
+    instances = [Instance(metadata=sentence.metadata) for sentence in sentences]
+    offsets = np.cumsum([len(sentence) for sentence in sentences])[:-1]
+    tokens = [token for sentence in sentences for token in sentence]
+
+    for field in fields:
+        if _is_chars_field(field):
+            for instance, sentence in zip(instances, sentences):
+                instance[field] = _map_to_instance(sentence, index, {field}, dtype)[field]
+            continue
+
+        missing_index = -1
+        if field in index and None in index[field]:
+            missing_index = index[field][None]
+
+        if field == HEAD:
+            values = [token.get(HEAD, missing_index) for token in tokens]
+        else:
+            values = [_index_value(index, field, token[field]) if field in token else missing_index for token in tokens]
+
+        for instance, array in zip(instances, np.split(np.array(values, dtype=dtype), offsets)):
+            instance[field] = array
+
+    return instances
+
+def _index_value(index, field, value):
+    if field == FEATS:
+        value = _feats_to_str(value)
+    elif field == DEPS:
+        value = _deps_to_str(value)
+    return index[field][value]
+
 def _map_to_sentence(instance, inverse_index, fields=None):
     if fields is None:
         fields = instance.keys()
@@ -992,6 +1592,7 @@ def _map_to_sentence(instance, inverse_index, fields=None):
     return sentence
 
 from .pipeline import Pipeline
+from .graph import build_graph
 
 def pipe(source=None, *args):
     """Build a data processing *pipeline*.
@@ -0,0 +1,238 @@
+import numpy as np
+
+from . import ID, HEAD, Instance, _is_projective
+
+MISSING_HEAD = 1
+"""Error code of the sentences with some word without the HEAD."""
+HEAD_OUT_OF_RANGE = 2
+"""Error code of the sentences with HEAD greater than the number of words."""
+NO_ROOT = 4
+"""Error code of the non-empty sentences without the root (HEAD = 0)."""
+MULTIPLE_ROOTS = 8
+"""Error code of the sentences with more than one root."""
+CYCLE = 16
+"""Error code of the sentences with some word not connected to the root by the path of HEADs."""
+INVALID_ORDER = 32
+"""Error code of the sentences with the word IDs not forming the sequence 1, 2, 3, etc."""
+
+def concatenate(instances, field=HEAD):
+    """Concatenate the values of the `field` from all `instances` into one array.
+
+    Return the tuple ``(values, offsets)``, where the values of the `i`-th instance are stored in
+    ``values[offsets[i]:offsets[i+1]]``. The length of the `offsets` array is ``len(instances) + 1``.
+    """
+    lengths = [len(instance[field]) for instance in instances]
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    if not lengths:
+        return np.zeros(0, dtype=np.int64), offsets
+    return np.concatenate([instance[field] for instance in instances]), offsets
+
+def projective_mask(heads, offsets):
+    """Return the boolean mask of the sentences, which can be represented as the projective dependency trees.
+
+    The HEAD values of all sentences are concatenated in the `heads` array, and the values of the `i`-th sentence are
+    stored in ``heads[offsets[i]:offsets[i+1]]`` (see `concatenate` function). The result for each sentence is the same
+    as for the `conllutils.Sentence.is_projective` method.
+    """
+    heads = np.asarray(heads, dtype=np.int64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    num_sentences = len(offsets) - 1
+
+    sentences, positions, parents, valid = _tree_parents(heads, offsets)
+    depths, connected = _depths(parents)
+    valid &= np.bincount(sentences[~connected], minlength=num_sentences) == 0
+    tokens = valid[sentences]
+
+    # The tree is projective iff the words of each subtree form a continuous span.
+    parents = np.where(tokens, parents, -1)
+    start, end, size = _subtree_spans(parents, depths, positions)
+    discontinuous = tokens & (end - start + 1 != size)
+    mask = valid & (np.bincount(sentences[discontinuous], minlength=num_sentences) == 0)
+
+    # The sentences not forming the tree are checked for crossing arcs one by one.
+    for i in np.flatnonzero(~valid).tolist():
+        mask[i] = _is_projective(heads[offsets[i]:offsets[i+1]])
+    return mask
+
+def validate(heads, offsets, ids=None):
+    """Validate the dependency trees of all sentences with the concatenated HEAD values and return the array of error
+    codes for each sentence.
+
+    The HEAD values of all sentences are concatenated in the `heads` array, and the values of the `i`-th sentence are
+    stored in ``heads[offsets[i]:offsets[i+1]]`` (see `concatenate` function). Missing HEAD values are represented by
+    negative numbers. Optional `ids` array contains the concatenated IDs of the words, which are checked for the
+    ordering.
+
+    The error code is the bitwise OR of `MISSING_HEAD`, `HEAD_OUT_OF_RANGE`, `NO_ROOT`, `MULTIPLE_ROOTS`, `CYCLE` and
+    `INVALID_ORDER` constants for all errors found in the sentence, or 0 for valid trees.
+    """
+    heads = np.asarray(heads, dtype=np.int64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    num_sentences = len(offsets) - 1
+    lengths = np.diff(offsets)
+    sentences, positions, parents, _ = _tree_parents(heads, offsets)
+
+    def _any(mask):
+        return np.bincount(sentences[mask], minlength=num_sentences) > 0
+
+    roots = np.bincount(sentences[heads == 0], minlength=num_sentences)
+    # The words with missing or out of range HEAD are treated as the roots, so only the true cycles remain unconnected.
+    _, connected = _depths(parents)
+
+    errors = np.zeros(num_sentences, dtype=np.int64)
+    errors |= np.where(_any(heads < 0), MISSING_HEAD, 0)
+    errors |= np.where(_any(heads > lengths[sentences]), HEAD_OUT_OF_RANGE, 0)
+    errors |= np.where((roots == 0) & (lengths > 0), NO_ROOT, 0)
+    errors |= np.where(roots > 1, MULTIPLE_ROOTS, 0)
+    errors |= np.where(_any(~connected), CYCLE, 0)
+    if ids is not None:
+        errors |= np.where(_any(np.asarray(ids) != positions + 1), INVALID_ORDER, 0)
+    return errors
+
+def validate_sentences(sentences):
+    """Validate the dependency trees of the sentences or indexed instances and return the array of error codes.
+
+    For the sentences, HEADs and IDs of the syntactic words are validated. For the instances, only HEAD values are
+    validated. See `validate` function for the description of the error codes.
+    """
+    heads, ids, offsets = [], [], [0]
+    for sentence in sentences:
+        if isinstance(sentence, Instance):
+            values = sentence[HEAD] if HEAD in sentence else np.full(sentence.length or 0, -1)
+            heads.extend(values.tolist())
+            ids.extend(range(1, len(values) + 1))
+        else:
+            for token in sentence.words():
+                head = token.get(HEAD)
+                heads.append(-1 if head is None else head)
+                ids.append(token[ID])
+        offsets.append(len(heads))
+    return validate(np.array(heads, dtype=np.int64), np.array(offsets, dtype=np.int64), np.array(ids, dtype=np.int64))
+
+def split(values, offsets):
+    """Split the concatenated `values` into the list of arrays, one array for each sentence.
+
+    The result can be used to add the computed features as new fields of the instances, e.g.
+    ``for instance, depth in zip(instances, split(depths, offsets)): instance['depth'] = depth``.
+    """
+    return np.split(values, np.asarray(offsets)[1:-1])
+
+def tree_features(heads, offsets):
+    """Compute the tree features for all tokens of the sentences with the concatenated HEAD values.
+
+    The HEAD values of all sentences are concatenated in the `heads` array, and the values of the `i`-th sentence are
+    stored in ``heads[offsets[i]:offsets[i+1]]`` (see `concatenate` function). Return the dictionary of arrays aligned
+    with the `heads`:
+
+    * 'depth' - the number of arcs on the path from the word to the root (0 for the root),
+    * 'subtree_size' - the number of words in the subtree of the word (including the word),
+    * 'distance' - the signed distance ``HEAD - ID`` from the word to its head (0 for the root),
+    * 'direction' - the direction of the head, -1 if the head precedes the word, 1 if it follows the word and 0 for the
+      root,
+    * 'siblings' - the number of the other words with the same head (0 for the root).
+
+    Raises:
+        ValueError: If some of the sentences do not form a dependency tree with exactly one root.
+    """
+    heads = np.asarray(heads, dtype=np.int64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    _, positions, parents, depths = _valid_tree(heads, offsets)
+
+    _, _, size = _subtree_spans(parents, depths, positions)
+    distance = np.where(heads > 0, heads - positions - 1, 0)
+    children = np.bincount(parents[parents >= 0], minlength=len(heads))
+    siblings = np.where(parents >= 0, children[np.maximum(parents, 0)] - 1, 0)
+    return {
+        'depth': depths,
+        'subtree_size': size,
+        'distance': distance,
+        'direction': np.sign(distance),
+        'siblings': siblings
+    }
+
+def root_paths(heads, offsets):
+    """Return the paths from all words to the root of their sentence.
+
+    The HEAD values are concatenated as for the `tree_features` function. The result is the tuple
+    ``(paths, path_offsets)``, where the path of the `k`-th word in the `heads` array is stored in
+    ``paths[path_offsets[k]:path_offsets[k+1]]``. The path starts with the word and ends with the root, and contains the
+    indices of the words within the sentence (from 0).
+
+    Raises:
+        ValueError: If some of the sentences do not form a dependency tree with exactly one root.
+    """
+    heads = np.asarray(heads, dtype=np.int64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    _, positions, parents, depths = _valid_tree(heads, offsets)
+
+    path_offsets = np.zeros(len(heads) + 1, dtype=np.int64)
+    np.cumsum(depths + 1, out=path_offsets[1:])
+    paths = np.empty(path_offsets[-1], dtype=np.int64)
+
+    # Fill the k-th step of all paths at once.
+    nodes = np.arange(len(heads))
+    ancestors = nodes
+    for k in range(int(depths.max()) + 1 if len(heads) > 0 else 0):
+        paths[path_offsets[nodes] + k] = positions[ancestors]
+        more = depths[nodes] > k
+        nodes = nodes[more]
+        ancestors = parents[ancestors[more]]
+    return paths, path_offsets
+
+def _valid_tree(heads, offsets):
+    sentences, positions, parents, valid = _tree_parents(heads, offsets)
+    depths, connected = _depths(parents)
+    valid &= np.bincount(sentences[~connected], minlength=len(offsets) - 1) == 0
+    if not valid.all():
+        raise ValueError(f'sentence {int(np.argmin(valid))} is not a valid dependency tree')
+    return sentences, positions, parents, depths
+
+def _tree_parents(heads, offsets):
+    # Return the sentence and position of each token, the global index of the parent (-1 for the roots) and the mask of
+    # the sentences with exactly one root and with all HEAD values in the range.
+    lengths = np.diff(offsets)
+    num_sentences = len(lengths)
+    sentences = np.repeat(np.arange(num_sentences), lengths)
+    starts = offsets[:-1][sentences]
+    positions = np.arange(len(heads)) - starts
+
+    in_range = (heads >= 0) & (heads <= lengths[sentences])
+    roots = np.bincount(sentences[heads == 0], minlength=num_sentences)
+    valid = (np.bincount(sentences[~in_range], minlength=num_sentences) == 0) & ((roots == 1) | (lengths == 0))
+
+    parents = np.where(in_range & (heads > 0), starts + heads - 1, -1)
+    return sentences, positions, parents, valid
+
+def _depths(parents):
+    # Depth of each node computed by the pointer doubling, and the mask of the nodes connected to the root.
+    n = len(parents)
+    jumps = np.where(parents >= 0, parents, np.arange(n))
+    depths = (parents >= 0).astype(np.int64)
+    for _ in range(n.bit_length()):
+        next_jumps = jumps[jumps]
+        if np.array_equal(next_jumps, jumps):
+            break
+        depths += depths[jumps]
+        jumps = next_jumps
+    connected = parents[jumps] < 0 if n > 0 else np.zeros(0, dtype=bool)
+    return depths, connected
+
+def _subtree_spans(parents, depths, positions):
+    # The first and the last position and the size of the subtree of each node, aggregated level by level from the
+    # deepest nodes to the roots.
+    start = positions.copy()
+    end = positions.copy()
+    size = np.ones(len(parents), dtype=np.int64)
+
+    order = np.argsort(-depths, kind='stable')
+    levels = np.split(order, np.flatnonzero(np.diff(depths[order])) + 1)
+    for nodes in levels:
+        nodes = nodes[parents[nodes] >= 0]
+        if len(nodes) == 0:
+            continue
+        heads = parents[nodes]
+        np.minimum.at(start, heads, start[nodes])
+        np.maximum.at(end, heads, end[nodes])
+        np.add.at(size, heads, size[nodes])
+    return start, end, size
@@ -0,0 +1,175 @@
+import os
+import hashlib
+import tempfile
+import numpy as np
+
+from . import FORM
+
+class Deduplicator(object):
+    """A detector of the duplicate sentences used by the `pipeline.Pipeline.dedup` method.
+
+    The sentences are compared by the key, which can be 'text' (the text of the sentence, see `Sentence.text`), 'form'
+    (the sequence of the FORM values of the syntactic words), or the function returning the string or the sequence of
+    the values for the sentence.
+
+    In the 'exact' mode, the sentences are duplicates if they have the same 64-bit hash of the key. In the 'minhash'
+    mode, the near-duplicate sentences are detected by the locality-sensitive hashing (LSH) of the MinHash signatures
+    of the key shingles (i.e. the sequences of the `shingle_size` consecutive tokens of the key, where the string keys
+    are split to the tokens by the whitespace). The signatures with `num_perm` hash values are split into the bands
+    chosen for the Jaccard similarity `threshold`, and the sentence is a near-duplicate if some of its bands is equal
+    to the band of some previous sentence. Only the 64-bit hashes of the keys or bands are stored for the previous
+    sentences, in the in-memory table or in the memory-mapped temporary file created in `temp_dir`.
+
+    The object is callable and returns True for the first occurrence of the sentence (which is remembered) and False
+    for its duplicates.
+    """
+    def __init__(self, key='text', mode='exact', threshold=0.8, num_perm=128, shingle_size=3, temp_dir=None, seed=1):
+        if mode not in ('exact', 'minhash'):
+            raise ValueError(f'unknown dedup mode {mode}')
+        if not 0.0 < threshold <= 1.0:
+            raise ValueError('threshold must be > 0 and <= 1')
+        if not callable(key) and key not in ('text', 'form'):
+            raise ValueError(f'unknown dedup key {key}')
+        self.key = key
+        self.mode = mode
+        self.shingle_size = shingle_size
+        self.hashes = _HashSet(temp_dir=temp_dir)
+        if mode == 'minhash':
+            self.bands, self.rows = _optimal_bands(threshold, num_perm)
+            random = np.random.RandomState(seed)
+            self._a = random.randint(1, _MERSENNE_PRIME, num_perm, dtype=np.uint64)
+            self._b = random.randint(0, _MERSENNE_PRIME, num_perm, dtype=np.uint64)
+
+    def __call__(self, sentence):
+        tokens = self._tokens(sentence)
+        if self.mode == 'exact':
+            return self.hashes.add(_hash64('\t'.join(tokens).encode('utf-8')))
+
+        signature = self._signature(tokens)
+        bands = [_hash64(i.to_bytes(4, 'little') + signature[i*self.rows:(i+1)*self.rows].tobytes())
+                 for i in range(self.bands)]
+        if any(band in self.hashes for band in bands):
+            return False
+        for band in bands:
+            self.hashes.add(band)
+        return True
+
+    def state(self):
+        """Return the hashes stored for the previous sentences."""
+        return self.hashes.values()
+
+    def restore(self, state):
+        """Restore the hashes returned by the `Deduplicator.state` method."""
+        for h in state.tolist():
+            self.hashes.add(h)
+
+    def close(self):
+        """Release the hash table and remove its temporary file."""
+        self.hashes.close()
+
+    def _tokens(self, sentence):
+        if self.key == 'text':
+            return sentence.text().split()
+        if self.key == 'form':
+            return [token.get(FORM, '_') for token in sentence.words()]
+        key = self.key(sentence)
+        return key.split() if isinstance(key, str) else [str(value) for value in key]
+
+    def _signature(self, tokens):
+        n = self.shingle_size
+        shingles = {'\t'.join(tokens[i:i+n]) for i in range(max(len(tokens) - n + 1, 1))}
+        hashes = np.array([_hash64(s.encode('utf-8')) & 0xFFFFFFFF for s in shingles], dtype=np.uint64)
+        # The universal hashing (a * h + b) mod p simulates the random permutations of the shingle hashes.
+        return ((hashes[:, None] * self._a + self._b) % _MERSENNE_PRIME).min(axis=0)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+
+def _hash64(data):
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+def _optimal_bands(threshold, num_perm):
+    # Number of bands and rows per band minimizing the sum of the probabilities of the false positives and negatives
+    # for the Jaccard similarity threshold.
+    s = np.linspace(0.0, 1.0, 201)
+    best, result = None, (1, num_perm)
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        p = 1.0 - (1.0 - s ** rows) ** bands
+        error = np.sum(np.where(s < threshold, p, 1.0 - p))
+        if best is None or error < best:
+            best, result = error, (bands, rows)
+    return result
+
+class _HashSet(object):
+    # Open addressing table of the 64-bit hashes (0 marks the empty slot), optionally stored in the memory-mapped file.
+
+    def __init__(self, capacity=1024, temp_dir=None):
+        self.temp_dir = temp_dir
+        self.size = 0
+        self.filename = None
+        self.table = self._allocate(capacity)
+
+    def __contains__(self, h):
+        table = self.table
+        mask = len(table) - 1
+        h = h or 1
+        i = h & mask
+        while True:
+            value = int(table[i])
+            if value == h:
+                return True
+            if value == 0:
+                return False
+            i = (i + 1) & mask
+
+    def add(self, h):
+        # Add the hash and return True if it was not in the table.
+        table = self.table
+        mask = len(table) - 1
+        h = h or 1
+        i = h & mask
+        while True:
+            value = int(table[i])
+            if value == h:
+                return False
+            if value == 0:
+                break
+            i = (i + 1) & mask
+        table[i] = h
+        self.size += 1
+        if 2 * self.size > len(table):
+            self._resize(2 * len(table))
+        return True
+
+    def values(self):
+        if self.table is None:
+            return np.zeros(0, dtype=np.uint64) # Closed after the end of the iteration.
+        return self.table[self.table != 0].copy()
+
+    def close(self):
+        self.table = None
+        self._remove_file()
+
+    def _resize(self, capacity):
+        values = self.values()
+        self.table = None
+        self._remove_file()
+        self.table = self._allocate(capacity)
+        self.size = 0
+        for h in values.tolist():
+            self.add(h)
+
+    def _allocate(self, capacity):
+        if self.temp_dir is None:
+            return np.zeros(capacity, dtype=np.uint64)
+        fd, self.filename = tempfile.mkstemp(suffix='.hashes', dir=self.temp_dir)
+        os.close(fd)
+        return np.memmap(self.filename, dtype=np.uint64, mode='w+', shape=(capacity,))
+
+    def _remove_file(self):
+        if self.filename is not None:
+            try:
+                os.remove(self.filename)
+            except OSError:
+                pass
+            self.filename = None
@@ -0,0 +1,193 @@
+import numpy as np
+from collections import Counter
+
+from . import ID, DEPS, _parse_id, _id_to_str, _create_field_index
+
+class EnhancedGraph(object):
+    """An enhanced dependency graph of one or more sentences stored in the compressed sparse row (CSR) form.
+
+    The nodes of the graph are the syntactic words and the empty tokens of the sentences (multiword tokens are not
+    included) in the order of the tokens. The nodes of the `i`-th sentence are numbered from ``node_offsets[i]`` to
+    ``node_offsets[i+1] - 1``, and ``ids[k]`` is the ID of the `k`-th node (see `conllutils.empty_id` for the encoding
+    of the empty tokens).
+
+    The arcs are stored twice, ordered by the dependents and by the heads. The heads of the node `k` are stored in
+    ``heads[head_offsets[k]:head_offsets[k+1]]`` with the relation labels in ``labels[head_offsets[k]:head_offsets[k+1]]``,
+    where the root (ID = 0) is represented by the head -1. The dependents of the node `k` are stored in
+    ``dependents[dependent_offsets[k]:dependent_offsets[k+1]]`` with the labels in ``dependent_labels``. The arcs from
+    the root are not included in the dependents (see `EnhancedGraph.roots` method).
+
+    The labels are integers indexed by the `label_index` mapping (see `build_graphs` function), or the strings if the
+    index is not used.
+
+    Use `build_graph` or `build_graphs` function, or `conllutils.Sentence.to_graph` method to create the graph.
+
+    Attributes:
+        ids (list): The IDs of all nodes.
+        node_offsets (np.ndarray): The offsets of the nodes for each sentence, with the length ``num_sentences + 1``.
+        head_offsets (np.ndarray): The offsets of the heads for each node, with the length ``len(graph) + 1``.
+        heads (np.ndarray): The heads of all nodes.
+        labels (np.ndarray): The relation labels of the arcs ordered by the dependents.
+        dependent_offsets (np.ndarray): The offsets of the dependents for each node, with the length
+            ``len(graph) + 1``.
+        dependents (np.ndarray): The dependents of all nodes.
+        dependent_labels (np.ndarray): The relation labels of the arcs ordered by the heads.
+
+    """
+    def __init__(self, ids, node_offsets, head_offsets, heads, labels):
+        self.ids = ids
+        self.node_offsets = node_offsets
+        self.head_offsets = head_offsets
+        self.heads = heads
+        self.labels = labels
+
+        arcs = np.flatnonzero(heads >= 0)
+        order = arcs[np.lexsort((self.arc_dependents()[arcs], heads[arcs]))]
+        self.dependent_offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(heads[order], minlength=len(ids)), out=self.dependent_offsets[1:])
+        self.dependents = self.arc_dependents()[order]
+        self.dependent_labels = labels[order]
+
+    @property
+    def num_sentences(self):
+        """int: The number of sentences in the graph."""
+        return len(self.node_offsets) - 1
+
+    @property
+    def num_arcs(self):
+        """int: The number of arcs (including the arcs from the root)."""
+        return len(self.heads)
+
+    def __len__(self):
+        # Return the number of nodes.
+        return len(self.ids)
+
+    def node(self, id, sentence=0):
+        """Return the index of the node with the ID `id` in the `sentence`.
+
+        Raises:
+            KeyError: If the sentence has no node with the ID `id`.
+        """
+        start, end = self.node_offsets[sentence], self.node_offsets[sentence + 1]
+        for k in range(start, end):
+            if self.ids[k] == id:
+                return k
+        raise KeyError(f'no node with ID {_id_to_str(id)} in sentence {sentence}')
+
+    def head_nodes(self, k):
+        """Return the array of the heads of the node `k` (-1 for the root)."""
+        return self.heads[self.head_offsets[k]:self.head_offsets[k + 1]]
+
+    def dependent_nodes(self, k):
+        """Return the array of the dependents of the node `k`."""
+        return self.dependents[self.dependent_offsets[k]:self.dependent_offsets[k + 1]]
+
+    def in_arcs(self, k):
+        """Return an iterator over the ``(head, label)`` pairs of the arcs ending in the node `k`."""
+        start, end = self.head_offsets[k], self.head_offsets[k + 1]
+        return zip(self.heads[start:end].tolist(), self.labels[start:end].tolist())
+
+    def out_arcs(self, k):
+        """Return an iterator over the ``(dependent, label)`` pairs of the arcs starting in the node `k`."""
+        start, end = self.dependent_offsets[k], self.dependent_offsets[k + 1]
+        return zip(self.dependents[start:end].tolist(), self.dependent_labels[start:end].tolist())
+
+    def roots(self):
+        """Return the array of the nodes depending on the root."""
+        return self.arc_dependents()[self.heads < 0]
+
+    def arc_dependents(self):
+        """Return the array of the dependents aligned with the `heads` and `labels` arrays."""
+        return np.repeat(np.arange(len(self.ids)), np.diff(self.head_offsets))
+
+def build_graph(sentence, label_index=None):
+    """Return an enhanced dependency graph of the sentence.
+
+    See `build_graphs` function for the description of the arguments.
+    """
+    return build_graphs([sentence], label_index)
+
+def build_graphs(sentences, label_index=None):
+    """Return an enhanced dependency graph of all `sentences` built from the DEPS values of their tokens.
+
+    The DEPS values can be the raw strings or parsed as the sets of head-deprel tuples. The node indices of the heads
+    are resolved at once for all sentences. The relation labels are mapped to the integers by the `label_index`
+    (e.g. created by the `create_deps_index` function, or the DEPREL index ``index[DEPREL]`` created by
+    `conllutils.create_index`). If `label_index` is None, the labels are stored as the strings.
+
+    Raises:
+        ValueError: If the DEPS value refers to the head which is not in the sentence.
+    """
+    ids, node_sentences, node_offsets = [], [], [0]
+    counts, head_ids, labels = [], [], []
+    for i, sentence in enumerate(sentences):
+        for token in sentence:
+            if token.is_multiword:
+                continue
+            ids.append(token[ID])
+            arcs = _deps_arcs(token.get(DEPS))
+            counts.append(len(arcs))
+            for head, label in arcs:
+                head_ids.append(head)
+                labels.append(label)
+        node_sentences.extend([i] * (len(ids) - node_offsets[-1]))
+        node_offsets.append(len(ids))
+
+    node_sentences = np.array(node_sentences, dtype=np.int64)
+    head_offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    np.cumsum(counts, out=head_offsets[1:])
+    dependents = np.repeat(np.arange(len(ids)), counts)
+
+    # Resolve the head IDs to the node indices by the binary search over the sorted node keys.
+    node_keys = node_sentences * _SENTENCE_KEY + _id_keys(ids)
+    order = np.argsort(node_keys, kind='stable')
+    sorted_keys = node_keys[order]
+    head_keys = node_sentences[dependents] * _SENTENCE_KEY + _id_keys(head_ids)
+    positions = np.minimum(np.searchsorted(sorted_keys, head_keys), max(len(ids) - 1, 0))
+    root = np.array([head == 0 for head in head_ids], dtype=bool)
+    found = root | (sorted_keys[positions] == head_keys)
+    if not found.all():
+        k = int(np.argmin(found))
+        raise ValueError(f'head {_id_to_str(head_ids[k])} of token {_id_to_str(ids[dependents[k]])} not found')
+    heads = np.where(root, -1, order[positions])
+
+    # Sort the heads of each node in the order of the nodes, with the root first.
+    arcs = np.lexsort((heads, dependents))
+    heads = heads[arcs]
+    if label_index is not None:
+        labels = np.array([label_index[label] for label in labels], dtype=np.int64)
+    else:
+        labels = np.array(labels, dtype=object)
+    return EnhancedGraph(ids, np.array(node_offsets, dtype=np.int64), head_offsets, heads, labels[arcs])
+
+def create_deps_index(sentences, min_frequency=1, missing_index=None):
+    """Return an index mapping the relation labels of the DEPS values in the `sentences` to integer indexes.
+
+    The indexes are assigned in the same way as for the fields in the `conllutils.create_index` function (i.e. by the
+    descending frequency starting from 1, with 0 for the unknown labels), and the result can be used as the
+    `label_index` for the `build_graphs` function.
+    """
+    counter = Counter()
+    for sentence in sentences:
+        for token in sentence:
+            for _, label in _deps_arcs(token.get(DEPS)):
+                counter[label] += 1
+    return _create_field_index(DEPS, counter, min_frequency, missing_index)
+
+_SENTENCE_KEY = 1 << 40
+_EMPTY_KEY = 1 << 16
+
+def _id_keys(ids):
+    # Integer keys preserving the ordering of the word and empty token IDs.
+    return np.array([id * _EMPTY_KEY if isinstance(id, int) else id[0] * _EMPTY_KEY + id[1] for id in ids],
+                    dtype=np.int64)
+
+def _deps_arcs(deps):
+    if deps is None:
+        return []
+    if isinstance(deps, str):
+        return [(_parse_head(rel[0]), rel[1]) for rel in (rel.split(':', 1) for rel in deps.split('|'))]
+    return sorted(deps, key=lambda rel: (rel[0][:2] if isinstance(rel[0], tuple) else (rel[0], 0), rel[1]))
+
+def _parse_head(s):
+    return int(s) if '.' not in s else _parse_id(s)
@@ -1,4 +1,6 @@
 import os
+import pickle
+import numpy as np
 
 from . import Instance, write_conllu, read_conllu
 
@@ -34,8 +36,42 @@ class _TextDriver(object):
             for line in file:
                 yield line
 
+_RECORD_OBJECT = 0
+_RECORD_INSTANCE = 1
+
+def _write_record(fp, data):
+    # Instances are written with the NumPy arrays stored in the native .npy format, other data are pickled.
+    if isinstance(data, Instance):
+        pickle.dump((_RECORD_INSTANCE, data.metadata, list(data.keys())), fp, pickle.HIGHEST_PROTOCOL)
+        for array in data.values():
+            np.lib.format.write_array(fp, np.asanyarray(array), allow_pickle=True)
+    else:
+        pickle.dump((_RECORD_OBJECT, data), fp, pickle.HIGHEST_PROTOCOL)
+
+def _read_record(fp):
+    record = pickle.load(fp)
+    if record[0] == _RECORD_INSTANCE:
+        _, metadata, fields = record
+        instance = Instance(metadata=metadata)
+        for field in fields:
+            instance[field] = np.lib.format.read_array(fp, allow_pickle=True)
+        return instance
+    return record[1]
+
+def _read_records(fp):
+    while True:
+        try:
+            data = _read_record(fp)
+        except EOFError:
+            return
+        yield data
+
 _DRIVERS = {'txt': _TextDriver(), 'conllu': _CoNLLUDriver()}
 
+def _is_random_access(format):
+    # True if the driver reads the random-access dataset instead of the iterator.
+    return getattr(_get_driver(format), 'random_access', False)
+
 def _get_driver(format):
     driver = _DRIVERS.get(format)
     if driver is None:
@@ -54,8 +90,26 @@ else:
     class _HDF5Driver(object):
 
         METADATA_ATTR = 'comments'
+        FORMAT_ATTR = 'format'
+        COLUMNAR_FORMAT = 'columnar'
+
+        random_access = True
 
-        def write(self, file, data, write_comments=True):
+        def write(self, file, data, write_comments=True, layout='columnar', chunk_size=65536, compression='gzip'):
+            if layout == 'groups':
+                self._write_groups(file, data, write_comments)
+            elif layout == 'columnar':
+                with h5py.File(file, 'w') as f:
+                    f.attrs[self.FORMAT_ATTR] = self.COLUMNAR_FORMAT
+                    _ColumnarWriter(f, write_comments, chunk_size, compression).write(data)
+            else:
+                raise ValueError(f'unknown HDF5 layout {layout}')
+
+        def read(self, file, read_comments=True, batch_size=1024):
+            return InstanceDataset(file, read_comments, batch_size)
+
+        def _write_groups(self, file, data, write_comments):
+            # Legacy layout with one group per instance.
             with h5py.File(file, 'w', track_order=True) as f:
                 for i, instance in enumerate(data):
                     group = f.create_group(str(i))
@@ -71,22 +125,278 @@ else:
             for field, array in instance.items():
                 group.create_dataset(field, data=array)
 
-        def read(self, file, read_comments=True):
-            with h5py.File(file, 'r') as f:
-                for key in f.keys():
-                    group = f[key]
-                    instance = Instance()
-                    if read_comments:
-                        self._read_metadata(group, instance)
-                    self._read_data(group, instance)
-                    yield instance
-
-        def _read_metadata(self, group, instance):
-            if self.METADATA_ATTR in group.attrs:
-                instance.metadata = _parse_metadata(group.attrs[self.METADATA_ATTR].splitlines())
-
-        def _read_data(self, group, instance):
-            for field, array in group.items():
-                instance[field] = array[()]
+    # Columnar layout: the values of each field are concatenated for all instances in one dataset 'fields/<field>'.
+    # The instance `i` spans the tokens offsets[i]:offsets[i+1]. For the ':chars' fields, the characters of the token `k`
+    # are stored in chars[char_offsets[k]:char_offsets[k+1]] of the 'fields/<field>' and 'char_offsets/<field>'
+    # datasets, and the 'missing_chars/<field>' dataset marks the tokens without the value. The metadata are encoded
+    # as the comments in the 'metadata' string dataset, and 'has_metadata' dataset marks the instances with the metadata
+    # dictionary.
+
+    _COLUMNAR_BUFFER = 1024
+
+    class _ColumnarWriter(object):
+
+        def __init__(self, f, write_comments, chunk_size, compression):
+            self.f = f
+            self.write_comments = write_comments
+            self.options = {'chunks': (chunk_size,), 'maxshape': (None,), 'compression': compression}
+            self.fields = None
+            self.tokens = 0
+            self.chars = {}
+
+        def write(self, data):
+            self.f.create_dataset('offsets', data=np.zeros(1, dtype=np.int64), **self.options)
+            if self.write_comments:
+                self.f.create_dataset('metadata', shape=(0,), dtype=h5py.string_dtype('utf-8'), **self.options)
+                self.f.create_dataset('has_metadata', shape=(0,), dtype=bool, **self.options)
+            self.f.create_group('fields', track_order=True)
+            self.f.create_group('char_offsets', track_order=True)
+            self.f.create_group('missing_chars', track_order=True)
+
+            buffer = []
+            for instance in data:
+                buffer.append(instance)
+                if len(buffer) == _COLUMNAR_BUFFER:
+                    self._flush(buffer)
+                    buffer = []
+            self._flush(buffer)
+
+        def _flush(self, instances):
+            if not instances:
+                return
+            if self.fields is None:
+                self._create_fields(instances[0])
+
+            lengths = []
+            for instance in instances:
+                if instance.keys() != self._field_set:
+                    raise ValueError('all instances must have the same fields')
+                lengths.append(instance.length or 0)
+            offsets = self.tokens + np.cumsum(lengths, dtype=np.int64)
+            self.tokens = int(offsets[-1])
+            _append(self.f['offsets'], offsets)
+
+            if self.write_comments:
+                metadata = [instance.metadata for instance in instances]
+                _append(self.f['metadata'], ['\n'.join(_metadata_to_str(m)) if isinstance(m, dict) else ''
+                                             for m in metadata])
+                _append(self.f['has_metadata'], np.array([isinstance(m, dict) for m in metadata]))
+
+            for field in self.fields:
+                dataset = self.f['fields'][field]
+                if field in self.chars:
+                    values = [value for instance in instances for value in instance[field]]
+                    lengths = [len(value) if value is not None else 0 for value in values]
+                    char_offsets = self.chars[field] + np.cumsum(lengths, dtype=np.int64)
+                    if len(char_offsets) > 0:
+                        self.chars[field] = int(char_offsets[-1])
+                    _append(self.f['char_offsets'][field], char_offsets)
+                    _append(self.f['missing_chars'][field], np.array([value is None for value in values], dtype=bool))
+                    values = [value for value in values if value is not None and len(value) > 0]
+                    if values:
+                        _append(dataset, np.concatenate(values))
+                else:
+                    _append(dataset, np.concatenate([instance[field] for instance in instances]))
+
+        def _create_fields(self, instance):
+            self.fields = list(instance.keys())
+            self._field_set = instance.keys()
+            for field, array in instance.items():
+                array = np.asanyarray(array)
+                if array.dtype == object:
+                    # The ':chars' fields with the array of the character indexes for each token.
+                    values = [value for value in array if value is not None]
+                    dtype = np.asanyarray(values[0]).dtype if values else np.int64
+                    self.chars[field] = 0
+                    self.f['char_offsets'].create_dataset(field, data=np.zeros(1, dtype=np.int64), **self.options)
+                    # The mask of the tokens without the value, which are stored as the empty arrays.
+                    self.f['missing_chars'].create_dataset(field, shape=(0,), dtype=bool, **self.options)
+                else:
+                    dtype = array.dtype
+                self.f['fields'].create_dataset(field, shape=(0,), dtype=dtype, **self.options)
+
+    def _append(dataset, values):
+        start = dataset.shape[0]
+        dataset.resize((start + len(values),))
+        dataset[start:] = values
+
+    class InstanceDataset(object):
+        """A random-access dataset of the instances stored in the HDF5 file, returned by the
+        ``read_file(file, 'hdf5')`` function.
+
+        The dataset supports ``len(dataset)`` and indexing. ``dataset[i]`` returns the `i`-th instance, and
+        ``dataset[start:end:step]`` or ``dataset[indices]`` (for the sequence or array of the integer indices) return the
+        list of instances. The instances with the contiguous indices are read at once with one slice of each HDF5
+        dataset. Iteration over the dataset reads all instances in the slices of `batch_size` instances.
+
+        The file is opened on the first access by indexing and remains open until the `InstanceDataset.close` method is
+        called. Each iteration over the dataset opens its own handle of the file, which is closed at the end of the
+        iteration. The dataset can be pickled (e.g. for the worker processes), and the copies open the file
+        independently.
+        """
+        def __init__(self, file, read_comments=True, batch_size=1024):
+            self.file = file
+            self.read_comments = read_comments
+            self.batch_size = batch_size
+            self._f = None
+            self._reader = None
+
+        def __len__(self):
+            if self._reader is None:
+                # Do not keep the file open e.g. for the length hint of the iteration.
+                with h5py.File(self.file, 'r') as f:
+                    return len(_open_reader(f))
+            return len(self._reader)
+
+        def __getitem__(self, i):
+            reader = self._open()
+            if isinstance(i, slice):
+                start, end, step = i.indices(len(reader))
+                if step == 1:
+                    return reader.read_range(start, max(start, end), self.read_comments)
+                return self.take(np.arange(start, end, step))
+            if isinstance(i, (int, np.integer)):
+                n = len(reader)
+                if not -n <= i < n:
+                    raise IndexError('dataset index out of range')
+                i = int(i) % n
+                return reader.read_range(i, i + 1, self.read_comments)[0]
+            return self.take(i)
+
+        def __iter__(self):
+            # The iteration reads its own handle of the file, which is closed at the end of the iteration.
+            with h5py.File(self.file, 'r') as f:
+                reader = _open_reader(f)
+                for start in range(0, len(reader), self.batch_size):
+                    yield from reader.read_range(start, min(start + self.batch_size, len(reader)), self.read_comments)
+
+        def take(self, indices):
+            """Return the list of instances with the `indices`, reading the nearby instances at once."""
+            reader = self._open()
+            indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+            if np.any((indices < -len(reader)) | (indices >= len(reader))):
+                raise IndexError('dataset index out of range')
+            indices = indices % max(len(reader), 1)
+            unique = np.unique(indices)
+            instances = reader.read_indices(unique, self.read_comments) if len(unique) > 0 else []
+            return [instances[i] for i in np.searchsorted(unique, indices).tolist()]
+
+        def close(self):
+            """Close the HDF5 file."""
+            if self._f is not None:
+                self._f.close()
+                self._f = None
+                self._reader = None
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, exc_type, exc_value, traceback):
+            self.close()
+
+        def __getstate__(self):
+            return {'file': self.file, 'read_comments': self.read_comments, 'batch_size': self.batch_size}
+
+        def __setstate__(self, state):
+            self.__init__(**state)
+
+        def _open(self):
+            if self._reader is None:
+                self._f = h5py.File(self.file, 'r')
+                self._reader = _open_reader(self._f)
+            return self._reader
+
+    def _open_reader(f):
+        if f.attrs.get(_HDF5Driver.FORMAT_ATTR) == _HDF5Driver.COLUMNAR_FORMAT:
+            return _ColumnarReader(f)
+        return _GroupsReader(f)
+
+    class _GroupsReader(object):
+        # Reader of the legacy layout with one group per instance.
+
+        def __init__(self, f):
+            self.f = f
+            self.keys = list(f.keys())
+
+        def __len__(self):
+            return len(self.keys)
+
+        def read_range(self, start, end, read_comments=True):
+            return self.read_indices(range(start, end), read_comments)
+
+        def read_indices(self, indices, read_comments=True):
+            instances = []
+            for key in [self.keys[i] for i in indices]:
+                group = self.f[key]
+                instance = Instance()
+                if read_comments and _HDF5Driver.METADATA_ATTR in group.attrs:
+                    instance.metadata = _parse_metadata(group.attrs[_HDF5Driver.METADATA_ATTR].splitlines())
+                for field, array in group.items():
+                    instance[field] = array[()]
+                instances.append(instance)
+            return instances
+
+    class _ColumnarReader(object):
+
+        def __init__(self, f):
+            self.f = f
+            self.offsets = f['offsets'][()]
+            self.fields = list(f['fields'].keys())
+            self.chars = set(f['char_offsets'].keys())
+
+        def __len__(self):
+            return len(self.offsets) - 1
+
+        def read_range(self, start, end, read_comments=True):
+            # Return the list of the instances from `start` to `end` read with one slice of each dataset.
+            return self._read_span(np.arange(start, end), read_comments) if end > start else []
+
+        def read_indices(self, indices, read_comments=True):
+            # Return the list of the instances with the sorted unique `indices`. The instances separated by less than
+            # one chunk of tokens are read in one span, so that each chunk is decompressed only once.
+            gaps = self.offsets[indices[1:]] - self.offsets[indices[:-1] + 1]
+            instances = []
+            for span in np.split(indices, np.flatnonzero(gaps > self.max_gap) + 1):
+                instances += self._read_span(span, read_comments)
+            return instances
+
+        @property
+        def max_gap(self):
+            chunks = self.f['offsets'].chunks
+            return chunks[0] if chunks is not None else 0
+
+        def _read_span(self, indices, read_comments):
+            first, last = int(indices[0]), int(indices[-1]) + 1
+            lo, hi = int(self.offsets[first]), int(self.offsets[last])
+            starts = (self.offsets[indices] - lo).tolist()
+            ends = (self.offsets[indices + 1] - lo).tolist()
+            instances = [Instance() for _ in range(len(indices))]
+
+            if read_comments and 'metadata' in self.f:
+                selected = indices - first
+                metadata = self.f['metadata'].asstr()[first:last][selected]
+                has_metadata = self.f['has_metadata'][first:last][selected]
+                for instance, m, has in zip(instances, metadata, has_metadata):
+                    if has:
+                        instance.metadata = _parse_metadata(m.splitlines())
+
+            for field in self.fields:
+                dataset = self.f['fields'][field]
+                if field in self.chars:
+                    char_offsets = self.f['char_offsets'][field][lo:hi + 1]
+                    chars = dataset[char_offsets[0]:char_offsets[-1]] if hi > lo else dataset[0:0]
+                    char_offsets = (char_offsets - char_offsets[0]).tolist()
+                    missing = self.f['missing_chars'][field][lo:hi].tolist()
+                    for instance, start, end in zip(instances, starts, ends):
+                        values = np.empty(end - start, dtype=object)
+                        for k in range(start, end):
+                            if not missing[k]:
+                                values[k - start] = chars[char_offsets[k]:char_offsets[k + 1]]
+                        instance[field] = values
+                else:
+                    values = dataset[lo:hi]
+                    for instance, start, end in zip(instances, starts, ends):
+                        instance[field] = values[start:end]
+            return instances
 
     _DRIVERS['hdf5'] = _HDF5Driver()
@@ -1,16 +1,36 @@
+import os
+import asyncio
+import inspect
 import re
+import time
+import types
+import hashlib
+import queue
+import pickle
+import functools
+import tempfile
+import threading
 import itertools
+from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 
-from . import Sentence, Token
-from . import read_conllu, write_conllu, create_index
+from . import Sentence, Token, Instance, HEAD
+from . import read_conllu, write_conllu, write_conllu_async, create_index, create_index_and_instances
 from . import _feats_to_str, _deps_to_str, _parse_feats, _parse_deps
-from .io import read_file, write_file
+from . import _map_to_instances, _scan_conllu, _scan_conllu_async, _index_conllu, _read_raw_sentence, _parse_raw_sentence
+from .batch import concatenate, projective_mask, validate_sentences
+from .dedup import Deduplicator
+from .io import read_file, write_file, _is_random_access, _write_record, _read_records
 
 class Pipeline(object):
 
     def __init__(self, source=None):
         self._pipeline = _Pipe(source)
+        self._iterator = None
+        self._restore = None
+        self._transforms = []
+        self._memoize = None
 
     def filter_token(self, f):
         self.token.filter(f)
@@ -48,12 +68,12 @@ class Pipeline(object):
         self.token.remove_fields(fields, *args)
         return self
 
-    def filter_field(self, field, f):
-        self.token.filter_field(field, f)
+    def filter_field(self, field, f, pure=False):
+        self.token.filter_field(field, f, pure)
         return self
 
-    def map_field(self, field, f, to=None):
-        self.token.map_field(field, f, to)
+    def map_field(self, field, f, to=None, pure=False):
+        self.token.map_field(field, f, to, pure)
         return self
 
     def lowercase(self, field, to=None):
@@ -82,50 +102,83 @@ class Pipeline(object):
         if isinstance(opr, _TokenPipeline):
             return opr
         opr = _TokenPipeline(self)
-        self._append_opr(opr)
+        self._append_opr(opr, 'token')
         return opr
 
-    def filter(self, f):
-        self._append_opr(lambda s: s if f(s) else None)
+    def filter(self, f, metadata_only=False):
+        source = self._pipeline.generator
+        if metadata_only and isinstance(source, _ConlluSource) and not self._pipeline.operations:
+            # Skip the rejected sentences before parsing the tokens.
+            source.add_metadata_filter(lambda metadata: f(Sentence((), metadata)))
+            return self
+        self._append_opr(lambda s: s if f(s) else None, 'filter',
+                         lambda chunk: [s for s in chunk if f(s)])
         return self
 
     def only_projective(self, projective=True):
-        self.filter(lambda s: s.is_projective() == projective)
+        self._append_opr(lambda s: s if s.is_projective() == projective else None, 'only_projective',
+                         lambda chunk: _only_projective(chunk, projective))
+        return self
+
+    def only_valid(self, valid=True):
+        self._append_opr(lambda s: s if (validate_sentences([s])[0] == 0) == valid else None, 'only_valid',
+                         lambda chunk: _only_valid(chunk, valid))
         return self
     
     def map(self, f):
-        self._append_opr(f)
+        self._append_opr(f, 'map')
+        return self
+
+    def map_chunk(self, f):
+        self._append_opr(lambda s: next(iter(f([s])), None), 'map_chunk', f)
         return self
 
     def text(self, default_form='_'):
-        self.map(lambda s: s.text(default_form))
+        self._append_opr(lambda s: s.text(default_form), 'text',
+                         lambda chunk: [s.text(default_form) for s in chunk])
         return self
 
     def to_instance(self, index, fields=None, dtype=np.int64):
-        self.map(lambda s: s.to_instance(index, fields, dtype))
+        self._append_opr(lambda s: s.to_instance(index, fields, dtype), 'to_instance',
+                         lambda chunk: _map_to_instances(chunk, index, fields, dtype))
         return self
 
     def to_sentence(self, inverse_index):
-        self.map(lambda s: s.to_sentence(inverse_index))
+        self._append_opr(lambda s: s.to_sentence(inverse_index), 'to_sentence',
+                         lambda chunk: [s.to_sentence(inverse_index) for s in chunk])
         return self
 
     def to_conllu(self):
-        self.map(lambda s: s.to_conllu())
+        self._append_opr(lambda s: s.to_conllu(), 'to_conllu',
+                         lambda chunk: [s.to_conllu() for s in chunk])
         return self
 
     def from_conllu(self, s, **kwargs):
-        self._pipeline.set_source(Sentence.from_conllu(s, multiple=True, **kwargs))
+        self._pipeline.set_source(Sentence.from_conllu(s, multiple=True, **kwargs), 'from_conllu')
         return self
 
     def read_conllu(self, filename, **kwargs):
-        self._pipeline.set_generator(lambda: read_conllu(filename, **kwargs))
+        if isinstance(filename, (str, os.PathLike)):
+            generator = _ConlluSource(filename, kwargs)
+        elif _is_async_reader(filename):
+            generator = _AsyncConlluSource(filename, kwargs)
+        else:
+            generator = lambda: read_conllu(filename, **kwargs)
+        self._pipeline.set_generator(generator, filename, 'read_conllu')
         return self
 
     def write_conllu(self, filename):
         write_conllu(filename, self)
 
+    async def write_conllu_async(self, writer):
+        await write_conllu_async(writer, self)
+
     def read_file(self, filename, format, **kwargs):
-        self._pipeline.set_generator(lambda: read_file(filename, format, **kwargs))
+        if _is_random_access(format):
+            generator = _DatasetSource(lambda: read_file(filename, format, **kwargs))
+        else:
+            generator = lambda: read_file(filename, format, **kwargs)
+        self._pipeline.set_generator(generator, filename, 'read_file')
         return self
 
     def write_file(self, filename, format, **kwargs):
@@ -150,34 +203,134 @@ class Pipeline(object):
     def create_index(self, fields=None, min_frequency=1, missing_index=None):
         return create_index(self, fields, min_frequency, missing_index)
 
+    def create_index_and_instances(self, fields=None, min_frequency=1, missing_index=None, dtype=np.int64):
+        return create_index_and_instances(self, fields, min_frequency, missing_index, dtype)
+
+    def run(self, sinks, buffer_size=1024, copy=True):
+        return _run(self, sinks, buffer_size, copy)
+
     def pipe(self, *args):
         for p in args:
-            self._pipeline = _Pipe(self._pipeline, pipe=p)
+            self._append_pipe(p, 'pipe')
         return self
 
     def stream(self, max_size=None):
-        self.pipe(lambda source: _stream(source, max_size))
+        self._append_pipe(lambda source, state=None: _stream(source, max_size, state), 'stream')
         return self
 
-    def shuffle(self, buffer_size=1024, random=None):
+    def shuffle(self, buffer_size=1024, random=None, mode=None, temp_dir=None):
         if random is None:
             random = np.random
-        self.pipe(lambda source: _shuffle(source, buffer_size, random))
+        source = self._file_source()
+        if mode is None:
+            mode = 'index' if source is not None and source.shuffle is None else 'buffer'
+
+        if mode == 'index':
+            if source is None or source.shuffle is not None:
+                raise ValueError('index shuffle requires the CoNLL-U or random-access file source')
+            # Read sentences from the file in the randomly permuted order.
+            source.shuffle = random
+        elif mode == 'buffer':
+            self._append_pipe(lambda source, state=None: _shuffle(source, buffer_size, random, state), 'shuffle')
+        elif mode == 'external':
+            self._append_pipe(lambda source: _NoState(_external_shuffle(source, buffer_size, random, temp_dir),
+                                                      'external shuffle'), 'shuffle')
+        else:
+            raise ValueError(f'unknown shuffle mode {mode}')
+        self._pipeline.randoms.append(random)
+        return self
+
+    def dedup(self, key='text', mode='exact', threshold=0.8, num_perm=128, shingle_size=3, temp_dir=None):
+        factory = functools.partial(Deduplicator, key, mode, threshold, num_perm, shingle_size, temp_dir)
+        factory().close() # Validate the arguments.
+        self._append_pipe(lambda source, state=None: _dedup(source, factory, state), 'dedup')
         return self
 
     def batch(self, batch_size=100, size=None):
-        self.pipe(lambda source: _batch(source, batch_size, size))
+        self._append_pipe(lambda source, state=None: _batch(source, batch_size, size, state), 'batch')
         return self
 
     def flatten(self):
-        self.pipe(_flatten)
+        self._append_pipe(_flatten, 'flatten')
+        return self
+
+    def shard(self, num_shards, shard_index, mode='round_robin', size=None):
+        if not 0 <= shard_index < num_shards:
+            raise ValueError('shard_index must be >= 0 and < num_shards')
+        if mode not in ('round_robin', 'contiguous'):
+            raise ValueError(f'unknown sharding mode {mode}')
+
+        source = self._pipeline.generator
+        if isinstance(source, (_ConlluSource, _DatasetSource)) and source.shard is None and not source.is_filtered() \
+                and not self._pipeline.operations:
+            # Skip the sentences of other shards without parsing.
+            source.shard = (num_shards, shard_index, mode)
+        elif mode == 'round_robin':
+            self._append_pipe(lambda source, state=None: _shard(source, num_shards, shard_index, state), 'shard')
+        else:
+            # The number of the data must be known in advance, without iterating the source twice.
+            if size is not None:
+                get_size = lambda: size
+            else:
+                source = self._sized_source()
+                if source is None:
+                    raise ValueError('contiguous sharding requires the file source, the sized source or the size')
+                get_size = lambda: len(source)
+            self._append_pipe(lambda source, state=None: _contiguous_shard(source, num_shards, shard_index, get_size(),
+                                                                           state), 'shard')
+        return self
+
+    def cache(self, path=None, key=None):
+        self._append_pipe(_Cache(path, key), 'cache')
+        return self
+
+    def chunked(self, chunk_size=256):
+        if chunk_size is not None and chunk_size < 1:
+            raise ValueError('chunk_size must be >= 1')
+        for p in _chain(self._pipeline):
+            p.chunk_size = chunk_size
+        return self
+
+    def memoize(self, maxsize=65536):
+        self._memoize = maxsize
+        for transform in self._transforms:
+            transform.memoize(maxsize)
+        return self
+
+    def memoize_info(self):
+        return [transform.info() for transform in self._transforms if transform.cached is not None]
+
+    def profile(self, cpu=False):
+        profiler = Profiler(self, cpu)
+        profiler.enable()
+        return profiler
+
+    def state(self):
+        if self._iterator is None:
+            raise RuntimeError('pipeline is not iterated')
+        return {'iterator': _state(self._iterator), 'random': [_get_random_state(r) for r in self._randoms()]}
+
+    def restore(self, state):
+        self._restore = state
         return self
 
     def __call__(self, source=None):
         return self._pipeline.iterate(source)
 
     def __iter__(self):
-        return self._pipeline.iterate(None)
+        state, self._restore = self._restore, None
+        if state is not None:
+            for random, random_state in zip(self._randoms(), state['random']):
+                _set_random_state(random, random_state)
+            state = state['iterator']
+        self._iterator = self._pipeline.iterate(None, state)
+        return self._iterator
+
+    def aiter(self, chunk_size=1, executor=None):
+        return _AsyncIterator(self, chunk_size, executor)
+
+    def __aiter__(self):
+        return self.aiter()
 
     def __len__(self):
         return self.count()
@@ -185,73 +338,889 @@ class Pipeline(object):
     def _prev_opr(self):
         return self._pipeline.operations[-1] if self._pipeline.operations else None
 
-    def _append_opr(self, opr):
+    def _randoms(self):
+        randoms = []
+        for p in _chain(self._pipeline):
+            randoms.extend(r for r in p.randoms if not any(r is x for x in randoms))
+        return randoms
+
+    def _file_source(self):
+        # The CoNLL-U or random-access file source, if the data are streamed from the file without reordering.
+        p = self._pipeline
+        while p.name == 'stream':
+            p = p.source
+        return p.generator if isinstance(p.generator, (_ConlluSource, _DatasetSource)) else None
+
+    def _sized_source(self):
+        # The source collection with the known length (e.g. list), if the data are read directly from it.
+        p = self._pipeline
+        if p.pipe is None and not p.operations and not isinstance(p.source, (Pipeline, _Pipe)) and \
+                hasattr(p.source, '__len__'):
+            return p.source
+        return None
+
+    def _append_opr(self, opr, name, chunk_opr=None):
+        if chunk_opr is None:
+            chunk_opr = lambda chunk: [data for data in map(opr, chunk) if data is not None]
         self._pipeline.operations.append(opr)
+        self._pipeline.chunk_operations.append(chunk_opr)
+        self._pipeline.names.append(name)
+
+    def _append_pipe(self, p, name):
+        profiler = self._pipeline.profiler
+        chunk_size = self._pipeline.chunk_size
+        self._pipeline = _Pipe(self._pipeline, pipe=p, name=name)
+        self._pipeline.chunk_size = chunk_size
+        if profiler is not None:
+            profiler._attach(self._pipeline)
+
+def _only_projective(chunk, projective):
+    if all(isinstance(s, Instance) and HEAD in s for s in chunk):
+        # Check all instances in the chunk at once.
+        mask = projective_mask(*concatenate(chunk))
+        return [s for s, p in zip(chunk, mask.tolist()) if p == projective]
+    return [s for s in chunk if s.is_projective() == projective]
+
+def _only_valid(chunk, valid):
+    # Validate all sentences in the chunk at once.
+    errors = validate_sentences(chunk)
+    return [s for s, e in zip(chunk, errors.tolist()) if (e == 0) == valid]
+
+def _get_random_state(random):
+    if isinstance(random, np.random.Generator):
+        return random.bit_generator.state
+    return random.get_state()
+
+def _set_random_state(random, state):
+    if isinstance(random, np.random.Generator):
+        random.bit_generator.state = state
+    else:
+        random.set_state(state)
+
+# The functions returning the state of the suspended stage generators from their local variables, by the generator
+# code. The stages are generators to keep the iteration fast, and their state is read only by `Pipeline.state`. The
+# generators with the `state` argument continue from it, and it is also their state before the first item.
+_GENERATOR_STATES = {}
+
+def _stateful(state):
+    def register(f):
+        _GENERATOR_STATES[f.__code__] = state
+        return f
+    return register
+
+# The state of the finished iterator.
+_EXHAUSTED = 'exhausted'
+
+def _state(itr):
+    if hasattr(itr, 'state'):
+        return itr.state()
+    state = _GENERATOR_STATES.get(getattr(itr, 'gi_code', None))
+    if state is None:
+        return None
+    if itr.gi_frame is None:
+        return _EXHAUSTED
+    local_variables = itr.gi_frame.f_locals
+    if 'state' in local_variables and inspect.getgeneratorstate(itr) == inspect.GEN_CREATED:
+        return local_variables['state']
+    return state(local_variables)
+
+class _NoState(object):
+
+    def __init__(self, itr, name):
+        self.itr = itr
+        self.name = name
 
-def _stream(source, max_size):
-    i = 0
-    while True:
-        prev = i
-        for data in source:
-            if max_size is None or i < max_size:
-                yield data
-                i += 1
-            else:
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.itr)
+
+    def state(self):
+        raise RuntimeError(f'{self.name} does not support the pipeline state')
+
+@_stateful(lambda l: {'i': l['i'], 'prev': l['prev'], 'source': _state(l['itr']) if l['itr'] is not None else None})
+def _stream(source, max_size, state=None):
+    i, prev, itr = 0, 0, None
+    if state is not None:
+        i, prev = state['i'], state['prev']
+        if state['source'] is not None:
+            itr = _iterate(source, state['source'])
+
+    while max_size is None or i < max_size:
+        if itr is None:
+            prev = i
+            itr = _iterate(source)
+        for data in itr:
+            i += 1
+            yield data
+            if i == max_size:
                 return
+        itr = None
         if prev == i:
             return
 
-def _shuffle(source, buffer_size, random):
-    buffer = []
-    for data in source:
-        if len(buffer) < buffer_size:
-            buffer.append(data)
-        else:
-            i = random.randint(0, len(buffer))
-            elm = buffer[i]
-            buffer[i] = data
-            yield elm
-    random.shuffle(buffer)
-    for elm in buffer:
-        yield elm
-
-def _batch(source, batch_size, size=None):
-    s = 0
-    batch = []
-    for data in source:
+@_stateful(lambda l: {'buffer': list(l['buffer']), 'source': _state(l['itr']) if l['itr'] is not None else None})
+def _shuffle(source, buffer_size, random, state=None):
+    buffer, itr = [], None
+    if state is None:
+        itr = _iterate(source)
+    else:
+        buffer = list(state['buffer'])
+        if state['source'] is not None:
+            itr = _iterate(source, state['source'])
+
+    if itr is not None:
+        for data in itr:
+            if len(buffer) < buffer_size:
+                buffer.append(data)
+            else:
+                i = random.randint(0, len(buffer))
+                elm = buffer[i]
+                buffer[i] = data
+                yield elm
+        itr = None
+        random.shuffle(buffer)
+        # The remaining data are popped from the end of the buffer.
+        buffer.reverse()
+    while buffer:
+        yield buffer.pop()
+
+_SHUFFLE_BUCKETS = 64
+
+def _external_shuffle(source, buffer_size, random, temp_dir=None):
+    itr = iter(source)
+    buffer = list(itertools.islice(itr, buffer_size + 1))
+    if len(buffer) <= buffer_size:
+        random.shuffle(buffer)
+        yield from buffer
+        return
+
+    # Spill data into the randomly selected buckets, and shuffle the buckets recursively in the random order.
+    with tempfile.TemporaryDirectory(dir=temp_dir) as dirname:
+        paths = [os.path.join(dirname, str(i)) for i in range(_SHUFFLE_BUCKETS)]
+        counts = [0] * _SHUFFLE_BUCKETS
+        files = [open(path, 'wb') for path in paths]
+        try:
+            data = itertools.chain(buffer, itr)
+            del buffer
+            while True:
+                chunk = list(itertools.islice(data, 1024))
+                if not chunk:
+                    break
+                for elm, i in zip(chunk, random.randint(0, _SHUFFLE_BUCKETS, size=len(chunk))):
+                    _write_record(files[i], elm)
+                    counts[i] += 1
+        finally:
+            for fp in files:
+                fp.close()
+
+        for i in random.permutation(_SHUFFLE_BUCKETS):
+            if counts[i] > 0:
+                yield from _external_shuffle(_read_bucket(paths[i]), buffer_size, random, dirname)
+                os.remove(paths[i])
+
+def _read_bucket(path):
+    with open(path, 'rb') as fp:
+        yield from _read_records(fp)
+
+@_stateful(lambda l: {'s': l['s'], 'batch': list(l['batch']), 'source': _state(l['itr'])})
+def _batch(source, batch_size, size=None, state=None):
+    s, batch = (state['s'], list(state['batch'])) if state is not None else (0, [])
+    itr = _iterate(source, state['source'] if state is not None else None)
+    for data in itr:
         if s < batch_size:
             batch.append(data)
             s += 1 if size is None else size(data)
         else:
-            yield batch
-            batch = [data]
+            elm, batch = batch, [data]
             s = 1 if size is None else size(data)
+            yield elm
     if batch:
-        yield batch
+        elm, batch, s = batch, [], 0
+        yield elm
 
-def _flatten(source):
-    for data in source:
+@_stateful(lambda l: {'i': l['i'], 'source': _state(l['itr'])})
+def _shard(source, num_shards, shard_index, state=None):
+    i = state['i'] if state is not None else 0
+    itr = _iterate(source, state['source'] if state is not None else None)
+    for data in itr:
+        i += 1
+        if (i - 1) % num_shards == shard_index:
+            yield data
+
+@_stateful(lambda l: {'hashes': l['deduplicator'].state(), 'source': _state(l['itr'])})
+def _dedup(source, factory, state=None):
+    # The deduplicator is created at the start of the iteration, and closed (removing its temporary file) also after
+    # the incomplete iteration.
+    deduplicator = factory()
+    try:
+        if state is not None:
+            deduplicator.restore(state['hashes'])
+        itr = _iterate(source, state['source'] if state is not None else None)
+        for data in itr:
+            if deduplicator(data):
+                yield data
+    finally:
+        deduplicator.close()
+
+@_stateful(lambda l: {'i': l['i'], 'source': _state(l['itr'])})
+def _contiguous_shard(source, num_shards, shard_index, size, state=None):
+    start = size * shard_index // num_shards
+    end = size * (shard_index + 1) // num_shards
+    i = state['i'] if state is not None else 0
+    itr = _iterate(source, state['source'] if state is not None else None)
+    if i < start:
+        next(itertools.islice(itr, start - i, start - i), None)
+        i = start
+    for data in itertools.islice(itr, end - i):
+        i += 1
+        yield data
+
+@_stateful(lambda l: {'elms': list(l['elms'][l['i']:]), 'source': _state(l['itr'])})
+def _flatten(source, state=None):
+    itr = _iterate(source, state['source'] if state is not None else None)
+    # The elements of the current list or tuple, of which the first `i` were returned.
+    elms, i = state['elms'] if state is not None else (), 0
+    for elm in elms:
+        i += 1
+        yield elm
+    for data in itr:
         if isinstance(data, (tuple, list)):
+            elms, i = data, 0
             for elm in data:
+                i += 1
                 yield elm
         else:
+            elms = ()
             yield data
 
+_TEE_CHUNK = 64
+_TEE_END = object()
+_TEE_ABORT = object()
+
+class _Aborted(Exception):
+    pass
+
+class _Sink(threading.Thread):
+
+    def __init__(self, sink, buffer_size):
+        super().__init__(daemon=True)
+        self.sink = sink
+        self.queue = queue.Queue(max(1, buffer_size // _TEE_CHUNK))
+        self.result = None
+        self.error = None
+        self.done = False
+        self.ended = False
+
+    def run(self):
+        try:
+            self.result = self.sink(Pipeline(self._iterate()))
+        except _Aborted:
+            pass
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.done = True
+            # Drain the remaining data, so the producer is never blocked by the finished sink.
+            while not self.ended:
+                chunk = self.queue.get()
+                self.ended = chunk is _TEE_END or chunk is _TEE_ABORT
+
+    def _iterate(self):
+        while True:
+            chunk = self.queue.get()
+            if chunk is _TEE_END or chunk is _TEE_ABORT:
+                self.ended = True
+                if chunk is _TEE_ABORT:
+                    raise _Aborted()
+                return
+            yield from chunk
+
+def _run(source, sinks, buffer_size, copy=True):
+    threads = [_Sink(sink, buffer_size) for sink in sinks]
+    for thread in threads:
+        thread.start()
+
+    end = _TEE_ABORT
+    try:
+        itr = iter(source)
+        while True:
+            active = [thread for thread in threads if not thread.done]
+            if not active:
+                break
+            chunk = list(itertools.islice(itr, _TEE_CHUNK))
+            if not chunk:
+                break
+            for i, thread in enumerate(active):
+                if copy and i < len(active) - 1:
+                    # The sinks run concurrently and may modify the data in place (e.g. by the token operations),
+                    # so each of them except the last one reads its own copies made before the data are shared.
+                    thread.queue.put([_copy_data(elm) for elm in chunk])
+                else:
+                    thread.queue.put(chunk)
+        end = _TEE_END
+    finally:
+        for thread in threads:
+            thread.queue.put(end)
+        for thread in threads:
+            thread.join()
+
+    for thread in threads:
+        if thread.error is not None:
+            raise thread.error
+    return [thread.result for thread in threads]
+
+_READ_AHEAD = 1 << 16
+_SHUFFLE_WINDOW = 1024
+
+class _ConlluSource(object):
+
+    def __init__(self, filename, kwargs):
+        self.filename = filename
+        self.kwargs = kwargs
+        self.shard = None
+        self.shuffle = None
+        self._offsets = None
+        self._signature = None
+
+    def __call__(self, state=None):
+        if self.shuffle is not None:
+            return _read_shuffled(self, state)
+        return _read_conllu(self, state)
+
+    def is_filtered(self):
+        return self.kwargs.get('metadata_filter') is not None or self.kwargs.get('length_filter') is not None
+
+    def add_metadata_filter(self, f):
+        metadata_filter = self.kwargs.get('metadata_filter')
+        if metadata_filter is not None:
+            self.kwargs['metadata_filter'] = lambda metadata: metadata_filter(metadata) and f(metadata)
+        else:
+            self.kwargs['metadata_filter'] = f
+
+    def offsets(self):
+        # The cached array of sentence offsets, re-indexed when the file is modified.
+        stat = os.stat(self.filename)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        if self._offsets is None or self._signature != signature:
+            with open(self.filename, 'rb') as fp:
+                self._offsets = _index_conllu(fp)
+            self._signature = signature
+        return self._offsets
+
+    def _owned_offsets(self):
+        # Permutation starts from the sorted offsets to be reproducible by the random state. The cached array is copied,
+        # because it is shared by all concurrent iterations.
+        offsets = np.sort(self.offsets())
+        if self.shard is None:
+            return offsets
+        num_shards, shard_index, mode = self.shard
+        if mode == 'round_robin':
+            return offsets[shard_index::num_shards].copy()
+        start, end = self._byte_range()
+        return offsets[(offsets >= start) & (offsets < end)]
+
+    def _byte_range(self):
+        if self.shard is None or self.shard[2] != 'contiguous':
+            return 0, None
+        num_shards, shard_index, _ = self.shard
+        size = os.stat(self.filename).st_size
+        return size * shard_index // num_shards, size * (shard_index + 1) // num_shards
+
+@_stateful(lambda l: {'offset': l['offset'], 'i': l['i']})
+def _read_conllu(source, state=None):
+    kwargs = source.kwargs
+    num_shards, shard_index = 1, 0
+    if source.shard is not None and source.shard[2] == 'round_robin':
+        num_shards, shard_index, _ = source.shard
+
+    start, end = source._byte_range()
+    offset, i = (state['offset'], state['i']) if state is not None else (start, 0)
+    with open(source.filename, 'rb') as fp:
+        for sentence_offset, lines in _scan_conllu(fp, offset, end):
+            # The next sentence starts after the offset of the current one.
+            offset = sentence_offset + 1
+            i += 1
+            if (i - 1) % num_shards == shard_index:
+                sentence = _parse_raw_sentence(lines, **kwargs)
+                if sentence is not None:
+                    yield sentence
+
+@_stateful(lambda l: {'epoch_random': l['epoch_random'], 'random': _get_random_state(l['random']),
+                      'position': l['position']})
+def _read_shuffled(source, state=None):
+    kwargs = source.kwargs
+    random = source.shuffle
+    if state is not None:
+        _set_random_state(random, state['epoch_random'])
+
+    epoch_random = _get_random_state(random)
+    offsets = source._owned_offsets()
+    random.shuffle(offsets)
+    position = 0
+    if state is not None:
+        position = state['position']
+        _set_random_state(random, state['random'])
+
+    window = {}
+    with open(source.filename, 'rb', buffering=_READ_AHEAD) as fp:
+        while position < len(offsets):
+            offset = int(offsets[position])
+            if offset not in window:
+                # Read the window in the file order to coalesce reads within the read-ahead buffer.
+                window = np.sort(offsets[position:position+_SHUFFLE_WINDOW]).tolist()
+                window = {offset: _read_raw_sentence(fp, offset) for offset in window}
+
+            position += 1
+            sentence = _parse_raw_sentence(window.pop(offset), **kwargs)
+            if sentence is not None:
+                yield sentence
+
+class _DatasetSource(object):
+
+    def __init__(self, open_dataset):
+        self.open_dataset = open_dataset
+        self.shard = None
+        self.shuffle = None
+
+    def __call__(self, state=None):
+        return _read_dataset(self, state)
+
+    def is_filtered(self):
+        return False
+
+    def indices(self, size):
+        if self.shard is None:
+            return np.arange(size)
+        num_shards, shard_index, mode = self.shard
+        if mode == 'round_robin':
+            return np.arange(shard_index, size, num_shards)
+        return np.arange(size * shard_index // num_shards, size * (shard_index + 1) // num_shards)
+
+def _dataset_state(l):
+    state = {'position': l['position']}
+    if l['random'] is not None:
+        state['epoch_random'] = l['epoch_random']
+        state['random'] = _get_random_state(l['random'])
+    return state
+
+@_stateful(_dataset_state)
+def _read_dataset(source, state=None):
+    with source.open_dataset() as dataset:
+        indices = source.indices(len(dataset))
+        random, epoch_random = source.shuffle, None
+        if random is not None:
+            if state is not None:
+                _set_random_state(random, state['epoch_random'])
+            epoch_random = _get_random_state(random)
+            random.shuffle(indices)
+        position = 0
+        if state is not None:
+            position = state['position']
+            if random is not None:
+                _set_random_state(random, state['random'])
+
+        while position < len(indices):
+            # Read the window of the permuted indices at once, with the nearby instances coalesced.
+            window = dataset[indices[position:position+_SHUFFLE_WINDOW]]
+            for data in window:
+                position += 1
+                yield data
+
+def _is_async_reader(reader):
+    return hasattr(reader, '__aiter__') or inspect.iscoroutinefunction(getattr(reader, 'readline', None))
+
+# The event loop of the asynchronous iteration running in the current executor thread.
+_async_local = threading.local()
+
+class _AsyncConlluSource(object):
+
+    def __init__(self, reader, kwargs):
+        self.reader = reader
+        self.kwargs = kwargs
+
+    def __call__(self):
+        loop = getattr(_async_local, 'loop', None)
+        if loop is None:
+            raise RuntimeError('asynchronous source must be iterated with async for')
+        return self._read(loop, _scan_conllu_async(self.reader))
+
+    def _read(self, loop, scan):
+        while True:
+            # Read the raw lines in the event loop and parse them in the executor thread.
+            try:
+                lines = asyncio.run_coroutine_threadsafe(_anext(scan), loop).result()
+            except StopAsyncIteration:
+                return
+            sentence = _parse_raw_sentence(lines, **self.kwargs)
+            if sentence is not None:
+                yield sentence
+
+async def _anext(itr):
+    return await itr.__anext__()
+
+class _AsyncIterator(object):
+
+    def __init__(self, pipeline, chunk_size, executor):
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be >= 1')
+        self.pipeline = pipeline
+        self.chunk_size = chunk_size
+        self.executor = executor
+        self.owned = None
+        self.itr = None
+        self.chunk = []
+        self.finished = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.chunk:
+            if self.finished:
+                raise StopAsyncIteration
+            if self.executor is None:
+                # A dedicated thread, so that the executor is not blocked by the streams waiting for data.
+                self.owned = self.executor = ThreadPoolExecutor(1)
+            loop = asyncio.get_running_loop()
+            self.chunk = await loop.run_in_executor(self.executor, self._next_chunk, loop)
+            if not self.chunk:
+                self.finished = True
+                if self.owned is not None:
+                    self.owned.shutdown(wait=False)
+                raise StopAsyncIteration
+            self.chunk.reverse()
+        return self.chunk.pop()
+
+    def _next_chunk(self, loop):
+        _async_local.loop = loop
+        try:
+            if self.itr is None:
+                self.itr = iter(self.pipeline)
+            return list(itertools.islice(self.itr, self.chunk_size))
+        finally:
+            _async_local.loop = None
+
+_CACHE_MAGIC = b'CONLLUTILS-CACHE-1'
+
+class _Cache(object):
+
+    def __init__(self, path=None, key=None):
+        self.path = path
+        self.key = key
+        self.signature = None
+        self.data = None
+
+    def __call__(self, source):
+        if self.path is None:
+            # The stages preceding the in-memory cache are fixed by the pipeline.
+            signature = _source_signature(source)
+            if self.data is not None and self.signature == signature:
+                return map(_copy_data, self.data)
+            return self._record(source, signature)
+        fingerprint, unknown = _stages_fingerprint(source)
+        if unknown and self.key is None:
+            raise ValueError(f'cannot fingerprint the values {", ".join(sorted(unknown))} used by the cached stages, '
+                             'the cache key has to be specified')
+        signature = (_source_signature(source), fingerprint, self.key)
+        if self._read_signature() == signature:
+            return self._replay()
+        return self._record_file(source, signature)
+
+    def _record(self, source, signature):
+        data = []
+        for elm in source:
+            # The returned data can be modified in place by the following stages.
+            data.append(_copy_data(elm))
+            yield elm
+        # Commit only the complete iteration.
+        self.data = data
+        self.signature = signature
+
+    def _read_signature(self):
+        try:
+            with open(self.path, 'rb') as fp:
+                if fp.read(len(_CACHE_MAGIC)) != _CACHE_MAGIC:
+                    return None
+                return pickle.load(fp)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def _replay(self):
+        with open(self.path, 'rb') as fp:
+            fp.read(len(_CACHE_MAGIC))
+            pickle.load(fp)
+            yield from _read_records(fp)
+
+    def _record_file(self, source, signature):
+        temp = os.fspath(self.path) + '.tmp'
+        try:
+            with open(temp, 'wb') as fp:
+                fp.write(_CACHE_MAGIC)
+                pickle.dump(signature, fp, pickle.HIGHEST_PROTOCOL)
+                for elm in source:
+                    _write_record(fp, elm)
+                    yield elm
+            # Commit only the complete iteration.
+            os.replace(temp, self.path)
+        finally:
+            if os.path.exists(temp):
+                os.remove(temp)
+
+def _copy_data(data):
+    # Copy of the sentence or instance, which can be modified by the token operations without changing the original.
+    if isinstance(data, Sentence):
+        return Sentence([token.copy() for token in data], data.metadata)
+    if isinstance(data, Instance):
+        return Instance({f: v.copy() if isinstance(v, np.ndarray) else v for f, v in data.items()}, data.metadata)
+    return deepcopy(data)
+
+def _source_signature(source):
+    # The list of (path, size, modification time) of all files read by the source pipeline.
+    signature = []
+    for pipe in _upstream(source):
+        if pipe.filename is not None:
+            stat = os.stat(pipe.filename)
+            signature.append((os.path.abspath(pipe.filename), stat.st_size, stat.st_mtime_ns))
+    return signature
+
+def _stages_fingerprint(source):
+    # The digest of the stages producing the cached data, i.e. their names, the code of their functions, and the values
+    # captured by the functions, and the set of type names of the values, which are identified only by the type.
+    h = hashlib.sha256()
+    unknown = set()
+    for p in _chain(source):
+        stage = (p.name, tuple(p.names), p.generator, p.pipe, tuple(p.operations))
+        h.update(repr(_fingerprint(stage, unknown)).encode('utf-8'))
+    return h.hexdigest(), unknown
+
+_FINGERPRINT_DEPTH = 32
+
+def _fingerprint(value, unknown, depth=0):
+    if value is None or isinstance(value, (bool, int, float, str, bytes)):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (type, types.BuiltinFunctionType, types.MethodDescriptorType, types.WrapperDescriptorType)):
+        return f'{getattr(value, "__module__", None)}.{value.__qualname__}'
+    if depth > _FINGERPRINT_DEPTH:
+        unknown.add(type(value).__qualname__)
+        return type(value).__qualname__
+    depth += 1
+    if isinstance(value, os.PathLike):
+        return os.fspath(value)
+    if isinstance(value, (tuple, list)):
+        return tuple(_fingerprint(v, unknown, depth) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(repr(_fingerprint(v, unknown, depth)) for v in value))
+    if isinstance(value, dict):
+        return ('dict', tuple(sorted(repr((_fingerprint(k, unknown, depth), _fingerprint(v, unknown, depth)))
+                                     for k, v in value.items())))
+    if isinstance(value, np.ndarray):
+        return ('ndarray', value.dtype.str, value.shape, hashlib.sha256(np.ascontiguousarray(value).data).hexdigest())
+    if isinstance(value, types.CodeType):
+        return (value.co_code, value.co_names, _fingerprint(value.co_consts, unknown, depth))
+    if isinstance(value, types.FunctionType):
+        closure = tuple(cell.cell_contents for cell in value.__closure__ or () if _is_cell_set(cell))
+        return (_fingerprint(value.__code__, unknown, depth), _fingerprint(closure, unknown, depth),
+                _fingerprint(value.__defaults__, unknown, depth), _fingerprint(value.__kwdefaults__, unknown, depth))
+    if isinstance(value, types.MethodType):
+        return (_fingerprint(value.__func__, unknown, depth), _fingerprint(value.__self__, unknown, depth))
+    if isinstance(value, functools.partial):
+        return (_fingerprint(value.func, unknown, depth), _fingerprint(value.args, unknown, depth),
+                _fingerprint(value.keywords, unknown, depth))
+    if isinstance(value, _TokenPipeline):
+        return ('token', _fingerprint(value.operations, unknown, depth))
+    if isinstance(value, _Transform):
+        return ('transform', value.name, value.field, _fingerprint(value.f, unknown, depth))
+    if isinstance(value, _ConlluSource):
+        return ('read_conllu', os.fspath(value.filename), _fingerprint(value.kwargs, unknown, depth), value.shard)
+    if isinstance(value, _Cache):
+        return ('cache', _fingerprint(value.path, unknown, depth), _fingerprint(value.key, unknown, depth))
+    # Other objects are identified only by the type.
+    unknown.add(type(value).__qualname__)
+    return type(value).__qualname__
+
+def _is_cell_set(cell):
+    try:
+        cell.cell_contents
+        return True
+    except ValueError:
+        return False
+
+def _upstream(source):
+    while source is not None:
+        if isinstance(source, Pipeline):
+            source = source._pipeline
+        if not isinstance(source, _Pipe):
+            return
+        yield source
+        source = source.source
+
+class _Stats(object):
+
+    __slots__ = ('name', 'calls', 'items', 'wall', 'cpu')
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.items = 0
+        self.wall = 0 # In nanoseconds.
+        self.cpu = 0
+
+    def to_dict(self, cpu=True):
+        wall = self.wall / 1e9
+        return {
+            'name': self.name,
+            'calls': self.calls,
+            'items': self.items,
+            'dropped': self.calls - self.items,
+            'wall': wall,
+            'cpu': self.cpu / 1e9 if cpu else None,
+            'items_per_sec': self.items / wall if wall > 0 else None
+        }
+
+class Profiler(object):
+    """Per-stage profiler of the pipeline returned by the `Pipeline.profile` method.
+
+    For each data source, pipe stage (e.g. `stream`, `shuffle` or `batch`) and operation (e.g. `filter`, `to_instance`
+    or `token` for all token operations), the profiler records the number of calls, the number of returned items, the
+    number of items dropped by the filters, and the cumulative wall time in seconds. The CPU time is recorded only if
+    the `cpu` argument is True, because reading the process time is several times slower than reading the wall clock.
+    The recorded times are exclusive, i.e. time spent in a stage does not include the time spent in the preceding
+    stages.
+
+    The time is measured by a single clock reading at each boundary between the stages, and the time between two
+    boundaries is charged to the running stage. The profiler is a context manager, which disables profiling of the
+    pipeline at the exit. Pipelines without the profiler are not instrumented.
+    """
+    def __init__(self, pipeline, cpu=False):
+        self._pipeline = pipeline
+        self._cpu = cpu
+        self._stats = {}
+        self._running = None
+        self._wall = 0
+        self._cpu_time = 0
+
+    def enable(self):
+        """Enable profiling of the pipeline."""
+        self._attach(self._pipeline._pipeline)
+
+    def disable(self):
+        """Disable profiling of the pipeline. Recorded statistics are preserved."""
+        for p in _chain(self._pipeline._pipeline):
+            if p.profiler is self:
+                p.profiler = None
+
+    def reset(self):
+        """Reset all recorded statistics."""
+        self._stats = {}
+
+    def to_dict(self):
+        """Return the list of dictionaries with the statistics recorded for the stages in the pipeline order.
+
+        Each dictionary contains the keys 'name', 'calls', 'items', 'dropped', 'wall', 'cpu' and 'items_per_sec'.
+        """
+        return [stats.to_dict(self._cpu) for stats in self._ordered()]
+
+    def table(self):
+        """Return the recorded statistics formatted as a text table."""
+        rows = [('stage', 'calls', 'items', 'dropped', 'wall [s]', 'cpu [s]', 'items/s')]
+        for stats in self.to_dict():
+            speed = stats['items_per_sec']
+            cpu = stats['cpu']
+            rows.append((stats['name'], str(stats['calls']), str(stats['items']), str(stats['dropped']),
+                         f'{stats["wall"]:.6f}', f'{cpu:.6f}' if cpu is not None else '-',
+                         f'{speed:.1f}' if speed is not None else '-'))
+        widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+        lines = [row[0].ljust(widths[0]) + ''.join('  ' + v.rjust(w) for v, w in zip(row[1:], widths[1:]))
+                 for row in rows]
+        return '\n'.join(lines)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.disable()
+
+    def __str__(self):
+        return self.table()
+
+    def _attach(self, pipeline):
+        for p in _chain(pipeline):
+            p.profiler = self
+
+    def _ordered(self):
+        for p in reversed(list(_chain(self._pipeline._pipeline))):
+            for key in [(p, -1)] + [(p, i) for i in range(len(p.operations))]:
+                stats = self._stats.get(key)
+                if stats is not None:
+                    yield stats
+
+    def _get(self, pipe, i):
+        key = (pipe, i)
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = _Stats(pipe.names[i] if i >= 0 else pipe.name)
+            self._stats[key] = stats
+        return stats
+
+    def _switch(self, stats):
+        # Charge the time since the last stage boundary to the running stage, and return it after switching to `stats`.
+        wall = time.perf_counter_ns()
+        running = self._running
+        if running is not None:
+            running.wall += wall - self._wall
+        self._wall = wall
+        if self._cpu:
+            cpu = time.process_time_ns()
+            if running is not None:
+                running.cpu += cpu - self._cpu_time
+            self._cpu_time = cpu
+        self._running = stats
+        return running
+
+    def _call(self, stats, f, *args):
+        running = self._switch(stats)
+        try:
+            return f(*args)
+        finally:
+            self._switch(running)
+
+def _chain(source):
+    # All pipes of the pipeline including the nested pipelines.
+    for p in _upstream(source):
+        yield p
+        if isinstance(p.pipe, Pipeline):
+            yield from _chain(p.pipe)
+
 class _Pipe(object):
 
-    def __init__(self, source=None, generator=None, pipe=None):
+    def __init__(self, source=None, generator=None, pipe=None, name='source'):
         self.source = source
         self.generator = generator
         self.pipe = pipe
+        self.name = name
+        self.filename = None
         self.operations = []
+        self.chunk_operations = []
+        self.names = []
+        self.randoms = []
+        self.profiler = None
+        self.chunk_size = None
 
-    def set_source(self, source):
+    def set_source(self, source, name='source'):
         self._check_source()
         self.source = source
+        self.name = name
 
-    def set_generator(self, generator):
+    def set_generator(self, generator, filename=None, name='source'):
         self._check_source()
         self.generator = generator
+        self.name = name
+        if isinstance(filename, (str, os.PathLike)):
+            self.filename = filename
 
     def _check_source(self):
         if self.operations:
@@ -260,28 +1229,187 @@ class _Pipe(object):
         if self.source is not None or self.generator is not None:
             raise RuntimeError('source is already set')
 
-    def source_iterator(self, source):
-        if source is None:
-            source = self.source
+    def iterate(self, source=None, state=None):
+        if state == _EXHAUSTED:
+            return _exhausted()
+        if self.chunk_size is not None:
+            return _ChunkedIterator(self, source, state)
+        if self.profiler is not None:
+            itr, position = self.profiler._call(self.profiler._get(self, -1), _source_iterator, self, source, state)
+            return _iterate_profiled(self.profiler, self, itr, position)
+        itr, position = _source_iterator(self, source, state)
+        return _iterate_operations(itr, self.operations, position)
+
+    def __iter__(self):
+        return self.iterate(self.source)
+
+def _iterate(source, state=None):
+    if isinstance(source, Pipeline):
+        source = source._pipeline
+    if not isinstance(source, _Pipe):
+        source = _Pipe(source)
+    return source.iterate(None, state)
+
+def _source_iterator(pipe, source=None, state=None):
+    # Return the iterator over the source data of the pipe and the number of the already consumed data.
+    source_state = state['source'] if state is not None else None
+    if source_state == _EXHAUSTED:
+        return _exhausted(), state['position']
+
+    if source is None:
+        source = pipe.source
+
+    if source is None:
+        if pipe.generator is None:
+            raise RuntimeError('no source defined')
+        if isinstance(pipe.generator, (_ConlluSource, _DatasetSource)):
+            itr = pipe.generator(source_state)
+        else:
+            itr = iter(pipe.generator())
+    elif pipe.pipe is None:
+        if isinstance(source, (Pipeline, _Pipe)):
+            itr = _iterate(source, source_state)
+        else:
+            itr = iter(source)
+    elif isinstance(pipe.pipe, Pipeline):
+        itr = pipe.pipe._pipeline.iterate(source, source_state)
+    elif source_state is not None:
+        itr = pipe.pipe(source, source_state)
+    else:
+        itr = iter(pipe.pipe(source))
+
+    position = 0
+    if state is not None:
+        position = state['position']
+        if source_state is None:
+            # Skip the data already consumed from the source without the state.
+            next(itertools.islice(itr, position, position), None)
+    return itr, position
+
+@_stateful(lambda l: {'position': l['position'], 'source': _state(l['itr'])})
+def _iterate_operations(itr, operations, position):
+    for data in itr:
+        position += 1
+        for opr in operations:
+            data = opr(data)
+            if data is None:
+                break
+        if data is not None:
+            yield data
 
-        if source is None:
-            if self.generator is None:
-                raise RuntimeError('no source defined')
-            return self.generator()
+@_stateful(lambda l: _EXHAUSTED)
+def _exhausted(state=_EXHAUSTED):
+    # The iterator restored from the state of the finished iterator.
+    yield from ()
 
-        return self.pipe(source) if self.pipe is not None else source
+class _PipeIterator(object):
+    # Base class of the instrumented and chunked iterators.
 
-    def iterate(self, source=None):
-        for data in self.source_iterator(source):
-            for opr in self.operations:
+    def __init__(self, pipe, source=None, state=None):
+        self.operations = pipe.operations
+        self.itr, self.position = _source_iterator(pipe, source, state)
+
+    def __iter__(self):
+        return self
+
+    def state(self):
+        return {'position': self.position, 'source': _state(self.itr)}
+
+@_stateful(lambda l: {'position': l['position'], 'source': _state(l['itr'])})
+def _iterate_profiled(profiler, pipe, itr, position):
+    source_stats = profiler._get(pipe, -1)
+    operations = list(zip(pipe.operations, [profiler._get(pipe, i) for i in range(len(pipe.operations))]))
+    # The stage of the consumer is switched back while the data are returned.
+    consumer = profiler._switch(source_stats)
+    try:
+        for data in itr:
+            position += 1
+            source_stats.calls += 1
+            source_stats.items += 1
+
+            for opr, opr_stats in operations:
+                profiler._switch(opr_stats)
+                opr_stats.calls += 1
                 data = opr(data)
                 if data is None:
                     break
+                opr_stats.items += 1
             if data is not None:
+                profiler._switch(consumer)
                 yield data
-
-    def __iter__(self):
-        return self.iterate(self.source)
+                consumer = profiler._switch(source_stats)
+            else:
+                profiler._switch(source_stats)
+    finally:
+        profiler._switch(consumer)
+
+class _ChunkedIterator(_PipeIterator):
+
+    def __init__(self, pipe, source=None, state=None):
+        self.chunk_size = pipe.chunk_size
+        self.chunk_operations = pipe.chunk_operations
+        self.profiler = pipe.profiler
+        if self.profiler is not None:
+            self.source_stats = self.profiler._get(pipe, -1)
+            self.stats = [self.profiler._get(pipe, i) for i in range(len(pipe.operations))]
+            self.profiler._call(self.source_stats, super().__init__, pipe, source, state)
+        else:
+            self.source_stats = None
+            self.stats = [None] * len(pipe.operations)
+            super().__init__(pipe, source, state)
+        # Processed items not yet returned, in the reversed order for popping.
+        self.pending = []
+        if state is not None:
+            self.pending = state.get('pending', [])[::-1]
+
+    def __next__(self):
+        if not self.pending:
+            self.pending = self.next_chunk()[::-1]
+            if not self.pending:
+                raise StopIteration
+        return self.pending.pop()
+
+    def next_chunk(self):
+        # Return the next non-empty list of processed items, or the empty list at the end of data.
+        if self.pending:
+            chunk, self.pending = self.pending[::-1], []
+            return chunk
+        while True:
+            chunk = self._call(self.source_stats, _read_chunk, self.itr, self.chunk_size)
+            if not chunk:
+                return chunk
+            self.position += len(chunk)
+            self._count(self.source_stats, len(chunk), len(chunk))
+
+            for opr, opr_stats in zip(self.chunk_operations, self.stats):
+                calls = len(chunk)
+                chunk = self._call(opr_stats, opr, chunk)
+                self._count(opr_stats, calls, len(chunk))
+                if not chunk:
+                    break
+            if chunk:
+                return chunk
+
+    def state(self):
+        state = super().state()
+        state['pending'] = self.pending[::-1]
+        return state
+
+    def _call(self, stats, f, *args):
+        if stats is None:
+            return f(*args)
+        return self.profiler._call(stats, f, *args)
+
+    @staticmethod
+    def _count(stats, calls, items):
+        if stats is not None:
+            stats.calls += calls
+            stats.items += items
+
+def _read_chunk(itr, chunk_size):
+    if isinstance(itr, _ChunkedIterator):
+        return itr.next_chunk()
+    return list(itertools.islice(itr, chunk_size))
 
 class _TokenPipeline(object):
 
@@ -302,16 +1430,18 @@ class _TokenPipeline(object):
         return self
 
     def upos_feats(self, to='upos_feats'):
+        def _tag(value):
+            upos, feats = value
+            if upos:
+                return f'POS={upos}|{feats}' if feats else f'POS={upos}'
+            return feats
+        transform = self._transform('upos_feats', 'upos_feats', _tag, True)
+
         def _upos_feats(t):
-            upos = t.get('upos')
             feats = t.get('feats')
-
             if isinstance(feats, dict):
                 feats = _feats_to_str(feats)
-            if upos:
-                tag = f'POS={upos}|{feats}' if feats else f'POS={upos}'
-            else:
-                tag = feats
+            tag = transform.call((t.get('upos'), feats))
             if tag:
                 t[to] = tag
             return t
@@ -386,36 +1516,47 @@ class _TokenPipeline(object):
         self.map(_remove_fields)
         return self
 
-    def filter_field(self, field, f):
-        self.map_field(field, lambda s: s if f(s) else None)
+    def filter_field(self, field, f, pure=False):
+        self._map_field('filter_field', field, lambda s: s if f(s) else None, None, pure)
+        return self
+
+    def map_field(self, field, f, to=None, pure=False):
+        self._map_field('map_field', field, f, to, pure)
         return self
 
-    def map_field(self, field, f, to=None):
+    def _map_field(self, name, field, f, to=None, pure=False):
         if to is None:
             to = field
+        transform = self._transform(name, field, f, pure)
         def _map_field(t):
             if field in t:
-                value = f(t[field])
+                value = transform.call(t[field])
                 if value is not None:
                     t[to] = value
                 else:
                     del t[to]
             return t
         self.map(_map_field)
-        return self
+
+    def _transform(self, name, field, f, pure):
+        transform = _Transform(name, field, f, pure)
+        if self._pipeline._memoize is not None:
+            transform.memoize(self._pipeline._memoize)
+        self._pipeline._transforms.append(transform)
+        return transform
 
     def lowercase(self, field, to=None):
-        self.map_field(field, lambda s: s.lower(), to)
+        self._map_field('lowercase', field, lambda s: s.lower(), to, True)
         return self
 
     def uppercase(self, field, to=None):
-        self.map_field(field, lambda s: s.upper(), to)
+        self._map_field('uppercase', field, lambda s: s.upper(), to, True)
         return self
 
     def split_chars(self, field, to=None):
         if to is None:
             to = field + ':chars'
-        self.map_field(field, lambda s: tuple(s), to)
+        self._map_field('split_chars', field, lambda s: tuple(s), to, True)
         return self
 
     def replace_missing(self, field, value, to=None):
@@ -438,7 +1579,7 @@ class _TokenPipeline(object):
 
         if isinstance(old_value, str):
             old_value = re.compile(old_value)
-        self.map_field(field, lambda s: new_value if old_value.match(s) else s, to)
+        self._map_field('replace', field, lambda s: new_value if old_value.match(s) else s, to, True)
         return self
 
     def __call__(self, data):
@@ -460,3 +1601,39 @@ class _TokenPipeline(object):
                     i += 1
             del data[i:]
         return data
+
+class _Transform(object):
+    # Transform of the token field values, memoized by the input value if it is declared as pure.
+
+    def __init__(self, name, field, f, pure):
+        self.name = name
+        self.field = field
+        self.f = f
+        self.pure = pure
+        self.cached = None
+        self.call = f
+
+    def memoize(self, maxsize):
+        if self.pure:
+            self.cached = functools.lru_cache(maxsize)(self.f)
+            self.call = self._call_cached
+
+    def info(self):
+        hits, misses, maxsize, size = self.cached.cache_info()
+        calls = hits + misses
+        return {
+            'name': self.name,
+            'field': self.field,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / calls if calls > 0 else None,
+            'size': size,
+            'maxsize': maxsize
+        }
+
+    def _call_cached(self, value):
+        try:
+            return self.cached(value)
+        except TypeError:
+            # Unhashable values (e.g. parsed FEATS) are not memoized.
+            return self.f(value)
@@ -0,0 +1,403 @@
+import os
+import numpy as np
+
+from . import FIELDS, ID, HEAD, FEATS, DEPS, MISC, Instance
+from . import _feats_to_str, _deps_to_str, _scan_conllu, _read_raw_sentence, _parse_raw_sentence
+from .batch import _tree_parents
+
+class Pattern(object):
+    """A pattern matching the tokens and their dependents in the dependency tree.
+
+    The pattern specifies the constraints for the values of the token fields, and optionally the patterns for some of
+    the children (dependents) of the token in the basic dependency tree (see `Pattern.child` method). The token matches
+    the pattern if it satisfies all constraints of the pattern, and for each child pattern it has some child matching
+    the child pattern. E.g. the VERB with the PRON as the nominal subject is matched by the pattern
+    ``Pattern(upos='VERB').child(Pattern(upos='PRON', deprel='nsubj'))``.
+
+    The constraints are specified as the mapping object or the keyword arguments, where the value is a string (or an
+    integer for the indexed instances), or a set of the alternative values. FEATS and DEPS are compared as the unparsed
+    strings.
+
+    Use `match_pattern` function or `InvertedIndex.match` method to find the tokens matching the pattern.
+
+    Attributes:
+        constraints (dict): The constraints for the values of the token fields.
+        children (list): The list of ``(pattern, min_distance, max_distance)`` tuples of the child patterns.
+
+    """
+    def __init__(self, constraints=(), **kwargs):
+        self.constraints = dict(constraints, **kwargs)
+        self.children = []
+
+    def child(self, pattern, min_distance=None, max_distance=None):
+        """Add the pattern for the child of the token and return this pattern.
+
+        If `min_distance` or `max_distance` is specified, the distance of the child from the token (i.e.
+        ``abs(HEAD - ID)`` of the child, which is one more than the number of words between them) has to be within the
+        range. E.g. ``Pattern().child(Pattern(), min_distance=6)`` matches the heads separated from some dependent by 5
+        or more words.
+        """
+        self.children.append((pattern, min_distance, max_distance))
+        return self
+
+    def fields(self):
+        """Return the set of all fields constrained by the pattern or its child patterns."""
+        fields = set(self.constraints.keys())
+        for child, _, _ in self.children:
+            fields |= child.fields()
+        return fields
+
+    def _terms(self):
+        # Groups of the alternative (field, value) terms, one group required for each constraint of the pattern.
+        terms = []
+        for field, value in self.constraints.items():
+            values = value if isinstance(value, (set, frozenset, list, tuple)) else [value]
+            terms.append([(field, v) for v in values])
+        for child, _, _ in self.children:
+            terms += child._terms()
+        return terms
+
+    def _mask(self, columns, parents, positions):
+        mask = np.ones(len(parents), dtype=bool)
+        for field, value in self.constraints.items():
+            mask &= _equals(columns[field], value)
+        for child, min_distance, max_distance in self.children:
+            matched = child._mask(columns, parents, positions) & (parents >= 0)
+            distance = np.abs(positions - positions[np.maximum(parents, 0)])
+            if min_distance is not None:
+                matched &= distance >= min_distance
+            if max_distance is not None:
+                matched &= distance <= max_distance
+            has_child = np.zeros(len(parents), dtype=bool)
+            has_child[parents[matched]] = True
+            mask &= has_child
+        return mask
+
+def match_pattern(pattern, sentences):
+    """Find all tokens of the sentences or indexed instances matching the `pattern`.
+
+    The pattern is evaluated at once for the columnar arrays of the HEAD and constrained field values of all sentences.
+    Only the syntactic words of the sentences are matched.
+
+    Returns:
+        The tuple ``(sentences, tokens)`` of the arrays with the numbers of the sentences (in the order of the
+        `sentences`) and the positions of the matched tokens in the sentences.
+    """
+    sentence_numbers, token_positions, heads, offsets, columns = _columns(sentences, pattern.fields())
+    _, positions, parents, _ = _tree_parents(heads, offsets)
+    matched = np.flatnonzero(pattern._mask(columns, parents, positions))
+    return sentence_numbers[matched], token_positions[matched]
+
+class InvertedIndex(object):
+    """An inverted index of the CoNLL-U treebank mapping the field values to the positions of the tokens.
+
+    For each indexed ``(field, value)`` pair, the index stores the posting list of all tokens with the value, i.e. the
+    sorted arrays of the sentence numbers (from 0, in the order of the sentences in the file) and the positions of the
+    tokens in the sentences (from 0, including the multiword and empty tokens). FEATS and DEPS values are indexed as the
+    unparsed strings. The sentences are read from the treebank on demand using their byte offsets.
+
+    The keys of the posting lists (i.e. the field names and the values) are stored as the sorted UTF-8 encoded strings
+    concatenated into a single byte string, and found by the binary search.
+
+    Use `build_index` function to create the index of the treebank, and `InvertedIndex.save` method and `load_index`
+    function to store the index in the compressed NumPy format.
+
+    The index object is a sequence of the indexed sentences, i.e. ``len(index)`` returns the number of sentences in the
+    treebank and ``index[i]`` reads and returns the `i`-th sentence. The keyword arguments for the sentence parsing
+    (e.g. `parse_feats`) can be set in the `sentence_kwargs` attribute.
+
+    Attributes:
+        filename (str): The path of the indexed CoNLL-U file.
+        offsets (np.ndarray): The byte offsets of all sentences.
+        fields (set): The indexed fields.
+        sentence_kwargs (dict): The keyword arguments for the parsing of the sentences read from the treebank.
+
+    """
+    def __init__(self, filename, offsets, keys, key_starts, key_offsets, sentences, tokens, size):
+        self.filename = filename
+        self.offsets = offsets
+        self.sentence_kwargs = {}
+        self._keys = keys
+        self._key_starts = key_starts
+        self._key_offsets = key_offsets
+        self._sentences = sentences
+        self._tokens = tokens
+        self._size = size
+        self._fp = None
+        self.fields = self._fields()
+
+    def __len__(self):
+        # Return the number of indexed sentences.
+        return len(self.offsets)
+
+    def __getitem__(self, i):
+        # Read and return the `i`-th sentence of the treebank.
+        if self._fp is None:
+            if os.stat(self.filename).st_size != self._size:
+                raise ValueError(f'{self.filename} was modified after indexing')
+            self._fp = open(self.filename, 'rb')
+        lines = _read_raw_sentence(self._fp, int(self.offsets[i]))
+        return _parse_raw_sentence(lines, **self.sentence_kwargs)
+
+    def postings(self, field, value):
+        """Return the posting list of the tokens with the `value` of the `field`.
+
+        The result is the tuple ``(sentences, tokens)`` of the arrays with the sentence numbers and the token positions,
+        sorted by the sentence numbers and the positions. The lists are empty if no token has the value.
+        """
+        key = _key(field, value).encode('utf-8')
+        i = self._search(key)
+        if i == len(self._key_starts) - 1 or self._key(i) != key:
+            return np.zeros(0, dtype=self._sentences.dtype), np.zeros(0, dtype=self._tokens.dtype)
+        start, end = self._key_offsets[i], self._key_offsets[i + 1]
+        return self._sentences[start:end], self._tokens[start:end]
+
+    def _key(self, i):
+        return self._keys[self._key_starts[i]:self._key_starts[i + 1]]
+
+    def _search(self, key):
+        # Return the number of the first key not less than the `key`.
+        lo, hi = 0, len(self._key_starts) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _fields(self):
+        # The keys of each field are contiguous in the sorted order, and end before the field name followed by the
+        # character after the tab.
+        fields, i = set(), 0
+        while i < len(self._key_starts) - 1:
+            field = self._key(i).split(b'\t', 1)[0]
+            fields.add(field.decode('utf-8'))
+            i = self._search(field + b'\n')
+        return fields
+
+    def find_tokens(self, *terms, any=False):
+        """Return the positions of the tokens matching all (or any, if `any` is True) ``(field, value)`` `terms`.
+
+        The result is the tuple of the sentence numbers and token positions as for the `InvertedIndex.postings` method.
+        E.g. ``index.find_tokens((LEMMA, 'be'), (UPOS, 'AUX'))`` returns all tokens with the lemma *be* tagged as AUX.
+        """
+        keys = [_token_keys(*self.postings(field, value)) for field, value in terms]
+        if not keys:
+            return _split_token_keys(np.zeros(0, dtype=np.int64))
+        result = keys[0]
+        for k in keys[1:]:
+            result = np.union1d(result, k) if any else np.intersect1d(result, k, assume_unique=True)
+        return _split_token_keys(result)
+
+    def find_sentences(self, *terms, any=False):
+        """Return the sorted array of the sentence numbers, where all (or any, if `any` is True) ``(field, value)``
+        `terms` match some tokens of the sentence (not necessarily the same token).
+
+        E.g. ``index.find_sentences((LEMMA, 'dog'), (DEPREL, 'nsubj'))`` returns all sentences with the lemma *dog* and
+        some nominal subject.
+        """
+        sentences = [_unique_sorted(self.postings(field, value)[0]) for field, value in terms]
+        if not sentences:
+            return np.zeros(0, dtype=np.int64)
+        result = sentences[0]
+        for s in sentences[1:]:
+            result = np.union1d(result, s) if any else np.intersect1d(result, s, assume_unique=True)
+        return result
+
+    def match(self, pattern, chunk_size=1024):
+        """Find all tokens of the treebank matching the `pattern` (see `Pattern` class).
+
+        The candidate sentences containing the values of all constraints are selected by the posting lists, and only
+        the candidates are read and matched (in the chunks of `chunk_size` sentences) by the `match_pattern` function.
+
+        Returns:
+            The tuple of the sentence numbers and token positions as for the `InvertedIndex.postings` method.
+        """
+        candidates = np.arange(len(self))
+        for terms in pattern._terms():
+            if all(field in self.fields and isinstance(value, str) for field, value in terms):
+                candidates = np.intersect1d(candidates, self.find_sentences(*terms, any=True), assume_unique=True)
+
+        sentences, tokens = [np.zeros(0, dtype=np.uint32)], [np.zeros(0, dtype=np.uint16)]
+        for start in range(0, len(candidates), chunk_size):
+            chunk = candidates[start:start + chunk_size]
+            s, t = match_pattern(pattern, self.read(chunk))
+            sentences.append(chunk[s].astype(np.uint32))
+            tokens.append(t.astype(np.uint16))
+        return np.concatenate(sentences), np.concatenate(tokens)
+
+    def read(self, sentences):
+        """Return an iterator over the sentences with the numbers listed in the `sentences` (e.g. the result of the
+        `InvertedIndex.find_sentences` method)."""
+        for i in np.asarray(sentences).tolist():
+            yield self[i]
+
+    def save(self, file):
+        """Save the index to the `file` in the compressed NumPy ``.npz`` format.
+
+        The posting lists are delta-encoded before the compression.
+        """
+        np.savez_compressed(file, offsets=np.diff(self.offsets, prepend=0), keys=np.frombuffer(self._keys, dtype=np.uint8),
+                            key_starts=self._key_starts, key_offsets=self._key_offsets, sentences=_encode_deltas(self._sentences, self._key_offsets),
+                            tokens=self._tokens, size=np.array(self._size))
+
+    def close(self):
+        """Close the treebank file opened for the reading of the sentences."""
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def build_index(filename, fields=None):
+    """Build the inverted index of the CoNLL-U file.
+
+    Args:
+        filename (str or path-like): The path of the CoNLL-U file.
+        fields (set): The set of the indexed fields. By default all fields are indexed except ID, HEAD and MISC.
+
+    Returns:
+        InvertedIndex: The index of the treebank.
+    """
+    fields = (set(FIELDS) - {MISC} if fields is None else set(fields)) - {ID, HEAD}
+    offsets, keys = [], {}
+    # The postings are collected in the lists of limited size, and stored in the compact NumPy arrays when full.
+    key_ids, sentences, tokens, chunks = [], [], [], []
+
+    def flush():
+        chunks.append((np.array(key_ids, dtype=np.int64), np.array(sentences, dtype=np.uint32),
+                       np.array(tokens, dtype=np.uint16)))
+        key_ids.clear()
+        sentences.clear()
+        tokens.clear()
+
+    with open(filename, 'rb') as fp:
+        for i, (offset, lines) in enumerate(_scan_conllu(fp)):
+            offsets.append(offset)
+            sentence = _parse_raw_sentence(lines)
+            for j, token in enumerate(sentence):
+                for field, value in token.items():
+                    if field in fields:
+                        key_ids.append(keys.setdefault(_key(field, value), len(keys)))
+                        sentences.append(i)
+                        tokens.append(j)
+            if len(key_ids) >= _CHUNK_SIZE:
+                flush()
+    flush()
+
+    # Renumber the keys in the sorted order of the UTF-8 strings for the binary search.
+    encoded = [key.encode('utf-8') for key in keys]
+    del keys
+    sorted_ids = sorted(range(len(encoded)), key=encoded.__getitem__)
+    ranks = np.empty(len(encoded), dtype=np.int64)
+    ranks[sorted_ids] = np.arange(len(encoded))
+    key_starts = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(encoded[k]) for k in sorted_ids], out=key_starts[1:])
+    blob = b''.join([encoded[k] for k in sorted_ids])
+    del encoded, sorted_ids
+
+    key_indices = ranks[np.concatenate([chunk[0] for chunk in chunks])]
+    sentences = np.concatenate([chunk[1] for chunk in chunks])
+    tokens = np.concatenate([chunk[2] for chunk in chunks])
+    del chunks
+    order = np.lexsort((tokens, sentences, key_indices))
+    key_offsets = np.zeros(len(key_starts), dtype=np.int64)
+    np.cumsum(np.bincount(key_indices, minlength=len(key_starts) - 1), out=key_offsets[1:])
+    return InvertedIndex(os.fspath(filename), np.array(offsets, dtype=np.int64), blob, key_starts, key_offsets,
+                         sentences[order], tokens[order], os.stat(filename).st_size)
+
+def load_index(file, filename):
+    """Load the inverted index saved by the `InvertedIndex.save` method for the CoNLL-U file `filename`.
+
+    Raises:
+        ValueError: If the CoNLL-U file was modified after indexing.
+    """
+    with np.load(file) as data:
+        key_offsets = data['key_offsets']
+        deltas = data['sentences']
+        size = int(data['size'])
+        index = InvertedIndex(os.fspath(filename), np.cumsum(data['offsets']), data['keys'].tobytes(),
+                              data['key_starts'], key_offsets,
+                              _decode_deltas(deltas, key_offsets), data['tokens'], size)
+    if os.stat(filename).st_size != size:
+        raise ValueError(f'{filename} was modified after indexing')
+    return index
+
+_CHUNK_SIZE = 1 << 16
+
+def _key(field, value):
+    return f'{field}\t{_key_value(field, value)}'
+
+def _key_value(field, value):
+    if field == FEATS:
+        return _feats_to_str(value)
+    if field == DEPS:
+        return _deps_to_str(value)
+    return value
+
+def _columns(sentences, fields):
+    # Concatenated arrays of the HEAD and field values of the syntactic words, with the sentence number and the position
+    # in the sentence for each word.
+    sentence_numbers, token_positions, heads, offsets = [], [], [], [0]
+    columns = {field: [] for field in fields}
+    for i, sentence in enumerate(sentences):
+        if isinstance(sentence, Instance):
+            length = sentence.length or 0
+            token_positions.extend(range(length))
+            heads.extend(sentence[HEAD].tolist() if HEAD in sentence else [-1] * length)
+            for field, values in columns.items():
+                values.extend(sentence[field].tolist() if field in sentence else [None] * length)
+        else:
+            length = 0
+            for j, token in enumerate(sentence):
+                if token.is_empty or token.is_multiword:
+                    continue
+                length += 1
+                token_positions.append(j)
+                head = token.get(HEAD)
+                heads.append(-1 if head is None else head)
+                for field, values in columns.items():
+                    value = token.get(field)
+                    values.append(_key_value(field, value) if value is not None else None)
+        sentence_numbers.extend([i] * length)
+        offsets.append(len(heads))
+
+    columns = {field: np.array(values, dtype=object) for field, values in columns.items()}
+    return np.array(sentence_numbers, dtype=np.int64), np.array(token_positions, dtype=np.int64), \
+        np.array(heads, dtype=np.int64), np.array(offsets, dtype=np.int64), columns
+
+def _equals(column, value):
+    if isinstance(value, (set, frozenset, list, tuple)):
+        mask = np.zeros(len(column), dtype=bool)
+        for v in value:
+            mask |= column == v
+        return mask
+    return column == value
+
+def _encode_deltas(values, key_offsets):
+    # Differences of the consecutive values in each posting list, with the first value of the list stored as it is.
+    deltas = np.diff(values.astype(np.int64), prepend=0)
+    starts = key_offsets[:-1][np.diff(key_offsets) > 0]
+    deltas[starts] = values[starts]
+    return deltas.astype(values.dtype)
+
+def _decode_deltas(deltas, key_offsets):
+    sums = np.cumsum(deltas, dtype=np.int64)
+    starts = key_offsets[:-1]
+    bases = np.where(starts > 0, sums[np.maximum(starts - 1, 0)], 0) if len(sums) > 0 else np.zeros_like(starts)
+    return (sums - np.repeat(bases, np.diff(key_offsets))).astype(deltas.dtype)
+
+def _unique_sorted(values):
+    return values[np.r_[True, values[1:] != values[:-1]]] if len(values) > 0 else values
+
+def _token_keys(sentences, tokens):
+    # Encode the sentence numbers and token positions as the sortable integer keys.
+    return sentences.astype(np.int64) << 16 | tokens.astype(np.int64)
+
+def _split_token_keys(keys):
+    return (keys >> 16).astype(np.uint32), (keys & 0xFFFF).astype(np.uint16)
@@ -0,0 +1,204 @@
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from . import FORM, UPOS, DEPREL, FEATS, DEPS, HEAD, Instance, pipe
+from . import _feats_to_str, _deps_to_str, _is_projective
+
+class Statistics(object):
+    """A mergeable accumulator of the corpus statistics computed in one pass over the sentences.
+
+    The statistics include the number of sentences, tokens, syntactic words, multiword and empty tokens, the histogram of
+    the sentence lengths (in words), the number of non-projective sentences, the distributions of the values of the
+    `fields` and the frequencies of the n-grams of the `ngram_field` values. The values of FEATS and DEPS fields are
+    counted as the unparsed strings.
+
+    The statistics of the corpus shards can be computed independently and combined by the `Statistics.merge` method.
+    Use `Statistics.to_dict` method to get the JSON-serializable results, which can be loaded back by the
+    `Statistics.from_dict` method.
+
+    The memory used by the n-gram table can be bounded by the `max_ngrams` argument. When the table grows over the twice
+    of the limit, only the `max_ngrams` most frequent n-grams are kept. The counts of the n-grams are then approximate
+    (lower bounds of the exact counts).
+
+    Args:
+        fields (iterable): The fields for which the value distributions are counted over the syntactic words.
+        ngrams (int or iterable): The order(s) of the counted n-grams over the syntactic words, e.g. 2 for bigrams or
+            (1, 2, 3) for unigrams, bigrams and trigrams. By default, the n-grams are not counted.
+        ngram_field (str): The field of the n-gram values.
+        max_ngrams (int): The maximal number of the retained n-grams, or None for unlimited table.
+        projectivity (bool): If True (default), count the non-projective sentences.
+
+    """
+    def __init__(self, fields=(UPOS, DEPREL), ngrams=None, ngram_field=FORM, max_ngrams=None, projectivity=True):
+        if max_ngrams is not None and max_ngrams < 1:
+            raise ValueError('max_ngrams must be >= 1')
+        self.fields = tuple(fields)
+        self.ngram_orders = (ngrams,) if isinstance(ngrams, int) else tuple(ngrams or ())
+        self.ngram_field = ngram_field
+        self.max_ngrams = max_ngrams
+        self.projectivity = projectivity
+
+        self.sentences = 0
+        self.tokens = 0
+        self.words = 0
+        self.multiword_tokens = 0
+        self.empty_tokens = 0
+        self.non_projective = 0
+        self.lengths = Counter()
+        self.values = {field: Counter() for field in self.fields}
+        self.ngrams = Counter()
+        self.pruned = False
+
+    def update(self, sentence):
+        """Add the sentence or indexed instance to the statistics and return this object.
+
+        For the instances, all tokens are counted as the syntactic words.
+        """
+        if isinstance(sentence, Instance):
+            tokens = words = [dict(token) for token in sentence.tokens()]
+        else:
+            tokens = sentence
+            words = list(sentence.words())
+
+        self.sentences += 1
+        self.tokens += len(tokens)
+        self.words += len(words)
+        if tokens is not words:
+            for token in tokens:
+                if token.is_multiword:
+                    self.multiword_tokens += 1
+                elif token.is_empty:
+                    self.empty_tokens += 1
+        self.lengths[len(words)] += 1
+
+        for field, counter in self.values.items():
+            for token in words:
+                if field in token:
+                    counter[_value_key(field, token[field])] += 1
+
+        if self.projectivity and words and not _is_projective([token.get(HEAD) for token in words]):
+            self.non_projective += 1
+
+        if self.ngram_orders:
+            values = [token.get(self.ngram_field) for token in words]
+            for n in self.ngram_orders:
+                for i in range(len(values) - n + 1):
+                    self.ngrams[tuple(values[i:i+n])] += 1
+            self._prune()
+        return self
+
+    def update_all(self, sentences):
+        """Add all `sentences` to the statistics and return this object."""
+        for sentence in sentences:
+            self.update(sentence)
+        return self
+
+    def merge(self, other):
+        """Add the statistics of `other` object (e.g. computed for another shard of the corpus) and return this object.
+
+        Raises:
+            ValueError: If the statistics were computed with the different configuration.
+        """
+        if self._config() != other._config():
+            raise ValueError('merged statistics have the different configuration')
+        self.sentences += other.sentences
+        self.tokens += other.tokens
+        self.words += other.words
+        self.multiword_tokens += other.multiword_tokens
+        self.empty_tokens += other.empty_tokens
+        self.non_projective += other.non_projective
+        self.lengths.update(other.lengths)
+        for field, counter in self.values.items():
+            counter.update(other.values[field])
+        self.ngrams.update(other.ngrams)
+        self.pruned |= other.pruned
+        self._prune()
+        return self
+
+    def to_dict(self):
+        """Return the JSON-serializable dictionary with the configuration and the results of the statistics.
+
+        The lengths histogram is stored as the dictionary with the string keys, and the n-grams as the list of
+        ``[values, count]`` pairs ordered by the descending count and the values.
+        """
+        return {
+            'config': self._config(),
+            'sentences': self.sentences,
+            'tokens': self.tokens,
+            'words': self.words,
+            'multiword_tokens': self.multiword_tokens,
+            'empty_tokens': self.empty_tokens,
+            'multiword_ratio': self.multiword_tokens / self.tokens if self.tokens else 0.0,
+            'empty_ratio': self.empty_tokens / self.tokens if self.tokens else 0.0,
+            'non_projective': self.non_projective if self.projectivity else None,
+            'non_projective_rate': self.non_projective / self.sentences if self.projectivity and self.sentences
+                                   else None,
+            'lengths': {str(length): count for length, count in sorted(self.lengths.items())},
+            'values': {field: dict(counter.most_common()) for field, counter in self.values.items()},
+            'ngrams': [[list(ngram), count] for ngram, count in sorted(self.ngrams.items(), key=_ngram_order)],
+            'ngrams_pruned': self.pruned
+        }
+
+    @staticmethod
+    def from_dict(d):
+        """Return the statistics object restored from the dictionary created by the `Statistics.to_dict` method."""
+        stats = Statistics(**d['config'])
+        for key in ('sentences', 'tokens', 'words', 'multiword_tokens', 'empty_tokens'):
+            setattr(stats, key, d[key])
+        stats.non_projective = d['non_projective'] or 0
+        stats.lengths = Counter({int(length): count for length, count in d['lengths'].items()})
+        stats.values = {field: Counter(counter) for field, counter in d['values'].items()}
+        stats.ngrams = Counter({tuple(ngram): count for ngram, count in d['ngrams']})
+        stats.pruned = d['ngrams_pruned']
+        return stats
+
+    def _config(self):
+        return {
+            'fields': list(self.fields),
+            'ngrams': list(self.ngram_orders),
+            'ngram_field': self.ngram_field,
+            'max_ngrams': self.max_ngrams,
+            'projectivity': self.projectivity
+        }
+
+    def _prune(self):
+        if self.max_ngrams is not None and len(self.ngrams) > 2 * self.max_ngrams:
+            self.ngrams = Counter(dict(self.ngrams.most_common(self.max_ngrams)))
+            self.pruned = True
+
+def compute_statistics(filename, num_shards=1, max_workers=None, **kwargs):
+    """Compute the statistics of the CoNLL-U file in parallel.
+
+    The file is split into `num_shards` contiguous shards processed by the pool of `max_workers` processes, and the
+    statistics of the shards are merged. The keyword arguments are passed to the `Statistics` constructor.
+
+    Returns:
+        Statistics: The statistics of the whole file.
+    """
+    if num_shards < 1:
+        raise ValueError('num_shards must be >= 1')
+    if num_shards == 1:
+        return Statistics(**kwargs).update_all(_read_shard(filename, 1, 0))
+    stats = Statistics(**kwargs)
+    with ProcessPoolExecutor(max_workers) as executor:
+        futures = [executor.submit(_shard_statistics, filename, num_shards, i, kwargs) for i in range(num_shards)]
+        for future in futures:
+            stats.merge(Statistics.from_dict(future.result()))
+    return stats
+
+def _shard_statistics(filename, num_shards, shard_index, kwargs):
+    return Statistics(**kwargs).update_all(_read_shard(filename, num_shards, shard_index)).to_dict()
+
+def _read_shard(filename, num_shards, shard_index):
+    return pipe().read_conllu(filename).shard(num_shards, shard_index, mode='contiguous')
+
+def _ngram_order(item):
+    ngram, count = item
+    return -count, tuple('' if value is None else str(value) for value in ngram)
+
+def _value_key(field, value):
+    if field == FEATS:
+        return _feats_to_str(value)
+    if field == DEPS:
+        return _deps_to_str(value)
+    return value
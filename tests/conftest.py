@@ -0,0 +1,20 @@
+import os
+import pytest
+
+@pytest.fixture
+def make_treebank(tmp_path):
+    # Return the function concatenating the test data files into one treebank file.
+    def _make_treebank(*names):
+        data = ''
+        for name in names:
+            with open(os.path.join(os.path.dirname(__file__), name), 'rt', encoding='utf-8') as f:
+                data += f.read().strip() + '\n\n'
+        filename = tmp_path / 'treebank.conllu'
+        filename.write_text(data, encoding='utf-8')
+        return filename
+    return _make_treebank
+
+@pytest.fixture
+def treebank(make_treebank):
+    # All sentences of the treebank have the complete basic dependency trees.
+    return make_treebank('data2.conllu', 'data4.conllu', 'data5.conllu')
@@ -0,0 +1,189 @@
+import os
+import random
+import pytest
+
+import numpy as np
+
+from conllutils import read_conllu, create_index, Instance, FIELDS, ID, HEAD
+from conllutils import _is_projective
+from conllutils.batch import concatenate, split, projective_mask, tree_features, root_paths, validate, validate_sentences
+from conllutils.batch import MISSING_HEAD, HEAD_OUT_OF_RANGE, NO_ROOT, MULTIPLE_ROOTS, CYCLE, INVALID_ORDER
+
+def _data_filename(name):
+    return os.path.join(os.path.dirname(__file__), name)
+
+@pytest.fixture
+def data2():
+    return _data_filename("data2.conllu")
+@pytest.fixture
+def data5():
+    return _data_filename("data5.conllu")
+
+def _conflicting_arcs(heads):
+    # Reference quadratic check of all pairs of arcs.
+    arcs = []
+    for i in range(len(heads)):
+        for j in range(i + 1, len(heads)):
+            if heads[i] is None or heads[i] < 0 or heads[j] is None or heads[j] < 0:
+                continue
+            a0, a1 = sorted((i + 1, heads[i]))
+            b0, b1 = sorted((j + 1, heads[j]))
+            if (a0, a1) == (b0, b1) or a0 < b0 < a1 < b1 or b0 < a0 < b1 < a1:
+                arcs.append((i, j))
+    return arcs
+
+def _random_heads(rnd, n):
+    if rnd.random() < 0.7:
+        heads = [0] * n
+        order = list(range(n))
+        rnd.shuffle(order)
+        for k in range(1, n):
+            heads[order[k]] = order[rnd.randrange(max(0, k - 3), k)] + 1
+        return heads
+    return [rnd.choice([-1, 0] + list(range(1, n + 2))) for _ in range(n)]
+
+def test_is_projective():
+    rnd = random.Random(1)
+    for _ in range(2000):
+        heads = _random_heads(rnd, rnd.randint(0, 12))
+        arcs = _conflicting_arcs(heads)
+        assert _is_projective(heads) == (not arcs)
+        assert _is_projective(heads, return_arcs=True) == arcs
+
+def test_concatenate(data2):
+    sentences = list(read_conllu(data2))
+    index = create_index(sentences, fields=set(FIELDS)-{ID, HEAD})
+    instances = [sentence.to_instance(index) for sentence in sentences]
+
+    heads, offsets = concatenate(instances)
+    assert offsets.tolist() == [0, len(sentences[0]), len(sentences[0]) + len(sentences[1])]
+    assert heads.tolist() == [token[HEAD] for sentence in sentences for token in sentence]
+
+    heads, offsets = concatenate([])
+    assert len(heads) == 0 and offsets.tolist() == [0]
+
+def test_projective_mask(data2, data5):
+    sentences = list(read_conllu(data2)) + list(read_conllu(data5))
+    index = create_index(sentences, fields=set(FIELDS)-{ID, HEAD})
+    instances = [sentence.to_instance(index) for sentence in sentences]
+    assert projective_mask(*concatenate(instances)).tolist() == [s.is_projective() for s in sentences]
+
+    rnd = random.Random(2)
+    data = [_random_heads(rnd, rnd.randint(0, 30)) for _ in range(3000)]
+    heads = np.array([head for h in data for head in h])
+    offsets = np.cumsum([0] + [len(h) for h in data])
+    assert projective_mask(heads, offsets).tolist() == [_is_projective(h) for h in data]
+
+def test_tree_features(data2):
+    sentences = list(read_conllu(data2))
+    index = create_index(sentences, fields=set(FIELDS)-{ID, HEAD})
+    instances = [sentence.to_instance(index) for sentence in sentences]
+    heads, offsets = concatenate(instances)
+
+    features = tree_features(heads, offsets)
+    for name, values in features.items():
+        for instance, value in zip(instances, split(values, offsets)):
+            instance[name] = value
+
+    # They buy and sell books .
+    instance = instances[0]
+    assert instance['depth'].tolist() == [1, 0, 2, 1, 1, 1]
+    assert instance['subtree_size'].tolist() == [1, 6, 1, 2, 1, 1]
+    assert instance['distance'].tolist() == [1, 0, 1, -2, -3, -4]
+    assert instance['direction'].tolist() == [1, 0, 1, -1, -1, -1]
+    assert instance['siblings'].tolist() == [3, 0, 0, 3, 3, 3]
+
+    paths, path_offsets = root_paths(heads, offsets)
+    assert [paths[path_offsets[k]:path_offsets[k+1]].tolist() for k in range(6)] == \
+           [[0, 1], [1], [2, 3, 1], [3, 1], [4, 1], [5, 1]]
+
+    rnd = random.Random(3)
+    data = [_random_heads(rnd, rnd.randint(0, 30)) for _ in range(500)]
+    data = [h for h in data if _is_tree(h)]
+    heads = np.array([head for h in data for head in h])
+    offsets = np.cumsum([0] + [len(h) for h in data])
+    features = tree_features(heads, offsets)
+    paths, path_offsets = root_paths(heads, offsets)
+
+    k = 0
+    for h in data:
+        tree = Instance({HEAD: np.array(h)}).to_tree()
+        for node in tree:
+            path = [node.index]
+            while path[-1] != tree.root.index:
+                path.append(tree.nodes[path[-1]].parent.index)
+            assert paths[path_offsets[k]:path_offsets[k+1]].tolist() == path
+            assert features['depth'][k] == len(path) - 1
+            assert features['subtree_size'][k] == sum(1 for _ in _descendants(node)) + 1
+            assert features['siblings'][k] == (len(node.parent) - 1 if node.parent else 0)
+            k += 1
+
+    with pytest.raises(ValueError):
+        tree_features(np.array([0, 0]), np.array([0, 2]))
+    with pytest.raises(ValueError):
+        root_paths(np.array([2, 1]), np.array([0, 2]))
+
+def _is_tree(heads):
+    try:
+        return len(Instance({HEAD: np.array(heads)}).to_tree().preorder_indices) == len(heads)
+    except ValueError:
+        return False
+
+def _descendants(node):
+    for child in node:
+        yield child
+        yield from _descendants(child)
+
+def _error_code(heads, ids):
+    # Reference validation of one sentence.
+    n = len(heads)
+    code = 0
+    if any(h < 0 for h in heads):
+        code |= MISSING_HEAD
+    if any(h > n for h in heads):
+        code |= HEAD_OUT_OF_RANGE
+    roots = sum(1 for h in heads if h == 0)
+    if roots == 0 and n > 0:
+        code |= NO_ROOT
+    if roots > 1:
+        code |= MULTIPLE_ROOTS
+    for i in range(n):
+        visited = set()
+        while 0 < heads[i] <= n and i not in visited:
+            visited.add(i)
+            i = heads[i] - 1
+        if 0 < heads[i] <= n:
+            code |= CYCLE
+            break
+    if ids != list(range(1, n + 1)):
+        code |= INVALID_ORDER
+    return code
+
+def test_validate(data2):
+    heads = [[2, 0, 2], [], [-1, 0], [0, 4], [0, 1, 0], [2, 1], [0, 3, 2], [0, 1]]
+    ids = [[1, 2, 3], [], [1, 2], [1, 2], [1, 2, 3], [1, 2], [1, 2, 3], [2, 1]]
+    offsets = np.cumsum([0] + [len(h) for h in heads])
+    errors = validate(np.concatenate(heads), offsets, np.concatenate(ids))
+    assert errors.tolist() == [0, 0, MISSING_HEAD, HEAD_OUT_OF_RANGE, MULTIPLE_ROOTS, NO_ROOT | CYCLE, CYCLE,
+                               INVALID_ORDER]
+    assert validate(np.concatenate(heads), offsets)[-1] == 0
+
+    rnd = random.Random(9)
+    heads, ids = [], []
+    for _ in range(300):
+        n = rnd.randint(0, 12)
+        heads.append([rnd.randint(-1, n + 1) if rnd.random() < 0.1 else rnd.randint(0, n) for _ in range(n)])
+        ids.append(list(range(1, n + 1)) if rnd.random() < 0.9 else rnd.sample(range(1, n + 1), n))
+    offsets = np.cumsum([0] + [len(h) for h in heads])
+    errors = validate(np.array(sum(heads, []), dtype=np.int64), offsets, np.array(sum(ids, []), dtype=np.int64))
+    assert errors.tolist() == [_error_code(h, i) for h, i in zip(heads, ids)]
+
+    sentences = list(read_conllu(data2))
+    index = create_index(sentences)
+    instances = [s.to_instance(index) for s in sentences]
+    assert validate_sentences(sentences).tolist() == [0, 0]
+    assert validate_sentences(instances).tolist() == [0, 0]
+
+    next(t for t in sentences[0].words() if t[HEAD] != 0)[HEAD] = None
+    next(sentences[1].words())[HEAD] = 10
+    assert validate_sentences(sentences).tolist() == [MISSING_HEAD, HEAD_OUT_OF_RANGE]
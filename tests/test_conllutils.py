@@ -1,5 +1,6 @@
 import os
 import pytest
+import numpy as np
 
 from conllutils import *
 from conllutils import _create_dictionary
@@ -137,6 +138,80 @@ def test_dependency_tree(data1, data2):
     tree0 = instances[0].to_tree()
     assert [node.token[FORM] for node in tree0] == [index[FORM][f] for f in ["They", "buy", "and", "sell", "books", "."]]
 
+def test_dependency_tree_arrays(data2):
+    sentence = list(read_conllu(data2))[0]
+    tree = sentence.to_tree()
+    assert tree.parents.tolist() == [1, -1, 3, 1, 1, 1]
+    assert tree.child_offsets.tolist() == [0, 0, 4, 4, 5, 5, 5]
+    assert tree.child_indices.tolist() == [0, 3, 4, 5, 2]
+    assert tree.preorder_indices.tolist() == [1, 0, 3, 2, 4, 5]
+    assert tree.postorder_indices.tolist() == [0, 2, 3, 4, 5, 1]
+    assert tree.inorder_indices.tolist() == [0, 1, 2, 3, 4, 5]
+    assert tree.root is tree.nodes[1] and tree.nodes[0].parent is tree.root
+
+    # Long trees are built with the NumPy operations.
+    heads = np.arange(200)
+    heads[[120, 150]] = 100
+    tree = Instance({HEAD: heads}).to_tree()
+    assert tree.root.index == 0
+    assert [node.index for node in tree.nodes[99]] == [100, 120, 150]
+    assert tree.postorder_indices[-1] == 0 and len(tree.preorder_indices) == 200
+
+    for heads, message in (([0, 0, None], 'multiple roots found at 1'), ([2, None, 0], 'token at 1 has no HEAD'),
+                           ([2, 1], 'no root found'), ([0, 1000], 'token at 1 has HEAD out of range')):
+        with pytest.raises(ValueError, match=message):
+            Sentence([Token(id=i + 1, head=head) for i, head in enumerate(heads)]).to_tree()
+        heads = [-1 if head is None else head for head in heads] + [1] * 200
+        with pytest.raises(ValueError, match=message):
+            Instance({HEAD: np.array(heads)}).to_tree()
+
+    heads = [0] + [1] * 199
+    heads[150] = None
+    with pytest.raises(ValueError, match='token at 150 has no HEAD'):
+        Sentence([Token(id=i + 1, head=head) for i, head in enumerate(heads)]).to_tree()
+    with pytest.raises(ValueError, match='token at 0 has no HEAD'):
+        Instance({FORM: np.zeros(200, dtype=np.int64)}).to_tree()
+
+    tree = Instance({HEAD: np.arange(200)}).to_tree()
+    assert tree.nodes is tree.nodes # The list of nodes is built once.
+    assert tree.nodes[0][0] is tree.nodes[1]
+
+def test_tree_queries(data2):
+    # They buy and sell books .
+    tree = list(read_conllu(data2))[0].to_tree()
+    assert tree.is_ancestor(1, 2) and tree.is_ancestor(3, 2) and tree.is_ancestor(2, 2)
+    assert not tree.is_ancestor(2, 3) and not tree.is_ancestor(0, 4)
+    assert tree.lca(2, 4) is tree.root and tree.lca(tree.nodes[2], 3) is tree.nodes[3]
+    assert tree.distance(2, 0) == 3 and tree.distance(5, 5) == 0
+    assert [node.index for node in tree.path(2, 0)] == [2, 3, 1, 0]
+    assert tree.distances().tolist() == [
+        [0, 1, 3, 2, 2, 2],
+        [1, 0, 2, 1, 1, 1],
+        [3, 2, 0, 1, 3, 3],
+        [2, 1, 1, 0, 2, 2],
+        [2, 1, 3, 2, 0, 2],
+        [2, 1, 3, 2, 2, 0]]
+    assert Sentence().to_tree().distances().shape == (0, 0)
+
+    # The nodes 2 and 3 form a cycle not connected to the root.
+    tree = Sentence([Token(id=1, head=0), Token(id=2, head=1), Token(id=3, head=4), Token(id=4, head=3)]).to_tree()
+    assert tree.distances()[:, 2].tolist() == [-1, -1, -1, -1]
+    with pytest.raises(ValueError):
+        tree.lca(0, 2)
+
+def test_deep_tree():
+    n = 5000
+    tree = Sentence([Token(id=i + 1, head=i) for i in range(n)]).to_tree()
+    assert [node.index for node in tree.preorder()] == list(range(n))
+    assert [node.index for node in tree.inorder()] == list(range(n))
+    assert [node.index for node in tree.postorder()] == list(reversed(range(n)))
+    assert repr(tree).count('<') == 2 * n
+
+    tree = Sentence([Token(id=i + 1, head=i + 2 if i + 1 < n else 0) for i in range(n)]).to_tree()
+    assert [node.index for node in tree.preorder()] == list(reversed(range(n)))
+    assert [node.index for node in tree.inorder()] == list(range(n))
+    assert [node.index for node in tree.postorder()] == list(range(n))
+
 def test_read_conllu(data1):
     sentences = list(read_conllu(data1))
     assert sentences == [[
@@ -157,6 +232,13 @@ def test_read_conllu(data1):
             _fields(6, "tea", "tea"),
     ]]
 
+def test_read_conllu_filters(data2):
+    sentences = list(read_conllu(data2))
+    assert list(read_conllu(data2, metadata_filter=lambda m: m['sent_id'] == '2')) == sentences[1:]
+    assert list(read_conllu(data2, length_filter=lambda n: n == len(sentences[0]))) == sentences[:1]
+    assert list(read_conllu(data2, parse_comments=False, metadata_filter=lambda m: m['sent_id'] == '1',
+                            length_filter=lambda n: n > 0))[0].metadata is None
+
 def test_to_from_conllu(data2):
     sentences = list(read_conllu(data2))
     assert sentences[0].to_conllu() + "\n\n" + sentences[1].to_conllu() + "\n\n" == _read_file(data2)
@@ -340,6 +422,31 @@ def test_map_to_instance(data1, data2):
     with pytest.raises(ValueError):
         create_index(sentences, fields={'form'})
 
+def test_create_index_and_instances(data1, data2, data4):
+    sentences = list(read_conllu(data1)) + list(read_conllu(data2)) + list(read_conllu(data4))
+    sentences[0][0]['form:chars'] = tuple(sentences[0][0].form)
+
+    for kwargs in [{}, {'min_frequency': 2}, {'min_frequency': {FORM: 2}, 'missing_index': 1},
+                   {'fields': {FORM, UPOS, 'form:chars'}, 'missing_index': {UPOS: 2}}]:
+        index1 = create_index(sentences, **kwargs)
+        instances1 = [sentence.to_instance(index1) for sentence in sentences]
+        index2, instances2 = create_index_and_instances(sentences, **kwargs)
+
+        assert index1 == index2
+        for ins1, ins2 in zip(instances1, instances2):
+            assert ins1.keys() == ins2.keys()
+            assert ins1.metadata == ins2.metadata
+            for field in ins1.keys():
+                if field == 'form:chars':
+                    assert [list(v) if v is not None else None for v in ins1[field]] == \
+                           [list(v) if v is not None else None for v in ins2[field]]
+                else:
+                    assert np.array_equal(ins1[field], ins2[field])
+
+    _, instances = create_index_and_instances(sentences, dtype=np.int32)
+    assert instances[0][FORM].dtype == np.int32
+    assert create_index_and_instances([]) == ({}, [])
+
 def test_instance_tokens(data2):
     sentences = list(read_conllu(data2))
     index = create_index(sentences, fields=set(FIELDS)-{ID, HEAD})
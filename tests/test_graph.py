@@ -0,0 +1,67 @@
+import os
+import pytest
+
+import numpy as np
+
+from conllutils import Sentence, read_conllu, empty_id, DEPS
+from conllutils.graph import build_graph, build_graphs, create_deps_index
+
+def _data_filename(name):
+    return os.path.join(os.path.dirname(__file__), name)
+
+@pytest.fixture
+def data2():
+    return _data_filename("data2.conllu")
+
+_ELLIPSIS = '\n'.join([
+    '1\tSue\tSue\t_\t_\t_\t2\tnsubj\t2:nsubj|5.1:nsubj\t_',
+    '2\tlikes\tlike\t_\t_\t_\t0\troot\t0:root\t_',
+    '3\tcoffee\tcoffee\t_\t_\t_\t2\tobj\t2:obj\t_',
+    '4\tand\tand\t_\t_\t_\t6\tcc\t5.1:cc\t_',
+    '5\tBill\tBill\t_\t_\t_\t3\tconj\t5.1:nsubj\t_',
+    '5.1\tlikes\tlike\t_\t_\t_\t_\t_\t2:conj:and\t_',
+    '6\ttea\ttea\t_\t_\t_\t5\torphan\t5.1:obj\t_'
+])
+
+def test_build_graph():
+    for parse_deps in (False, True):
+        sentence = Sentence.from_conllu(_ELLIPSIS, parse_deps=parse_deps)
+        graph = sentence.to_graph()
+
+        assert len(graph) == 7
+        assert graph.num_arcs == 8
+        assert graph.ids[5] == empty_id(5)
+        assert graph.node(empty_id(5)) == 5
+
+        assert graph.roots().tolist() == [1]
+        assert list(graph.in_arcs(0)) == [(1, 'nsubj'), (5, 'nsubj')]
+        assert list(graph.out_arcs(5)) == [(0, 'nsubj'), (3, 'cc'), (4, 'nsubj'), (6, 'obj')]
+        assert graph.dependent_nodes(1).tolist() == [0, 2, 5]
+        assert graph.head_nodes(1).tolist() == [-1]
+        assert graph.dependent_nodes(6).tolist() == []
+
+    with pytest.raises(KeyError):
+        graph.node(7)
+
+    sentence[0][DEPS] = {(3, 'nsubj'), (empty_id(6), 'nsubj')}
+    with pytest.raises(ValueError):
+        build_graph(sentence)
+
+def test_build_graphs(data2):
+    sentences = list(read_conllu(data2)) + [Sentence.from_conllu(_ELLIPSIS)]
+    index = create_deps_index(sentences)
+    graph = build_graphs(sentences, index)
+
+    assert graph.num_sentences == 3
+    assert graph.node_offsets.tolist() == [0, 6, 11, 18]
+    assert graph.labels.dtype == np.int64
+
+    inverse = {i: label for label, i in index.items()}
+    for i, sentence in enumerate(sentences):
+        single = build_graph(sentence)
+        start = graph.node_offsets[i]
+        for k in range(len(single)):
+            arcs = [(h - start if h >= 0 else h, inverse[l]) for h, l in graph.in_arcs(start + k)]
+            assert arcs == list(single.in_arcs(k))
+            arcs = [(d - start, inverse[l]) for d, l in graph.out_arcs(start + k)]
+            assert arcs == list(single.out_arcs(k))
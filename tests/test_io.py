@@ -1,8 +1,11 @@
 import os
+import pickle
 import pytest
+import itertools
 import numpy as np
 
 from conllutils import pipe
+from conllutils.io import read_file
 
 def _data_filename(name):
     return os.path.join(os.path.dirname(__file__), name)
@@ -67,6 +70,103 @@ def test_hdf5(data2, data3, tmp_path):
     for ins1, ins2 in zip(instances1, instances2):
         equal_instance(ins1, ins2)
 
+def test_hdf5_columnar(data2, data3, tmp_path):
+    sentences = pipe().read_conllu(data2).collect() + pipe().read_conllu(data3).collect()
+    index = pipe(sentences).create_index()
+    instances1 = pipe(sentences).to_instance(index).collect()
+    instances1[1].metadata = None
+
+    for layout in ('columnar', 'groups'):
+        filename = tmp_path / f'{layout}.hdf5'
+        pipe(instances1).write_file(filename, 'hdf5', layout=layout)
+        for batch_size in (1, 2, 1024):
+            instances2 = pipe().read_file(filename, 'hdf5', batch_size=batch_size).collect()
+            assert len(instances2) == len(instances1)
+            for ins1, ins2 in zip(instances1, instances2):
+                equal_instance(ins1, ins2)
+
+    instances2 = pipe().read_file(filename, 'hdf5', read_comments=False).collect()
+    assert all(instance.metadata is None for instance in instances2)
+
+    index = pipe(sentences).only_fields('form').map_field('form', list, to='form:chars').create_index()
+    instances1 = pipe(sentences).only_fields('form').map_field('form', list, to='form:chars').to_instance(index).collect()
+    instances1[0]['form:chars'][1] = None
+    instances1[1]['form:chars'][0] = instances1[1]['form:chars'][0][:0]
+    filename = tmp_path / 'chars.hdf5'
+    pipe(instances1).write_file(filename, 'hdf5', chunk_size=4)
+    instances2 = pipe().read_file(filename, 'hdf5', batch_size=2).collect()
+    for ins1, ins2 in zip(instances1, instances2):
+        assert ins1.keys() == ins2.keys()
+        assert np.array_equal(ins1['form'], ins2['form'])
+        assert all(c2 is None if c1 is None else c2 is not None and np.array_equal(c1, c2)
+                   for c1, c2 in zip(ins1['form:chars'], ins2['form:chars']))
+    assert instances2[0]['form:chars'][1] is None and len(instances2[1]['form:chars'][0]) == 0
+
+    with pytest.raises(ValueError):
+        pipe(instances1).write_file(filename, 'hdf5', layout='unknown')
+
+def test_hdf5_dataset(data2, data3, tmp_path):
+    sentences = (pipe().read_conllu(data2).collect() + pipe().read_conllu(data3).collect()) * 5
+    index = pipe(sentences).create_index()
+    instances = pipe(sentences).to_instance(index).collect()
+    n = len(instances)
+
+    for layout in ('columnar', 'groups'):
+        filename = tmp_path / f'{layout}.hdf5'
+        pipe(instances).write_file(filename, 'hdf5', layout=layout)
+
+        with read_file(filename, 'hdf5') as dataset:
+            assert len(dataset) == n
+            equal_instance(dataset[3], instances[3])
+            equal_instance(dataset[-1], instances[-1])
+            for selected, expected in ((dataset[2:7], instances[2:7]), (dataset[::3], instances[::3]),
+                                       (dataset[[5, 1, 2, 3, 5, 0]], [instances[i] for i in (5, 1, 2, 3, 5, 0)]),
+                                       (dataset[np.arange(n)[::-1]], instances[::-1]), (dataset[5:2], [])):
+                assert len(selected) == len(expected)
+                for ins1, ins2 in zip(expected, selected):
+                    equal_instance(ins1, ins2)
+            with pytest.raises(IndexError):
+                dataset[n]
+            with pytest.raises(IndexError):
+                dataset[[0, n]]
+            indices = np.array([-1, 2, -n])
+            for ins1, ins2 in zip(dataset.take(indices), [instances[-1], instances[2], instances[0]]):
+                equal_instance(ins1, ins2)
+            assert indices.tolist() == [-1, 2, -n]
+
+            copy = pickle.loads(pickle.dumps(dataset))
+            equal_instance(copy[4], instances[4])
+            copy.close()
+
+        h5py = pytest.importorskip('h5py')
+        open_files = h5py.h5f.get_obj_count(h5py.h5f.OBJ_ALL, h5py.h5f.OBJ_FILE)
+        dataset = read_file(filename, 'hdf5')
+        assert len(list(dataset)) == n
+        # The file is closed at the end of the iteration.
+        assert h5py.h5f.get_obj_count(h5py.h5f.OBJ_ALL, h5py.h5f.OBJ_FILE) == open_files
+
+        p = pipe().read_file(filename, 'hdf5').shuffle(random=np.random.RandomState(1))
+        shuffled = p.collect()
+        assert [ins['head'].tolist() for ins in shuffled] != [ins['head'].tolist() for ins in instances]
+        assert sorted(ins['head'].tolist() for ins in shuffled) == sorted(ins['head'].tolist() for ins in instances)
+
+        for k in (0, 1, 7, n):
+            p1 = pipe().read_file(filename, 'hdf5').shuffle(random=np.random.RandomState(1))
+            head = list(itertools.islice(p1, k))
+            state = pickle.loads(pickle.dumps(p1.state()))
+            tail = pipe().read_file(filename, 'hdf5').shuffle(random=np.random.RandomState(2)).restore(state).collect()
+            for ins1, ins2 in zip(shuffled, head + tail):
+                equal_instance(ins1, ins2)
+
+        for mode in ('round_robin', 'contiguous'):
+            shards = [pipe().read_file(filename, 'hdf5').shard(3, i, mode).collect() for i in range(3)]
+            expected = [instances[i::3] for i in range(3)] if mode == 'round_robin' else \
+                       [instances[n * i // 3:n * (i + 1) // 3] for i in range(3)]
+            for shard, expected_shard in zip(shards, expected):
+                assert len(shard) == len(expected_shard)
+                for ins1, ins2 in zip(expected_shard, shard):
+                    equal_instance(ins1, ins2)
+
 def equal_instance(ins1, ins2):
     assert ins1.metadata == ins2.metadata
     assert ins1.keys() == ins2.keys()
@@ -1,11 +1,15 @@
 import os
 import pytest
+import asyncio
+import pickle
+import itertools
 from io import StringIO
 
 import numpy as np
 
 from conllutils import FORM, FIELDS, ID, HEAD
-from conllutils import pipe, create_inverse_index
+from conllutils import pipe, read_conllu, create_inverse_index
+from conllutils.pipeline import Pipeline
 
 class _StringIO(StringIO):
 
@@ -108,6 +112,53 @@ def test_shuffle():
     p = pipe(range(10)).filter(lambda x: x < 5).stream(10).shuffle(5)
     assert p.collect()  == [3, 4, 0, 1, 0, 2, 4, 3, 1, 2]
 
+def test_external_shuffle(data2, tmp_path):
+    data = pipe(range(1000)).shuffle(16, np.random.RandomState(1), 'external', tmp_path).collect()
+    assert sorted(data) == list(range(1000))
+    assert data != list(range(1000))
+    assert data == pipe(range(1000)).shuffle(16, np.random.RandomState(1), 'external', tmp_path).collect()
+    assert list(tmp_path.iterdir()) == []
+
+    p = pipe(range(10)).shuffle(16, np.random.RandomState(1), 'external')
+    assert sorted(p.collect()) == list(range(10))
+
+    index = pipe().read_conllu(data2).create_index()
+    instances = pipe().read_conllu(data2).to_instance(index).stream(100).collect()
+    shuffled = pipe(instances).shuffle(10, mode='external').collect()
+    assert sorted(i.metadata['sent_id'] for i in shuffled) == sorted(i.metadata['sent_id'] for i in instances)
+
+    with pytest.raises(ValueError):
+        pipe(range(10)).shuffle(mode='unknown')
+
+def test_index_shuffle(data2, data4, tmp_path):
+    filename = tmp_path / 'data.conllu'
+    filename.write_text((_read_file(data2) + _read_file(data4)) * 10, encoding='utf-8')
+    texts = pipe().read_conllu(filename).text().collect()
+
+    p = pipe().read_conllu(filename).text().shuffle(random=np.random.RandomState(1))
+    shuffled = p.collect()
+    assert sorted(shuffled) == sorted(texts)
+    assert shuffled != texts
+    assert shuffled == pipe().read_conllu(filename).text().shuffle(1, np.random.RandomState(1), 'index').collect()
+
+    epochs = pipe().read_conllu(filename).stream(2 * len(texts)).shuffle(random=np.random.RandomState(1)).text().collect()
+    assert epochs[:len(texts)] == shuffled
+    assert sorted(epochs[len(texts):]) == sorted(texts)
+    assert epochs[len(texts):] != shuffled
+
+    p = pipe().read_conllu(filename).text().shuffle()
+    itr = iter(p)
+    head = list(itertools.islice(itr, 5))
+    assert p.count() == len(texts) # Concurrent iteration does not change the order of the running one.
+    assert sorted(head + list(itr)) == sorted(texts)
+
+    shards = [pipe().read_conllu(filename).shard(3, i).shuffle().text().collect() for i in range(3)]
+    assert sorted(itertools.chain(*shards)) == sorted(texts)
+    assert sorted(shards[1]) == sorted(texts[1::3])
+
+    with pytest.raises(ValueError):
+        pipe(texts).shuffle(mode='index')
+
 def test_from_conllu():
     p = pipe().from_conllu(_DATA1_CONLLU)
     assert [[t.form for t in s] for s in p.collect()] == [['vámonos', 'vamos', 'nos', 'al', 'a', 'el', 'mar'],
@@ -129,6 +180,52 @@ def test_read_conllu(data1):
     assert [[t.form for t in s] for s in p.collect()] == [['vámonos', 'vamos', 'nos', 'al', 'a', 'el', 'mar'],
                                                           ['Sue', 'likes', 'coffee', 'and', 'Bill', 'likes', 'tea']]
 
+def test_read_conllu_separators(data2, tmp_path):
+    filename = tmp_path / 'data.conllu'
+    filename.write_text(_read_file(data2).replace('\tbooks\t', '\tbo\u2028o\x0bks\t'), encoding='utf-8')
+    expected = list(read_conllu(filename))
+    assert expected[0][4].form == 'bo\u2028o\x0bks'
+    assert pipe().read_conllu(filename).collect() == expected
+    assert pipe().read_conllu(filename).shuffle().count() == len(expected)
+
+def test_read_conllu_comment_blocks(data2, data4, tmp_path):
+    filename = tmp_path / 'data.conllu'
+    filename.write_text('# global.columns = ID FORM LEMMA UPOS XPOS FEATS HEAD DEPREL DEPS MISC\n\n' + _read_file(data2) +
+                        '# newdoc\n\n' + _read_file(data4) * 3 + '# trailing\n', encoding='utf-8')
+    expected = list(read_conllu(filename))
+    assert 'global.columns' in expected[0].metadata
+    assert pipe().read_conllu(filename).collect() == expected
+
+    for num_shards in (2, 3, 5):
+        shards = [pipe().read_conllu(filename).shard(num_shards, i, 'contiguous').collect() for i in range(num_shards)]
+        assert list(itertools.chain(*shards)) == expected
+    shuffled = pipe().read_conllu(filename).shuffle().collect()
+    assert sorted(s.to_conllu() for s in shuffled) == sorted(s.to_conllu() for s in expected)
+
+    for n in range(len(expected)):
+        p = pipe().read_conllu(filename)
+        head = list(itertools.islice(p, n))
+        assert head + pipe().read_conllu(filename).restore(p.state()).collect() == expected
+
+def test_read_conllu_filters(data2, data4, tmp_path):
+    filename = tmp_path / 'data.conllu'
+    filename.write_text((_read_file(data2) + _read_file(data4)) * 3, encoding='utf-8')
+    sentences = pipe().read_conllu(filename).collect()
+
+    wanted = {'2', 'dev-s216'}
+    f = lambda s: s.metadata['sent_id'] in wanted
+    expected = [s for s in sentences if f(s)]
+    p = pipe().read_conllu(filename).filter(f, metadata_only=True)
+    assert not p._pipeline.operations
+    assert p.collect() == expected
+    assert p.shard(2, 1).collect() == expected[1::2]
+    assert pipe().read_conllu(filename).shuffle().filter(f, metadata_only=True).count() == len(expected)
+    assert pipe().read_conllu(filename).map(lambda s: s).filter(f, metadata_only=True).collect() == expected
+
+    p = pipe().read_conllu(filename, length_filter=lambda n: n < 10).filter(lambda s: s.metadata['sent_id'] != '2',
+                                                                          metadata_only=True)
+    assert p.collect() == [s for s in sentences if len(s) < 10 and s.metadata['sent_id'] != '2']
+
 def test_write_conllu(data1):
     s = _StringIO()
     pipe().read_conllu(data1).write_conllu(s)
@@ -145,6 +242,17 @@ def test_only_projective(data2, data5):
     p = pipe().read_conllu(data5).only_projective(False)
     assert [s.is_projective() for s in p.collect()] == [False]
 
+def test_only_valid(data2):
+    sentences = pipe().read_conllu(data2).collect()
+    next(t for t in sentences[1].words() if t[HEAD] != 0)[HEAD] = 0
+    index = pipe(sentences).create_index()
+    instances = pipe(sentences).to_instance(index).collect()
+
+    for data in (sentences, instances):
+        for p in (pipe(data), pipe(data).chunked(2)):
+            assert [id(s) for s in p.only_valid()] == [id(data[0])]
+        assert [id(s) for s in pipe(data).only_valid(False)] == [id(data[1])]
+
 def test_text(data2):
     p = pipe().read_conllu(data2).text()
     assert p.collect() == ['They buy and sell books. ', 'I have no clue. ']
@@ -153,6 +261,12 @@ def test_create_index(data2):
     index = pipe().read_conllu(data2).create_index(fields=set(FIELDS)-{ID, HEAD}, min_frequency=2)
     assert index[FORM] == {".":1}
 
+def test_create_index_and_instances(data2):
+    index1 = pipe().read_conllu(data2).create_index(min_frequency=2)
+    index2, instances = pipe().read_conllu(data2).create_index_and_instances(min_frequency=2)
+    assert index1 == index2
+    assert [i[FORM].tolist() for i in instances] == [i[FORM].tolist() for i in pipe().read_conllu(data2).to_instance(index1)]
+
 def test_to_instance(data2):
     sentences = pipe().read_conllu(data2).collect()
     index = pipe(sentences).create_index(fields=set(FIELDS)-{ID, HEAD})
@@ -207,6 +321,31 @@ def test_replace(data4):
     pipe(sentences).replace('form', None, '__missing__', 'new').collect()
     assert [t.get('new') for t in sentences[0]] == ['__missing__', 'revízia', 'vyšla', 'v', 'roku', '__number__', '.']
 
+def test_memoize(data2, data4):
+    def _pipeline():
+        return pipe().read_conllu(data4).lowercase('form').replace('form', r"[0-9]+", '__number__') \
+                     .map_field('lemma', lambda s: s[:3], pure=True).map_field('upos', lambda s: s[:1]).upos_feats()
+
+    sentences = _pipeline().collect()
+    p = _pipeline().memoize()
+    assert p.collect() == sentences
+    assert p.collect() == sentences
+
+    info = p.memoize_info()
+    assert [(i['name'], i['field']) for i in info] == [('lowercase', 'form'), ('replace', 'form'),
+                                                       ('map_field', 'lemma'), ('upos_feats', 'upos_feats')]
+    assert all(i['hits'] + i['misses'] == 2 * sum(len(s) for s in sentences) for i in info)
+    assert all(i['hit_rate'] >= 0.5 and i['size'] == i['misses'] for i in info)
+
+    p = pipe().read_conllu(data2, parse_feats=True).upos_feats('new').memoize(maxsize=2)
+    assert p.collect() == pipe().read_conllu(data2, parse_feats=True).upos_feats('new').collect()
+    assert p.memoize_info()[0]['size'] == 2
+    assert pipe().read_conllu(data2).lowercase('form').memoize_info() == []
+
+    p = pipe().read_conllu(data2, parse_feats=True).memoize().map_field('feats', lambda f: len(f), 'n', pure=True)
+    assert [t.get('n') for t in p.first()] == [2, 3, None, 3, 1, None]
+    assert p.memoize_info()[0]['hits'] + p.memoize_info()[0]['misses'] == 0
+
 def test_replace_missing(data4):
     sentences = pipe().read_conllu(data4).collect()
     del sentences[0][0].form
@@ -281,5 +420,361 @@ def test_split_chars(data2):
     sentences = pipe().read_conllu(data2).split_chars('form').collect()
     assert [[t['form:chars'] for t in s] for s in sentences] == [[tuple(t.form) for t in s] for s in sentences]
 
+# The calls of the global function do not change the fingerprint of the cached stages.
+_CALLS = []
+
+def _count_call(x):
+    _CALLS.append(x)
+    return x
+
+def test_cache(data2, tmp_path):
+    calls = []
+    def _count(x):
+        calls.append(x)
+        return x
+
+    p = pipe(range(5)).map(_count).cache().stream(15)
+    assert p.collect() == list(range(5)) * 3
+    assert len(calls) == 5
+
+    sentences = pipe().read_conllu(data2).collect()
+    p = pipe().read_conllu(data2).cache().map_field('form', lambda s: s + 'x')
+    for _ in range(3):
+        assert [t['form'] for s in p for t in s] == [t['form'] + 'x' for s in sentences for t in s]
+    index = pipe().read_conllu(data2).create_index()
+    instances = pipe(sentences).to_instance(index).collect()
+    def _increment(ins):
+        ins['form'] += 1
+        return ins
+
+    p = pipe().read_conllu(data2).to_instance(index).cache().map(_increment)
+    for _ in range(3):
+        assert [ins['form'].tolist() for ins in p] == [(ins['form'] + 1).tolist() for ins in instances]
+
+    filename = tmp_path / 'data2.conllu'
+    filename.write_text(_read_file(data2), encoding='utf-8')
+    index = pipe().read_conllu(filename).create_index()
+
+    cache = tmp_path / 'cache.bin'
+    _CALLS.clear()
+    p = pipe().read_conllu(filename).map(_count_call).to_instance(index).cache(cache)
+    instances1 = p.collect()
+    instances2 = p.collect()
+    assert len(_CALLS) == 2
+    assert cache.exists()
+    for ins1, ins2 in zip(instances1, instances2):
+        assert ins1.metadata == ins2.metadata
+        assert ins1.keys() == ins2.keys()
+        assert all(np.array_equal(ins1[f], ins2[f]) for f in ins1.keys())
+
+    p = pipe().read_conllu(filename).map(_count_call).to_instance(index).cache(cache)
+    assert p.count() == 2
+    assert len(_CALLS) == 2 # Replayed from the cache file by the same pipeline.
+
+    p = pipe().read_conllu(filename).map(_count_call).text().cache(cache)
+    assert p.collect() == pipe().read_conllu(filename).text().collect()
+    assert len(_CALLS) == 4 # Recorded again for the different stages.
+    assert p.count() == 2
+    assert len(_CALLS) == 4
+
+    p = pipe().read_conllu(filename).map(_count_call).text().cache(cache, key='v2')
+    assert p.count() == 2
+    assert len(_CALLS) == 6 # Recorded again for the different key.
+
+    filename.write_text(_read_file(data2) * 2, encoding='utf-8')
+    os.utime(filename, ns=(0, 0))
+    assert p.first() is not None
+    assert p.count() == 4 # The cache is not committed after an incomplete iteration.
+    assert len(_CALLS) == 11
+    assert p.count() == 4
+    assert len(_CALLS) == 11
+
+    p = pipe(range(5)).map(lambda x: 2*x).cache(cache)
+    assert p.collect() == [0, 2, 4, 6, 8]
+    assert pipe(range(5)).map(lambda x: 3*x).cache(cache).collect() == [0, 3, 6, 9, 12]
+
+    sentences = pipe().read_conllu(filename).collect()
+    other_index = pipe(sentences[:1]).create_index()
+    for idx in (index, other_index, index):
+        p = pipe().read_conllu(filename).to_instance(idx).cache(cache)
+        expected = pipe(sentences).to_instance(idx).collect()
+        assert [ins['form'].tolist() for ins in p] == [ins['form'].tolist() for ins in expected]
+
+    counter = itertools.count()
+    with pytest.raises(ValueError):
+        pipe(range(5)).map(lambda x: (next(counter), x)[1]).cache(cache).collect()
+    assert pipe(range(5)).map(lambda x: (next(counter), x)[1]).cache(cache, key='counter').collect() == list(range(5))
+
+def test_profile():
+    p = pipe(range(10)).filter(lambda x: x < 5).map(lambda x: 2*x).stream(7).batch(3)
+    with p.profile() as profiler:
+        assert p.collect() == [[0, 2, 4], [6, 8, 0], [2]]
+
+    stats = profiler.to_dict()
+    assert [s['name'] for s in stats] == ['source', 'filter', 'map', 'stream', 'batch']
+    assert [s['calls'] for s in stats] == [12, 12, 7, 7, 3]
+    assert [s['dropped'] for s in stats] == [0, 5, 0, 0, 0]
+    assert all(s['wall'] >= 0 and s['cpu'] is None for s in stats)
+    assert profiler.table().splitlines()[0].split() == ['stage', 'calls', 'items', 'dropped', 'wall', '[s]', 'cpu',
+                                                        '[s]', 'items/s']
+
+    p.count()
+    assert profiler.to_dict() == stats
+
+    p = pipe(range(1000)).map(lambda x: sum(range(x % 100 * 10))).batch(10)
+    with p.profile(cpu=True) as profiler:
+        p.count()
+    stats = profiler.to_dict()
+    assert all(s['cpu'] >= 0 for s in stats)
+    assert stats[1]['wall'] > stats[0]['wall'] and stats[1]['wall'] > stats[2]['wall']
+
+def test_shard(data2, data4, tmp_path):
+    filename = tmp_path / 'data.conllu'
+    filename.write_text((_read_file(data2) + _read_file(data4)) * 3, encoding='utf-8')
+    sentences = pipe().read_conllu(filename).collect()
+
+    for num_shards in (1, 2, 3, 4, 8):
+        shards = [pipe().read_conllu(filename).shard(num_shards, i).collect() for i in range(num_shards)]
+        assert [s for s in itertools.chain(*itertools.zip_longest(*shards)) if s is not None] == sentences
+
+        shards = [pipe().read_conllu(filename).shard(num_shards, i, 'contiguous').collect() for i in range(num_shards)]
+        assert list(itertools.chain(*shards)) == sentences
+
+    assert pipe(range(10)).shard(3, 1).collect() == [1, 4, 7]
+    assert pipe(range(10)).shard(3, 1, 'contiguous').collect() == [3, 4, 5]
+    assert pipe(iter(range(10))).shard(3, 1, 'contiguous', size=10).collect() == [3, 4, 5]
+    assert pipe().read_conllu(filename).text().shard(3, 2, 'contiguous', len(sentences)).collect() == \
+           [s.text() for s in sentences[len(sentences)*2//3:]]
+    assert pipe().read_conllu(filename).text().shard(3, 0).collect() == [s.text() for s in sentences[::3]]
+
+    with pytest.raises(ValueError):
+        pipe(range(10)).shard(3, 3)
+    with pytest.raises(ValueError):
+        pipe(range(10)).shard(3, 0, 'unknown')
+    with pytest.raises(ValueError):
+        pipe(iter(range(10))).shard(3, 1, 'contiguous')
+    with pytest.raises(ValueError):
+        pipe().read_conllu(filename).text().stream().shard(3, 1, 'contiguous')
+
+def test_state(data1, data2, data4, tmp_path):
+    filename = tmp_path / 'data.conllu'
+    filename.write_text((_read_file(data1) + _read_file(data2) + _read_file(data4)) * 10, encoding='utf-8')
+
+    pipelines = [
+        lambda random: pipe().read_conllu(filename).stream(100).shuffle(random=random).batch(7),
+        lambda random: pipe().read_conllu(filename).shard(3, 1).text().stream(60).shuffle(10, random, 'buffer').batch(5),
+        lambda random: pipe().read_conllu(filename).shard(2, 0, 'contiguous').shuffle(random=random).batch(4).flatten(),
+        lambda random: pipe(range(50)).filter(lambda x: x % 3).stream(100).shuffle(8, random).flatten().shard(2, 1),
+        lambda random: pipe(range(50)).pipe(pipe().map(lambda x: 2*x)).stream(120).batch(4),
+        lambda random: pipe(list(range(50))).shard(3, 1, 'contiguous').map(lambda x: 2*x).batch(4),
+        lambda random: pipe().read_file(filename, 'conllu').stream(50).shuffle(8, random).batch(4),
+        lambda random: pipe().read_conllu(filename).dedup(mode='minhash').batch(2)
+    ]
+
+    for p in pipelines:
+        data = p(np.random.RandomState(1)).collect()
+        for n in (0, 1, 5, len(data) - 1, len(data)):
+            p1 = p(np.random.RandomState(1))
+            head = list(itertools.islice(p1, n))
+            state = pickle.loads(pickle.dumps(p1.state()))
+            tail = p(np.random.RandomState(2)).restore(state).collect()
+            assert head + tail == data
+
+        p1 = p(np.random.RandomState(1))
+        assert p1.collect() == data
+        assert p(np.random.RandomState(2)).restore(p1.state()).collect() == []
+
+    with pytest.raises(RuntimeError):
+        pipe(range(10)).state()
+
+    p = pipe(range(10)).shuffle(mode='external')
+    next(iter(p))
+    with pytest.raises(RuntimeError):
+        p.state()
+
+def test_dedup(data1, data2, data4, tmp_path):
+    sentences = pipe().read_conllu(data1).collect() + pipe().read_conllu(data2).collect() + \
+                pipe().read_conllu(data4).collect()
+    data = sentences + [s.copy() for s in reversed(sentences)] + sentences
+
+    for p in (pipe(data).dedup(), pipe(data).dedup(key='form'), pipe(data).dedup(temp_dir=tmp_path),
+              pipe(data).dedup(key=lambda s: [t.get('lemma') for t in s]), pipe(data).dedup(mode='minhash')):
+        assert [id(s) for s in p] == [id(s) for s in sentences]
+        assert [id(s) for s in p] == [id(s) for s in sentences] # The pipeline can be iterated again.
+    assert os.listdir(tmp_path) == []
+
+    assert pipe(data).dedup(temp_dir=tmp_path).first() is sentences[0]
+    assert os.listdir(tmp_path) == []
+    itr = iter(pipe(data).dedup(temp_dir=tmp_path))
+    next(itr)
+    with pytest.raises(ZeroDivisionError):
+        pipe(data).dedup(temp_dir=tmp_path).map(lambda s: 1 / 0).collect()
+    del itr
+    assert os.listdir(tmp_path) == []
+
+    words = [f'w{i}' for i in range(40)]
+    texts = [' '.join(words), ' '.join(words[:-1] + ['x']), ' '.join(reversed(words)), ' '.join(words) + ' ']
+    assert pipe(texts).dedup(key=str).collect() == [texts[0], texts[1], texts[2]]
+    assert pipe(texts).dedup(key=str, mode='minhash').collect() == [texts[0], texts[2]]
+    assert pipe(texts).dedup(key=str, mode='minhash', threshold=1.0, shingle_size=1).collect() == [texts[0], texts[1]]
+
+    with pytest.raises(ValueError):
+        pipe(data).dedup(mode='unknown')
+    with pytest.raises(ValueError):
+        pipe(data).dedup(key='unknown')
+
+def test_run(data1, data2, tmp_path):
+    calls = []
+    def _count(x):
+        calls.append(x)
+        return x
+
+    s = _StringIO()
+    p = pipe().read_conllu(data2).map(_count)
+    index, count, _, sentences, first = p.run([Pipeline.create_index, Pipeline.count, lambda p: p.write_conllu(s),
+                                               Pipeline.collect, Pipeline.first])
+
+    assert len(calls) == 2
+    assert index == pipe().read_conllu(data2).create_index()
+    assert count == 2
+    assert s.getvalue() == _read_file(data2)
+    assert sentences == pipe().read_conllu(data2).collect()
+    assert first == sentences[0]
+    s.release()
+
+    assert pipe(range(10000)).run([sum, Pipeline.count, Pipeline.first], buffer_size=64) == [49995000, 10000, 0]
+    assert pipe(range(10000)).run([]) == []
+
+    filename = tmp_path / 'data.conllu'
+    filename.write_text(_read_file(data1) * 100, encoding='utf-8')
+    sinks = [lambda p: p.only_words().lowercase(FORM).map(lambda s: [t.form for t in s]).collect(),
+             lambda p: [[t.form for t in s] for s in p], lambda p: sum(len(s) for s in p)]
+    expected = [sink(pipe().read_conllu(filename)) for sink in sinks]
+    for _ in range(3):
+        assert pipe().read_conllu(filename).run(sinks, buffer_size=64) == expected
+    assert pipe().read_conllu(filename).run(sinks[1:], copy=False) == expected[1:]
+
+    def _error(p):
+        raise ValueError()
+    with pytest.raises(ValueError):
+        pipe(range(10000)).run([Pipeline.count, _error])
+
+    with pytest.raises(ZeroDivisionError):
+        pipe(range(10000)).map(lambda x: 1 // (x - 5000)).run([Pipeline.count, Pipeline.collect])
+
+def _assert_equal(data1, data2):
+    assert len(data1) == len(data2)
+    for x, y in zip(data1, data2):
+        if isinstance(x, dict):
+            assert x.keys() == y.keys() and all(np.array_equal(x[f], y[f]) for f in x)
+        else:
+            assert x == y
+
+def test_chunked(data1, data2, data4, tmp_path):
+    filename = tmp_path / 'data.conllu'
+    filename.write_text((_read_file(data1) + _read_file(data2) + _read_file(data4)) * 10, encoding='utf-8')
+    index = pipe().read_conllu(filename).create_index()
+
+    pipelines = [
+        lambda: pipe().read_conllu(filename).filter(lambda s: len(s) > 3).only_projective().to_instance(index),
+        lambda: pipe().read_conllu(filename).only_words().lowercase(FORM).to_conllu(),
+        lambda: pipe().read_conllu(filename).text().stream(100).batch(7),
+        lambda: pipe(range(50)).filter(lambda x: x % 3).map(lambda x: 2*x if x % 4 else None).shard(2, 1),
+        lambda: pipe(range(50)).map_chunk(lambda c: [x for x in c if x % 2]).pipe(pipe().map(lambda x: 2*x)),
+    ]
+
+    for p in pipelines:
+        data = p().collect()
+        for chunk_size in (1, 3, 256):
+            _assert_equal(p().chunked(chunk_size).collect(), data)
+
+            for n in (0, 1, 5, len(data)):
+                p1 = p().chunked(chunk_size)
+                head = list(itertools.islice(p1, n))
+                state = pickle.loads(pickle.dumps(p1.state()))
+                tail = p().chunked(chunk_size).restore(state).collect()
+                _assert_equal(head + tail, data)
+
+    p = pipe(range(10)).chunked(4).filter(lambda x: x < 5).map(lambda x: 2*x)
+    with p.profile() as profiler:
+        assert p.collect() == [0, 2, 4, 6, 8]
+    assert [(s['name'], s['calls'], s['items']) for s in profiler.to_dict()] == \
+           [('source', 10, 10), ('filter', 10, 5), ('map', 5, 5)]
+
+    assert pipe(range(5)).map_chunk(lambda c: [x + 1 for x in c]).collect() == [1, 2, 3, 4, 5]
+    with pytest.raises(ValueError):
+        pipe(range(10)).chunked(0)
+
+class _AsyncWriter(object):
+
+    def __init__(self):
+        self.data = []
+
+    async def write(self, s):
+        self.data.append(s)
+
+def test_async(data2, data4):
+    from conllutils import read_conllu_async
+
+    text = (_read_file(data2) + _read_file(data4)) * 3
+    sentences = pipe().from_conllu(text).collect()
+
+    async def _stream(p, sentences):
+        loop = asyncio.get_event_loop()
+        r, w = os.pipe()
+        reader = asyncio.StreamReader()
+        read_transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader),
+                                                         os.fdopen(r, 'rb'))
+        write_transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin,
+                                                                  os.fdopen(w, 'wb'))
+        writer = asyncio.StreamWriter(write_transport, protocol, None, loop)
+
+        async def _write():
+            await pipe(sentences).write_conllu_async(writer)
+            writer.close()
+
+        task = asyncio.ensure_future(_write())
+        result = [s async for s in p(reader)]
+        await task
+        read_transport.close()
+        return result
+
+    async def _main():
+        results = await asyncio.gather(
+            _stream(lambda r: pipe().read_conllu(r), sentences),
+            _stream(lambda r: pipe().read_conllu(r).lowercase('form').text(), sentences),
+            _stream(lambda r: read_conllu_async(r, metadata_filter=lambda m: m['sent_id'] != '1'), sentences))
+
+        writer = _AsyncWriter()
+        p = pipe(sentences).filter(lambda s: len(s) > 5)
+        await p.write_conllu_async(writer)
+        chunks = [s async for s in pipe(range(10)).map(lambda x: 2*x).aiter(chunk_size=3)]
+        return results, ''.join(writer.data), chunks
+
+    results, written, chunks = asyncio.get_event_loop().run_until_complete(_main())
+    assert results[0] == sentences
+    assert results[1] == pipe().from_conllu(text).lowercase('form').text().collect()
+    assert results[2] == [s for s in sentences if s.metadata['sent_id'] != '1']
+    assert written == ''.join(s.to_conllu() + '\n\n' for s in sentences if len(s) > 5)
+    assert chunks == list(range(0, 20, 2))
+
+    with pytest.raises(RuntimeError):
+        pipe().read_conllu(asyncio.StreamReader()).collect()
+
+def test_chunked_only_projective(data2, data5):
+    sentences = pipe().read_conllu(data2).collect() + pipe().read_conllu(data5).collect()
+    index = pipe(sentences).create_index()
+    instances = pipe(sentences).to_instance(index).collect()
+
+    for projective in (True, False):
+        expected = [s.is_projective() == projective for s in sentences]
+        for data in (instances, sentences):
+            selected = {id(s) for s in pipe(data).chunked(2).only_projective(projective)}
+            assert [id(s) in selected for s in data] == expected
+
+def _read_file(name):
+    with open(name, "rt", encoding="utf-8") as f:
+        return f.read()
+
 if __name__ == "__main__":
     pass
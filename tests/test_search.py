@@ -0,0 +1,102 @@
+import pytest
+
+from conllutils import read_conllu, create_index, FORM, LEMMA, UPOS, XPOS, DEPREL, FEATS, DEPS, MISC
+import conllutils.search
+from conllutils.search import build_index, load_index, Pattern, match_pattern
+
+def _find(sentences, predicate):
+    return [(i, j) for i, s in enumerate(sentences) for j, t in enumerate(s) if predicate(t)]
+
+def test_inverted_index(treebank, tmp_path):
+    sentences = list(read_conllu(treebank))
+    index = build_index(treebank)
+    assert len(index) == len(sentences)
+
+    assert index.fields == {FORM, LEMMA, UPOS, XPOS, FEATS, DEPREL, DEPS}
+
+    for field, value in ((UPOS, 'NOUN'), (LEMMA, 'be'), (DEPREL, 'nsubj'), (FEATS, 'Number=Plur'), (FORM, 'xyz'),
+                         (FORM, 'revízia'), (FORM, 'Zzz'), (FORM, '')):
+        expected = _find(sentences, lambda t: t.get(field) == value)
+        s, t = index.postings(field, value)
+        assert list(zip(s.tolist(), t.tolist())) == expected
+
+    s, t = index.find_tokens((UPOS, 'NOUN'), (DEPREL, 'nsubj'))
+    assert list(zip(s.tolist(), t.tolist())) == _find(sentences, lambda t: t.get(UPOS) == 'NOUN' and
+                                                                           t.get(DEPREL) == 'nsubj')
+    s, t = index.find_tokens((UPOS, 'NOUN'), (DEPREL, 'nsubj'), any=True)
+    assert list(zip(s.tolist(), t.tolist())) == _find(sentences, lambda t: t.get(UPOS) == 'NOUN' or
+                                                                           t.get(DEPREL) == 'nsubj')
+
+    has = lambda s, field, value: any(t.get(field) == value for t in s)
+    expected = [i for i, s in enumerate(sentences) if has(s, UPOS, 'VERB') and has(s, DEPREL, 'obj')]
+    assert index.find_sentences((UPOS, 'VERB'), (DEPREL, 'obj')).tolist() == expected
+    expected = [i for i, s in enumerate(sentences) if has(s, LEMMA, 'book') or has(s, LEMMA, 'rok')]
+    assert index.find_sentences((LEMMA, 'book'), (LEMMA, 'rok'), any=True).tolist() == expected
+
+    index.save(tmp_path / 'index.npz')
+    with load_index(tmp_path / 'index.npz', treebank) as loaded:
+        assert loaded.fields == index.fields
+        assert loaded.postings(UPOS, 'NOUN')[0].tolist() == index.postings(UPOS, 'NOUN')[0].tolist()
+        assert [s.to_conllu() for s in loaded.read(range(len(loaded)))] == [s.to_conllu() for s in sentences]
+        assert loaded[2].to_conllu() == sentences[2].to_conllu()
+
+    index = build_index(treebank, fields={LEMMA})
+    assert index.fields == {LEMMA}
+    index = build_index(treebank, fields={MISC})
+    s, t = index.postings(MISC, 'SpaceAfter=No')
+    assert list(zip(s.tolist(), t.tolist())) == _find(sentences, lambda t: t.get(MISC) == 'SpaceAfter=No')
+
+    with open(treebank, 'at', encoding='utf-8') as f:
+        f.write('1\tx\tx\t_\t_\t_\t0\troot\t_\t_\n')
+    with pytest.raises(ValueError):
+        load_index(tmp_path / 'index.npz', treebank)
+
+def _match_tree(sentences, upos, child_upos, child_deprel, min_distance):
+    # Reference matching by the traversal of the dependency trees.
+    result = []
+    for i, sentence in enumerate(sentences):
+        words = [j for j, t in enumerate(sentence) if not (t.is_empty or t.is_multiword)]
+        for node in sentence.to_tree():
+            if node.token.get(UPOS) not in upos:
+                continue
+            for child in node:
+                if (child_upos is None or child.token.get(UPOS) == child_upos) and \
+                   (child_deprel is None or child.deprel == child_deprel) and \
+                   abs(child.index - node.index) >= min_distance:
+                    result.append((i, words[node.index]))
+                    break
+    return result
+
+def test_match_pattern(treebank):
+    sentences = list(read_conllu(treebank))
+    index = build_index(treebank)
+
+    queries = [
+        (Pattern(upos='VERB').child(Pattern(upos='PRON', deprel='nsubj')), ({'VERB'}, 'PRON', 'nsubj', 0)),
+        (Pattern(upos={'NOUN', 'VERB'}).child(Pattern(), min_distance=3), ({'NOUN', 'VERB'}, None, None, 3)),
+        (Pattern(upos='VERB').child(Pattern(deprel='obj'), max_distance=100), ({'VERB'}, None, 'obj', 0)),
+        (Pattern(upos='X').child(Pattern()), ({'X'}, None, None, 0))
+    ]
+    for pattern, args in queries:
+        expected = _match_tree(sentences, *args)
+        s, t = match_pattern(pattern, sentences)
+        assert list(zip(s.tolist(), t.tolist())) == expected
+        s, t = index.match(pattern, chunk_size=2)
+        assert list(zip(s.tolist(), t.tolist())) == expected
+
+    s, t = match_pattern(Pattern(upos='VERB').child(Pattern(), max_distance=1), sentences)
+    assert all(sentences[i][j][UPOS] == 'VERB' for i, j in zip(s.tolist(), t.tolist()))
+
+    vocabulary = create_index(sentences)
+    instances = [sentence.to_instance(vocabulary) for sentence in sentences]
+    pattern = Pattern({UPOS: vocabulary[UPOS]['VERB']}).child(Pattern({DEPREL: vocabulary[DEPREL]['obj']}))
+    s, t = match_pattern(pattern, instances)
+    assert list(zip(s.tolist(), t.tolist())) == _match_tree(sentences, {'VERB'}, None, 'obj', 0)
+
+def test_inverted_index_chunks(treebank, monkeypatch):
+    index = build_index(treebank)
+    monkeypatch.setattr(conllutils.search, '_CHUNK_SIZE', 3)
+    chunked = build_index(treebank)
+    assert chunked._keys == index._keys
+    assert chunked._sentences.tolist() == index._sentences.tolist()
+    assert chunked._tokens.tolist() == index._tokens.tolist()
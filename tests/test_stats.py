@@ -0,0 +1,53 @@
+import json
+import pytest
+
+from conllutils import read_conllu, create_index, FORM, UPOS, LEMMA
+from conllutils.stats import Statistics, compute_statistics
+
+@pytest.fixture
+def treebank(make_treebank):
+    # With the multiword and empty tokens of data1.
+    return make_treebank('data1.conllu', 'data2.conllu', 'data4.conllu', 'data5.conllu')
+
+def test_statistics(treebank):
+    sentences = list(read_conllu(treebank))
+    stats = Statistics(fields=(UPOS, LEMMA), ngrams=(1, 2)).update_all(sentences)
+    d = stats.to_dict()
+    assert json.loads(json.dumps(d)) == d
+
+    words = [list(s.words()) for s in sentences]
+    assert d['sentences'] == len(sentences)
+    assert d['tokens'] == sum(len(s) for s in sentences)
+    assert d['words'] == sum(len(w) for w in words)
+    assert d['multiword_tokens'] == 2
+    assert d['empty_tokens'] == 1
+    assert d['non_projective'] == sum(1 for s in sentences if not s.is_projective())
+    assert d['lengths'] == {str(n): sum(1 for w in words if len(w) == n) for n in sorted({len(w) for w in words})}
+    assert d['values'][UPOS]['NOUN'] == sum(1 for w in words for t in w if t.get(UPOS) == 'NOUN')
+
+    ngrams = dict((tuple(ngram), count) for ngram, count in d['ngrams'])
+    forms = [[t.get(FORM) for t in w] for w in words]
+    assert ngrams[('likes',)] == sum(f.count('likes') for f in forms)
+    assert sum(count for ngram, count in ngrams.items() if len(ngram) == 2) == sum(max(len(f) - 1, 0) for f in forms)
+
+    merged = Statistics(fields=(UPOS, LEMMA), ngrams=(1, 2))
+    for i in range(3):
+        merged.merge(Statistics.from_dict(Statistics(fields=(UPOS, LEMMA), ngrams=(1, 2)).update_all(
+            sentences[i::3]).to_dict()))
+    assert merged.to_dict() == d
+
+    with pytest.raises(ValueError):
+        merged.merge(Statistics())
+
+    pruned = Statistics(ngrams=1, max_ngrams=2).update_all(sentences).to_dict()
+    assert pruned['ngrams_pruned']
+    assert len(pruned['ngrams']) <= 4
+
+    index = create_index(sentences)
+    instances = Statistics(fields=(UPOS,)).update_all(s.to_instance(index) for s in sentences).to_dict()
+    assert instances['values'][UPOS][index[UPOS]['NOUN']] == d['values'][UPOS]['NOUN']
+
+def test_compute_statistics(treebank):
+    expected = Statistics(ngrams=2).update_all(read_conllu(treebank)).to_dict()
+    assert compute_statistics(treebank, ngrams=2).to_dict() == expected
+    assert compute_statistics(treebank, num_shards=2, max_workers=2, ngrams=2).to_dict() == expected